@@ -1,7 +1,9 @@
 from pathlib import Path
 import os
+import tempfile
 from datetime import timedelta
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -157,6 +159,147 @@ DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
 MEDIA_URL = f"https://{AWS_STORAGE_BUCKET_NAME}.s3.{AWS_S3_REGION_NAME}.amazonaws.com/media/"  # URL for accessing media files
 AWS_QUERYSTRING_AUTH = True  #For signed URLs for media files
 
+# Cache Configuration
+# "shared" is the cross-worker tier (Redis when REDIS_URL is set, LocMemCache otherwise)
+REDIS_URL = env('REDIS_URL', default='')
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    } if REDIS_URL else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shared",
+    },
+}
+
+# Signed URL Cache
+SIGNED_URL_CACHE_MAX_ENTRIES = env.int('SIGNED_URL_CACHE_MAX_ENTRIES', default=2048)  # Per-process LRU size
+SIGNED_URL_CACHE_MIN_REMAINING = env.int('SIGNED_URL_CACHE_MIN_REMAINING', default=3600)  # Never reuse URLs closer to expiry (seconds)
+SIGNED_URL_CACHE_ALIAS = env('SIGNED_URL_CACHE_ALIAS', default='shared') or None  # Empty disables the shared tier
+
+# Sign GET URLs with the in-process SigV4 presigner instead of boto3 (requires static credentials)
+S3_OFFLINE_PRESIGNER = env.bool('S3_OFFLINE_PRESIGNER', default=False)
+S3_PRESIGNER_ENDPOINT = env('S3_PRESIGNER_ENDPOINT', default='')  # Defaults to <bucket>.s3.<region>.amazonaws.com
+
+# Signed URL expiry per asset class. "window" aligns the signing time to fixed
+# buckets (seconds) so the same object gets a byte-identical URL within a bucket
+# and browser/CDN caches can hit; 0 signs at the current time.
+# Deterministic URLs across workers need S3_OFFLINE_PRESIGNER.
+SIGNED_URL_ASSET_CLASSES = {
+    "video": {"expiration": 604800, "window": env.int('SIGNED_URL_VIDEO_WINDOW', default=3600)},
+    "thumbnail": {"expiration": 604800, "window": env.int('SIGNED_URL_THUMBNAIL_WINDOW', default=21600)},
+    "course_image": {"expiration": 604800, "window": env.int('SIGNED_URL_COURSE_IMAGE_WINDOW', default=21600)},
+    "profile_image": {"expiration": 604800, "window": env.int('SIGNED_URL_PROFILE_IMAGE_WINDOW', default=3600)},
+}
+
+# Course Media Access
+# "presigned": one signed URL per object. "cloudfront": CloudFront signed cookies
+# scoped to videos/course_<id>/ and resources/course_<id>/ with plain media URLs.
+# "local": the same flow against api/v1/media/ served by Django (FileSystemStorage installs, offline/testing).
+COURSE_MEDIA_ACCESS_MODE = env('COURSE_MEDIA_ACCESS_MODE', default='presigned')
+COURSE_MEDIA_BASE_URL = env('COURSE_MEDIA_BASE_URL', default='')  # e.g. https://media.example.com/media/ (CloudFront)
+COURSE_MEDIA_CREDENTIAL_TTL = env.int('COURSE_MEDIA_CREDENTIAL_TTL', default=21600)  # Seconds
+COURSE_MEDIA_COOKIE_DOMAIN = env('COURSE_MEDIA_COOKIE_DOMAIN', default='')
+CLOUDFRONT_KEY_PAIR_ID = env('CLOUDFRONT_KEY_PAIR_ID', default='')
+CLOUDFRONT_PRIVATE_KEY = env.str('CLOUDFRONT_PRIVATE_KEY', multiline=True, default='')  # PEM
+# Serving media from FileSystemStorage installs (local mode, core.media_serving): "" streams with
+# sendfile where the WSGI server supports it, "x-accel" (nginx) / "x-sendfile" hand the file to the front end
+MEDIA_SERVE_OFFLOAD = env('MEDIA_SERVE_OFFLOAD', default='')
+MEDIA_SERVE_ACCEL_PREFIX = env('MEDIA_SERVE_ACCEL_PREFIX', default='/protected-media/')  # nginx `internal` location aliasing the media root
+MEDIA_SERVE_RECHECK_ENROLLMENT = env.bool('MEDIA_SERVE_RECHECK_ENROLLMENT', default=True)  # Per request, from the membership cache
+
+# Conditional GET (ETag / Last-Modified from per-resource versions); off while the version cache is per-process
+RESOURCE_VERSION_CACHE_ALIAS = env('RESOURCE_VERSION_CACHE_ALIAS', default='shared')
+#Validators roll over every period so cached bodies are refetched before their signed URLs
+#or media credentials expire; keep it below COURSE_MEDIA_CREDENTIAL_TTL and the signed URL lifetimes
+CONDITIONAL_GET_MAX_AGE = env.int('CONDITIONAL_GET_MAX_AGE', default=3600)  # Seconds
+
+# Enrollment membership cache (courses.membership): per-worker sets plus a shared tier (skipped without REDIS_URL)
+ENROLLMENT_CACHE_ALIAS = env('ENROLLMENT_CACHE_ALIAS', default='shared')
+ENROLLMENT_CACHE_LOCAL_TTL = env.int('ENROLLMENT_CACHE_LOCAL_TTL', default=30)  # Seconds; bounds how long an unenrollment lingers
+ENROLLMENT_CACHE_SHARED_TTL = env.int('ENROLLMENT_CACHE_SHARED_TTL', default=3600)  # Seconds
+ENROLLMENT_CACHE_MAX_USERS = env.int('ENROLLMENT_CACHE_MAX_USERS', default=10000)
+
+# Resource downloads are counted in this many rows per resource, folded by fold_download_counters
+DOWNLOAD_COUNTER_SLOTS = env.int('DOWNLOAD_COUNTER_SLOTS', default=16)
+# Course resource ZIPs are streamed from storage this many bytes at a time (courses.resource_archive)
+RESOURCE_ARCHIVE_CHUNK_SIZE = env.int('RESOURCE_ARCHIVE_CHUNK_SIZE', default=1024 * 1024)
+
+# Video progress heartbeats: 'redis' (shared by all workers), 'local' (per-process) or 'off' (write-through).
+# 'local' loses buffered positions when the process stops and other workers never see them, so it is
+# only for single-process installs; without a shared Redis heartbeats are written through
+PROGRESS_BUFFER_BACKEND = env('PROGRESS_BUFFER_BACKEND', default='redis' if REDIS_URL else 'off')
+PROGRESS_BUFFER_FLUSH_INTERVAL = env.int('PROGRESS_BUFFER_FLUSH_INTERVAL', default=5)  # Seconds
+if PROGRESS_BUFFER_BACKEND == 'local' and env.int('WEB_CONCURRENCY', default=1) > 1:  # gunicorn's default worker count
+    raise ImproperlyConfigured("PROGRESS_BUFFER_BACKEND 'local' needs a single worker process; use 'redis' or 'off'.")
+# Share of a video's duration the resume position must reach for it to count as completed
+VIDEO_COMPLETION_THRESHOLD = env.float('VIDEO_COMPLETION_THRESHOLD', default=0.95)
+
+# Resumable direct-to-storage uploads (courses.UploadSession): 's3' presigns part URLs on the
+# media bucket, 'local' stores parts under UPLOAD_SESSION_LOCAL_ROOT (offline/testing stand-in)
+UPLOAD_SESSION_BACKEND = env('UPLOAD_SESSION_BACKEND', default='s3')
+UPLOAD_SESSION_LOCAL_ROOT = env('UPLOAD_SESSION_LOCAL_ROOT', default=os.path.join(tempfile.gettempdir(), 'knowledgehub-multipart'))
+UPLOAD_PART_SIZE = env.int('UPLOAD_PART_SIZE', default=16 * 1024 * 1024)  # Bytes; raised for files that would need over 10,000 parts
+UPLOAD_PART_URL_EXPIRATION = env.int('UPLOAD_PART_URL_EXPIRATION', default=3600)  # Seconds
+UPLOAD_PART_URL_BATCH = env.int('UPLOAD_PART_URL_BATCH', default=100)  # Part URLs returned per response
+UPLOAD_SESSION_TTL = env.int('UPLOAD_SESSION_TTL', default=7 * 24 * 3600)  # Seconds before abort_stale_uploads gives up on a session
+
+# Celery (background media processing and cleanup). With a broker, run a worker and beat next to
+# the web processes: `celery -A backend worker` and `celery -A backend beat` (see README)
+CELERY_BROKER_URL = env('CELERY_BROKER_URL', default=REDIS_URL or 'memory://')
+CELERY_TASK_ALWAYS_EAGER = env.bool('CELERY_TASK_ALWAYS_EAGER', default=CELERY_BROKER_URL == 'memory://')  # For --queue without a broker
+# Hand work to the workers once a request commits (video processing, deduplication, storage deletions,
+# course clones). Without a broker nothing is queued, so no request runs it inline; run probe_videos,
+# generate_video_derivatives, package_videos, deduplicate_media, drain_storage_deletions and
+# run_clone_jobs from cron instead
+BACKGROUND_TASKS = env.bool('BACKGROUND_TASKS', default=CELERY_BROKER_URL != 'memory://')
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1  # Media tasks are long; do not let one worker hoard them
+CELERY_BEAT_SCHEDULE = {
+    'drain-storage-deletions': {'task': 'core.tasks.drain_storage_deletions_task', 'schedule': 300},  # Picks up retries
+    'reset-stale-clone-jobs': {'task': 'courses.tasks.reset_stale_clone_jobs_task', 'schedule': 600},
+}
+
+# Storage deletion outbox (core.storage_deletion): old files are deleted after commit, off the request
+STORAGE_DELETION_BATCH_SIZE = env.int('STORAGE_DELETION_BATCH_SIZE', default=1000)  # Keys per DeleteObjects call (max 1000)
+STORAGE_DELETION_RETRY_DELAY = env.int('STORAGE_DELETION_RETRY_DELAY', default=60)  # Seconds; doubles per failed attempt
+# collect_orphaned_media only deletes files older than this, so uploads whose rows are not committed yet are safe
+MEDIA_GC_GRACE_PERIOD = env.int('MEDIA_GC_GRACE_PERIOD', default=86400)  # Seconds
+# Uploads of video and resource files whose SHA-256 is stored already point at that copy (see core.media_blobs)
+MEDIA_DEDUPLICATION = env.bool('MEDIA_DEDUPLICATION', default=True)
+# Server-side copies (core.storage_copy) run in parallel, e.g. when a course is cloned
+STORAGE_COPY_WORKERS = env.int('STORAGE_COPY_WORKERS', default=16)
+# A copying clone job with no progress for this long lost its worker; it is reset and runs again
+COURSE_CLONE_STALE_AFTER = env.int('COURSE_CLONE_STALE_AFTER', default=3600)  # Seconds
+
+# Uploaded videos are probed (duration, resolution, codec) and get a poster, a thumbnail
+# and a seek-preview sprite with a WebVTT index (courses.tasks)
+VIDEO_PROCESSING_ON_UPLOAD = env.bool('VIDEO_PROCESSING_ON_UPLOAD', default=BACKGROUND_TASKS)  # Needs BACKGROUND_TASKS
+VIDEO_DERIVATIVES_GENERATOR = env('VIDEO_DERIVATIVES_GENERATOR', default='auto')  # 'auto', 'ffmpeg' or 'stub'
+FFMPEG_BINARY = env('FFMPEG_BINARY', default='')  # Defaults to ffmpeg on PATH, then the imageio-ffmpeg build
+VIDEO_DERIVATIVES_TIMEOUT = env.int('VIDEO_DERIVATIVES_TIMEOUT', default=600)  # Seconds per ffmpeg run
+VIDEO_POSTER_MAX_WIDTH = env.int('VIDEO_POSTER_MAX_WIDTH', default=1280)
+VIDEO_THUMBNAIL_WIDTH = env.int('VIDEO_THUMBNAIL_WIDTH', default=320)
+VIDEO_SPRITE_INTERVAL = env.int('VIDEO_SPRITE_INTERVAL', default=10)  # Seconds per tile; grows to stay within max tiles
+VIDEO_SPRITE_MAX_TILES = env.int('VIDEO_SPRITE_MAX_TILES', default=100)
+VIDEO_SPRITE_COLUMNS = env.int('VIDEO_SPRITE_COLUMNS', default=10)
+VIDEO_SPRITE_TILE_SIZE = (160, 90)
+# HLS adaptive-bitrate packaging (optional; students fall back to the uploaded file)
+VIDEO_HLS_PACKAGING = env.bool('VIDEO_HLS_PACKAGING', default=False)
+VIDEO_HLS_TRANSCODER = env('VIDEO_HLS_TRANSCODER', default='auto')  # 'auto', 'ffmpeg' or 'fake'
+VIDEO_HLS_LADDER = [  # (name, height, video kbit/s, audio kbit/s); renditions above the source height are skipped
+    ("360p", 360, 800, 96),
+    ("720p", 720, 2800, 128),
+    ("1080p", 1080, 5000, 192),
+]
+VIDEO_HLS_SEGMENT_SECONDS = env.int('VIDEO_HLS_SEGMENT_SECONDS', default=6)
+VIDEO_HLS_PRESET = env('VIDEO_HLS_PRESET', default='veryfast')  # x264 speed/size trade-off
+VIDEO_HLS_TIMEOUT = env.int('VIDEO_HLS_TIMEOUT', default=3600)  # Seconds per video
+VIDEO_HLS_UPLOAD_WORKERS = env.int('VIDEO_HLS_UPLOAD_WORKERS', default=8)
+
 # Static Files (AWS S3 - Public)
 AWS_QUERYSTRING_AUTH_STATIC = False  # Public access for static files
 STATICFILES_STORAGE = 'storages.backends.s3boto3.S3StaticStorage'
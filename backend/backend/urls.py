@@ -26,6 +26,7 @@ urlpatterns = [
     path('api/v1/student_dashboard/', include('student_dashboard.urls')),
     path('api/v1/notifications/', include('notifications.urls')),  # Added notification paths
     path('api/v1/admin_dashboard/', include('admin_dashboard.urls')),
+    path('api/v1/media/', include('core.urls')),  # Local stand-in for course media credential mode
 
      # Swagger Documentation URLs
     re_path(r"^swagger/v1(?P<format>\.json|\.yaml)/$", schema_view_v1.without_ui(cache_timeout=0), name="schema-json"),
@@ -1,3 +1,18 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import MediaBlob, StorageDeletion
+
+
+@admin.register(StorageDeletion)
+class StorageDeletionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'is_prefix', 'attempts', 'not_before', 'created_at', 'last_error')
+    search_fields = ('name',)
+    list_filter = ('is_prefix',)
+    ordering = ('not_before', 'id')
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'ref_count', 'digest', 'created_at')
+    search_fields = ('name', 'digest')
+    readonly_fields = ('digest', 'size', 'name', 'ref_count', 'created_at')  # Counts are kept by core.media_blobs
@@ -0,0 +1,68 @@
+import time
+
+import boto3
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.presigner import SigV4Presigner
+from core.s3_signed_url import detect_content_type, get_s3_client, normalize_key
+
+
+def _legacy_sign(key, content_type, expiration):
+    # What generate_signed_url used to do: a fresh client for every URL.
+    s3_client = boto3.client(
+        's3',
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_S3_REGION_NAME,
+    )
+    return s3_client.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': key, 'ResponseContentType': content_type},
+        ExpiresIn=expiration,
+    )
+
+
+def _shared_client_sign(key, content_type, expiration):
+    return get_s3_client().generate_presigned_url(
+        'get_object',
+        Params={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': key, 'ResponseContentType': content_type},
+        ExpiresIn=expiration,
+    )
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark signed URL generation: per-call boto3 client vs shared client vs offline SigV4 presigner."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200, help="URLs to sign per strategy (default: 200, one large course).")
+        parser.add_argument('--expiration', type=int, default=604800)
+
+    def handle(self, *args, **options):
+        count = options['count']
+        expiration = options['expiration']
+        keys = [normalize_key(f"videos/course_1/lecture_{i}.mp4") for i in range(count)]
+
+        presigner = SigV4Presigner(
+            access_key=settings.AWS_ACCESS_KEY_ID,
+            secret_key=settings.AWS_SECRET_ACCESS_KEY,
+            region=settings.AWS_S3_REGION_NAME,
+            bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        )
+        strategies = [
+            ("boto3 client per call", _legacy_sign),
+            ("shared boto3 client", _shared_client_sign),
+            ("offline SigV4 presigner", lambda key, ct, exp: presigner.presign_get(key, exp, response_content_type=ct)),
+        ]
+
+        baseline = None
+        for label, sign in strategies:
+            started = time.perf_counter()
+            for key in keys:
+                sign(key, detect_content_type(key), expiration)
+            elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            self.stdout.write(
+                f"{label:<26} {elapsed * 1000:9.1f} ms total  "
+                f"{elapsed / count * 1e6:9.1f} us/url  {baseline / elapsed:6.1f}x"
+            )
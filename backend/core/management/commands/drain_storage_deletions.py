@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.storage_deletion import drain_storage_deletions
+
+
+class Command(BaseCommand):
+    help = "Delete the stored files queued in the storage deletion outbox that are due (for cron, without Celery beat)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Files per delete call (at most 1000).")
+
+    def handle(self, *args, **options):
+        deleted, failed = drain_storage_deletions(batch_size=options['batch_size'])
+        self.stdout.write(f"Storage deletions: {deleted} deleted, {failed} failed (retried later)")
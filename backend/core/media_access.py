@@ -0,0 +1,161 @@
+import base64
+import json
+import posixpath
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core import signing
+from django.http import HttpResponse
+from django.urls import reverse
+
+MODE_PRESIGNED = "presigned"  # One presigned URL per object (default)
+MODE_CLOUDFRONT = "cloudfront"  # CloudFront signed cookies scoped to the course prefixes
+MODE_LOCAL = "local"  # Signed token checked by core.views.CourseMediaView (FileSystemStorage installs, offline)
+
+LOCAL_COOKIE_NAME = "course_media"  # Prefix; local mode sets one cookie per course (see local_cookie_name)
+LOCAL_SALT = "core.media_access"
+
+
+def access_mode():
+    return getattr(settings, "COURSE_MEDIA_ACCESS_MODE", MODE_PRESIGNED)
+
+
+def uses_course_credentials():
+    """True when enrolled students get one credential per course instead of per-object URLs."""
+    return access_mode() != MODE_PRESIGNED
+
+
+def local_cookie_name(course_id):
+    """Local mode cookie of a course: distinct names let several courses' credentials live side by side."""
+    return f"{LOCAL_COOKIE_NAME}_{course_id}"
+
+
+def course_media_prefixes(course_id):
+    """Storage prefixes covered by a course media credential."""
+    return (f"videos/course_{course_id}/", f"resources/course_{course_id}/")
+
+
+def media_base_url(request=None):
+    base_url = getattr(settings, "COURSE_MEDIA_BASE_URL", "")
+    if not base_url:
+        base_url = reverse("course-media", kwargs={"key": ""})
+        if request is not None:
+            base_url = request.build_absolute_uri(base_url)
+    return base_url
+
+
+def media_url(name, request=None):
+    """Plain (unsigned) URL for a stored file; only usable with a course credential."""
+    return f"{media_base_url(request)}{name}"
+
+
+def _cloudfront_b64(data):
+    return base64.b64encode(data).decode("ascii").replace("+", "-").replace("=", "_").replace("/", "~")
+
+
+def _cloudfront_cookies(resource, expires_at):
+    # Imported lazily: only CloudFront deployments need a private key loaded.
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import padding
+
+    policy = json.dumps(
+        {"Statement": [{"Resource": resource, "Condition": {"DateLessThan": {"AWS:EpochTime": expires_at}}}]},
+        separators=(",", ":"),
+    ).encode("utf-8")
+    private_key = serialization.load_pem_private_key(settings.CLOUDFRONT_PRIVATE_KEY.encode("utf-8"), password=None)
+    signature = private_key.sign(policy, padding.PKCS1v15(), hashes.SHA1())
+    return {
+        "CloudFront-Policy": _cloudfront_b64(policy),
+        "CloudFront-Signature": _cloudfront_b64(signature),
+        "CloudFront-Key-Pair-Id": settings.CLOUDFRONT_KEY_PAIR_ID,
+    }
+
+
+def issue_course_credential(user, course_id, request=None):
+    """
+    Issue one credential covering a course's video and resource prefixes.
+
+    Returns {"mode", "expires_at", "base_url", "cookies", "token"}. "cookies" is
+    a list of (name, value, path): CloudFront's set once per prefix, scoped by
+    path, or local mode's one course cookie. "token" is only set in local mode
+    and may also be sent as a ?token= query parameter.
+    """
+    expires_at = int(time.time()) + settings.COURSE_MEDIA_CREDENTIAL_TTL
+    base_url = media_base_url(request)
+    base_path = urlsplit(base_url).path
+    prefixes = course_media_prefixes(course_id)
+
+    credential = {"mode": access_mode(), "expires_at": expires_at, "base_url": base_url, "cookies": [], "token": None}
+    if access_mode() == MODE_CLOUDFRONT:
+        # CloudFront accepts a single policy per request, so each prefix gets
+        # its own cookie set, scoped by cookie path.
+        for prefix in prefixes:
+            for name, value in _cloudfront_cookies(f"{base_url}{prefix}*", expires_at).items():
+                credential["cookies"].append((name, value, f"{base_path}{prefix}"))
+    else:
+        token = signing.dumps({"u": user.id, "p": list(prefixes), "e": expires_at}, salt=LOCAL_SALT)
+        credential["token"] = token
+        credential["cookies"].append((local_cookie_name(course_id), token, base_path))
+    return credential
+
+
+def set_credential_cookies(response, credential):
+    """Attach the credential cookies to the response."""
+    max_age = max(credential["expires_at"] - int(time.time()), 0)
+    for name, value, path in credential["cookies"]:
+        add_path_scoped_cookie(
+            response, name, value, path, max_age=max_age, domain=getattr(settings, "COURSE_MEDIA_COOKIE_DOMAIN", "") or None,
+            secure=not settings.DEBUG, httponly=True, samesite="Lax",
+        )
+    return response
+
+
+def add_path_scoped_cookie(response, name, value, path, **kwargs):
+    """
+    response.set_cookie(), except that a cookie already set on the response
+    under the same name at another path is kept rather than replaced.
+
+    Only CloudFront needs this: its cookie names are fixed, so each course
+    prefix gets a copy of the same names scoped by path (local mode uses a
+    distinct name per course instead). Django emits Set-Cookie headers only
+    from response.cookies, a SimpleCookie holding one morsel per key, and
+    has no other way to send two cookies of one name. So the second copy is
+    built with set_cookie() on a scratch response and stored under the alias
+    key "<name>:<path>". The header is written from the morsel itself
+    (Morsel.OutputString), so it carries the real name. The alias only shows
+    when response.cookies is read: response.cookies[name] is the first
+    path's copy.
+    """
+    existing = response.cookies.get(name)
+    if existing is None or existing["path"] == path:
+        response.set_cookie(name, value, path=path, **kwargs)
+        return
+    scratch = HttpResponse()
+    scratch.set_cookie(name, value, path=path, **kwargs)
+    response.cookies[f"{name}:{path}"] = scratch.cookies[name]
+
+
+def credential_payload(credential):
+    """The part of a credential that is returned to the client in the response body."""
+    return {
+        "mode": credential["mode"],
+        "expires_at": credential["expires_at"],
+        "base_url": credential["base_url"],
+        "token": credential["token"],
+    }
+
+
+def verify_local_token(token, key):
+    """Return the token payload if it is valid and covers `key`, else None."""
+    if posixpath.normpath(key) != key:
+        return None
+    try:
+        payload = signing.loads(token, salt=LOCAL_SALT)
+    except signing.BadSignature:
+        return None
+    if payload["e"] < time.time():
+        return None
+    if not any(key.startswith(prefix) for prefix in payload["p"]):
+        return None
+    return payload
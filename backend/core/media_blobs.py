@@ -0,0 +1,79 @@
+"""
+Content-addressed deduplication of uploaded media. Rows whose files have the
+same SHA-256 share one stored file, a MediaBlob, and count references to it:
+acquire_blob(), share_blob() and link_blob() add one, release_files() drops one and queues
+the file for deletion when it was the last. Files without a blob (uploaded
+before deduplication, or with MEDIA_DEDUPLICATION off) belong to their row
+alone and are deleted with it.
+
+Call these inside the transaction that writes the row, so the count and the
+row commit or roll back together.
+"""
+import hashlib
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import MediaBlob
+from .storage_deletion import delete_later
+
+
+def acquire_blob(digest, size):
+    """Add a reference to the stored file with these contents; returns its name, or None if there is none."""
+    if not digest or size is None:
+        return None
+    # The row lock serialises this with a release dropping the last reference
+    if not MediaBlob.objects.filter(digest=digest, size=size).update(ref_count=F('ref_count') + 1):
+        return None
+    return MediaBlob.objects.values_list('name', flat=True).get(digest=digest)
+
+
+def share_blob(name):
+    """Add a reference to the stored file `name` if it is a blob; False if it belongs to one row alone."""
+    return bool(name) and bool(MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1))
+
+
+def link_blob(name, digest, size):
+    """
+    Record a reference from a row to the file it just stored as `name`. If
+    the same contents are stored already, `name` is a duplicate: it is queued
+    for deletion and the existing file's name is returned for the row to
+    point at. Otherwise `name` becomes the blob.
+    """
+    existing = acquire_blob(digest, size)
+    if existing is None:
+        try:
+            with transaction.atomic():
+                MediaBlob.objects.create(digest=digest, size=size, name=name)
+            return name
+        except IntegrityError:
+            existing = acquire_blob(digest, size)  # Another upload of the same bytes got there first
+            if existing is None:
+                raise
+    delete_later(name)
+    return existing
+
+
+def release_files(*names):
+    """Drop one reference from each stored file, deleting the ones nobody refers to any more."""
+    for name in filter(None, names):
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                delete_later(name)  # The row's own file
+            elif blob.ref_count > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+            else:
+                blob.delete()
+                delete_later(name)
+
+
+def hash_stored_file(storage, name):
+    """(sha256 hex digest, size) of a stored file, read in chunks."""
+    digest = hashlib.sha256()
+    size = 0
+    with storage.open(name, "rb") as f:
+        for chunk in f.chunks():
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
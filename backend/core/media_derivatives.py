@@ -0,0 +1,128 @@
+"""
+Still images derived from a video: a poster frame and a seek-preview sprite
+sheet. FFmpegGenerator seeks in the source (a local path or a signed URL, so
+only the needed byte ranges are fetched); StubGenerator draws placeholders
+with Pillow for machines without ffmpeg.
+"""
+import io
+import math
+import shutil
+import subprocess
+
+from django.conf import settings
+from PIL import Image, ImageDraw
+
+GENERATOR_AUTO = "auto"  # ffmpeg when a binary is found, else the stub
+GENERATOR_FFMPEG = "ffmpeg"
+GENERATOR_STUB = "stub"
+
+
+class DerivativeError(Exception):
+    """The generator could not produce an image from the source."""
+
+
+def sprite_layout(duration, interval, max_tiles, columns):
+    """(interval, tile count, columns) covering `duration` seconds with at most `max_tiles` tiles."""
+    duration = max(duration or 0, 1)
+    interval = max(interval, math.ceil(duration / max_tiles))
+    count = math.ceil(duration / interval)
+    return interval, count, min(columns, count)
+
+
+def jpeg(image, quality=85):
+    output = io.BytesIO()
+    image.convert("RGB").save(output, "JPEG", quality=quality)
+    return output.getvalue()
+
+
+def resize_jpeg(data, width):
+    """Downscale a JPEG to at most `width` pixels wide, keeping the aspect ratio."""
+    image = Image.open(io.BytesIO(data))
+    image.thumbnail((width, width * 4))
+    return jpeg(image)
+
+
+class FFmpegGenerator:
+    def __init__(self, binary, timeout=600):
+        self.binary = binary
+        self.timeout = timeout
+
+    def _run(self, args):
+        try:
+            result = subprocess.run(
+                [self.binary, "-hide_banner", "-loglevel", "error", *args],
+                capture_output=True, timeout=self.timeout, check=False,
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise DerivativeError(str(e)) from e
+        if result.returncode != 0 or not result.stdout:
+            raise DerivativeError(result.stderr.decode("utf-8", "replace").strip() or "ffmpeg produced no image")
+        return result.stdout
+
+    def poster(self, source, at, max_width):
+        # -ss before -i seeks by keyframe index, so only a few ranges of the source are read
+        return self._run([
+            "-ss", f"{at:.3f}", "-i", source, "-frames:v", "1",
+            "-vf", f"scale='min({max_width},iw)':-2", "-q:v", "3", "-f", "image2pipe", "-c:v", "mjpeg", "-",
+        ])
+
+    def sprite(self, source, interval, count, columns, tile_width, tile_height):
+        rows = math.ceil(count / columns)
+        frames = (
+            f"fps=1/{interval},"
+            f"scale={tile_width}:{tile_height}:force_original_aspect_ratio=decrease,"
+            f"pad={tile_width}:{tile_height}:(ow-iw)/2:(oh-ih)/2,"
+            f"tile={columns}x{rows}"
+        )
+        # Only keyframes are decoded; seek previews do not need exact frames
+        return self._run([
+            "-skip_frame", "nokey", "-i", source, "-vf", frames, "-frames:v", "1",
+            "-q:v", "5", "-f", "image2pipe", "-c:v", "mjpeg", "-",
+        ])
+
+
+class StubGenerator:
+    """Placeholder images with the timestamp drawn in; never reads the source."""
+
+    def _frame(self, width, height, label):
+        image = Image.new("RGB", (width, height), (40, 44, 52))
+        ImageDraw.Draw(image).text((width // 20 + 2, height // 20 + 2), label, fill=(220, 220, 220))
+        return image
+
+    def poster(self, source, at, max_width):
+        return jpeg(self._frame(min(max_width, 1280), min(max_width, 1280) * 9 // 16, f"{at:.0f}s"))
+
+    def sprite(self, source, interval, count, columns, tile_width, tile_height):
+        rows = math.ceil(count / columns)
+        sheet = Image.new("RGB", (columns * tile_width, rows * tile_height))
+        for index in range(count):
+            tile = self._frame(tile_width, tile_height, f"{index * interval}s")
+            sheet.paste(tile, ((index % columns) * tile_width, (index // columns) * tile_height))
+        return jpeg(sheet, quality=70)
+
+
+def find_ffmpeg():
+    """FFMPEG_BINARY, else ffmpeg on PATH, else the binary bundled with imageio-ffmpeg; None if none exists."""
+    configured = getattr(settings, "FFMPEG_BINARY", "")
+    if configured:
+        return shutil.which(configured)
+    binary = shutil.which("ffmpeg")
+    if binary:
+        return binary
+    try:
+        import imageio_ffmpeg  # Optional: ships a static ffmpeg build
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return None
+
+
+def get_derivative_generator():
+    choice = getattr(settings, "VIDEO_DERIVATIVES_GENERATOR", GENERATOR_AUTO)
+    if choice == GENERATOR_STUB:
+        return StubGenerator()
+    binary = find_ffmpeg()
+    if binary:
+        return FFmpegGenerator(binary, timeout=settings.VIDEO_DERIVATIVES_TIMEOUT)
+    if choice == GENERATOR_FFMPEG:
+        raise DerivativeError("ffmpeg was requested but no binary was found.")
+    return StubGenerator()
@@ -0,0 +1,90 @@
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+
+from .media_blobs import acquire_blob, link_blob
+from .s3_signed_url import detect_content_type
+
+
+def compute_file_metadata(file, name=None):
+    """
+    Return (content_type, size, sha256 hex digest) for a File, reading it in chunks.
+    The file is rewound afterwards so it can still be saved to storage.
+    """
+    name = name or file.name
+    digest = hashlib.sha256()
+    size = 0
+    if hasattr(file, "seek"):
+        file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    if hasattr(file, "seek"):
+        file.seek(0)
+    return detect_content_type(name), size, digest.hexdigest()
+
+
+def stored_content_type(field_file):
+    """Content type persisted for a FieldFile at upload time, or None if unknown."""
+    getter = getattr(field_file.instance, "stored_content_type", None)
+    return getter(field_file.field.name) if getter else None
+
+
+class FileMetadataMixin:
+    """
+    Model mixin that records content type, byte size and checksum of file
+    fields when a new file is saved, so readers never have to guess or ask
+    storage. `file_metadata_fields` maps each file field to the names of its
+    (content_type, size, checksum) model fields. Uploads that already know
+    their metadata can expose it as a `metadata` tuple on the file object, and
+    uploads already written to storage (see core.upload_handlers) expose a
+    `stored_name`, which is recorded instead of saving the file again.
+
+    New files of the `deduplicated_fields` share one stored copy per checksum
+    (see core.media_blobs) when MEDIA_DEDUPLICATION is on: a file whose
+    contents are stored already is never written again, and a streamed upload
+    that turns out to be a duplicate is deleted once the row commits.
+    """
+    file_metadata_fields = {}
+    deduplicated_fields = ()
+
+    def capture_file_metadata(self):
+        for field_name, attrs in self.file_metadata_fields.items():
+            field_file = getattr(self, field_name)
+            if not field_file:
+                for attr, empty in zip(attrs, ("", None, "")):
+                    setattr(self, attr, empty)
+            elif not field_file._committed:
+                # A new upload that has not been written to storage yet.
+                metadata = getattr(field_file.file, "metadata", None) or compute_file_metadata(field_file.file, field_file.name)
+                for attr, value in zip(attrs, metadata):
+                    setattr(self, attr, value)
+                stored_name = getattr(field_file.file, "stored_name", None)
+                if field_name in self.deduplicated_fields and settings.MEDIA_DEDUPLICATION:
+                    self.deduplicate_file(field_file, stored_name, metadata)
+                elif stored_name:
+                    field_file.name = stored_name
+                    field_file._committed = True
+
+    def deduplicate_file(self, field_file, stored_name, metadata):
+        _, size, checksum = metadata
+        if not stored_name:
+            stored_name = acquire_blob(checksum, size)
+            if stored_name is None:
+                # New contents: store them now, so the blob knows its name
+                field_file.save(field_file.name, field_file.file, save=False)
+                stored_name = link_blob(field_file.name, checksum, size)
+        else:
+            stored_name = link_blob(stored_name, checksum, size)
+        field_file.name = stored_name
+        field_file._committed = True
+
+    def stored_content_type(self, field_name):
+        attrs = self.file_metadata_fields.get(field_name)
+        return (getattr(self, attrs[0]) or None) if attrs else None
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():  # Blob references commit with the row
+            self.capture_file_metadata()
+            super().save(*args, **kwargs)
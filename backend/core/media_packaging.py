@@ -0,0 +1,170 @@
+"""
+HLS adaptive-bitrate packaging: transcode a video into a ladder of
+renditions (e.g. 360p/720p/1080p) with a master playlist, written to a local
+directory as
+
+    master.m3u8
+    <rendition>/index.m3u8
+    <rendition>/00000.ts ...
+
+Playlists refer to each other and to their segments by relative names, so
+the tree can be uploaded under any storage prefix. FFmpegTranscoder decodes
+the source once for all renditions; FakeTranscoder writes placeholder
+segments for machines without ffmpeg and for tests.
+"""
+import math
+import os
+import subprocess
+from typing import NamedTuple
+
+from django.conf import settings
+
+from .media_derivatives import find_ffmpeg
+
+TRANSCODER_AUTO = "auto"  # ffmpeg when a binary is found, else the fake
+TRANSCODER_FFMPEG = "ffmpeg"
+TRANSCODER_FAKE = "fake"
+
+MASTER_PLAYLIST = "master.m3u8"
+RENDITION_PLAYLIST = "index.m3u8"
+
+
+class PackagingError(Exception):
+    """The transcoder could not package the source."""
+
+
+class Rendition(NamedTuple):
+    name: str  # Directory name, e.g. "720p"
+    height: int
+    video_bitrate: int  # kbit/s
+    audio_bitrate: int  # kbit/s
+
+    @property
+    def bandwidth(self):
+        return (self.video_bitrate + self.audio_bitrate) * 1000
+
+
+def ladder_for(source_height, ladder):
+    """
+    The renditions of `ladder` worth producing for a source `source_height`
+    pixels tall: never upscale, but always keep the smallest one. An unknown
+    height gets the whole ladder.
+    """
+    renditions = sorted((Rendition(*rung) for rung in ladder), key=lambda rendition: rendition.height)
+    if not source_height:
+        return renditions
+    return [rendition for rendition in renditions if rendition.height <= source_height] or renditions[:1]
+
+
+def master_playlist(renditions, width_for):
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for rendition in renditions:
+        lines += [
+            f"#EXT-X-STREAM-INF:BANDWIDTH={rendition.bandwidth},RESOLUTION={width_for(rendition.height)}x{rendition.height}",
+            f"{rendition.name}/{RENDITION_PLAYLIST}",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def scaled_width(height, source_width=None, source_height=None):
+    """Even width for `height` keeping the source aspect ratio (16:9 if unknown)."""
+    if source_width and source_height:
+        width = source_width * height / source_height
+    else:
+        width = height * 16 / 9
+    return int(round(width / 2)) * 2
+
+
+class FFmpegTranscoder:
+    def __init__(self, binary, timeout=3600, preset="veryfast"):
+        self.binary = binary
+        self.timeout = timeout
+        self.preset = preset
+
+    def package(self, source, output_dir, renditions, segment_seconds, has_audio=True):
+        count = len(renditions)
+        # Decode once, scale once per rendition
+        graph = f"[0:v]split={count}" + "".join(f"[s{i}]" for i in range(count)) + ";" + ";".join(
+            f"[s{i}]scale=-2:{rendition.height}[v{i}]" for i, rendition in enumerate(renditions)
+        )
+        args = ["-i", source, "-filter_complex", graph]
+        for i, rendition in enumerate(renditions):
+            args += ["-map", f"[v{i}]"]
+            if has_audio:
+                args += ["-map", "0:a:0"]
+        args += ["-c:v", "libx264", "-preset", self.preset, "-pix_fmt", "yuv420p", "-sc_threshold", "0"]
+        # Keyframes on segment boundaries so every rendition switches cleanly
+        args += ["-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})"]
+        for i, rendition in enumerate(renditions):
+            args += [
+                f"-b:v:{i}", f"{rendition.video_bitrate}k",
+                f"-maxrate:v:{i}", f"{rendition.video_bitrate * 107 // 100}k",
+                f"-bufsize:v:{i}", f"{rendition.video_bitrate * 3 // 2}k",
+            ]
+            if has_audio:
+                args += [f"-b:a:{i}", f"{rendition.audio_bitrate}k"]
+        if has_audio:
+            args += ["-c:a", "aac", "-ac", "2"]
+        stream_map = " ".join(
+            f"v:{i},a:{i},name:{rendition.name}" if has_audio else f"v:{i},name:{rendition.name}"
+            for i, rendition in enumerate(renditions)
+        )
+        args += [
+            "-var_stream_map", stream_map,
+            "-master_pl_name", MASTER_PLAYLIST,
+            "-f", "hls", "-hls_time", str(segment_seconds), "-hls_playlist_type", "vod",
+            "-hls_segment_filename", os.path.join(output_dir, "%v", "%05d.ts"),
+            os.path.join(output_dir, "%v", RENDITION_PLAYLIST),
+        ]
+        try:
+            result = subprocess.run(
+                [self.binary, "-hide_banner", "-loglevel", "error", "-y", *args],
+                capture_output=True, timeout=self.timeout, check=False,
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise PackagingError(str(e)) from e
+        if result.returncode != 0 or not os.path.exists(os.path.join(output_dir, MASTER_PLAYLIST)):
+            raise PackagingError(result.stderr.decode("utf-8", "replace").strip() or "ffmpeg wrote no playlist")
+
+
+class FakeTranscoder:
+    """Writes the playlists for `duration` seconds with placeholder segments; never reads the source."""
+
+    def __init__(self, duration=0, width=None, height=None):
+        self.duration = max(duration or 0, 1)
+        self.width = width
+        self.height = height
+
+    def package(self, source, output_dir, renditions, segment_seconds, has_audio=True):
+        count = math.ceil(self.duration / segment_seconds)
+        for rendition in renditions:
+            directory = os.path.join(output_dir, rendition.name)
+            os.makedirs(directory, exist_ok=True)
+            lines = [
+                "#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{segment_seconds}",
+                "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:VOD",
+            ]
+            for index in range(count):
+                length = min(segment_seconds, self.duration - index * segment_seconds)
+                segment = f"{index:05d}.ts"
+                with open(os.path.join(directory, segment), "wb") as f:
+                    f.write(b"\x47" + b"\xff" * 187)  # One packet-sized filler segment
+                lines += [f"#EXTINF:{length:.6f},", segment]
+            lines.append("#EXT-X-ENDLIST")
+            with open(os.path.join(directory, RENDITION_PLAYLIST), "w") as f:
+                f.write("\n".join(lines) + "\n")
+        with open(os.path.join(output_dir, MASTER_PLAYLIST), "w") as f:
+            f.write(master_playlist(renditions, lambda height: scaled_width(height, self.width, self.height)))
+
+
+def get_transcoder(duration=0, width=None, height=None):
+    """The configured transcoder; the fake one needs the probed duration and size."""
+    choice = getattr(settings, "VIDEO_HLS_TRANSCODER", TRANSCODER_AUTO)
+    if choice == TRANSCODER_FAKE:
+        return FakeTranscoder(duration, width, height)
+    binary = find_ffmpeg()
+    if binary:
+        return FFmpegTranscoder(binary, timeout=settings.VIDEO_HLS_TIMEOUT, preset=settings.VIDEO_HLS_PRESET)
+    if choice == TRANSCODER_FFMPEG:
+        raise PackagingError("ffmpeg was requested but no binary was found.")
+    return FakeTranscoder(duration, width, height)
@@ -0,0 +1,316 @@
+"""
+Reads duration, resolution and codec from the container header of a stored
+video (MP4/MOV `moov` box, Matroska/WebM segment Info and Tracks) with a few
+ranged reads, without downloading or decoding the media data.
+"""
+import struct
+from collections import OrderedDict
+
+from django.conf import settings
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .s3_signed_url import get_s3_client, normalize_key
+
+MAX_HEADER_BYTES = 64 * 1024 * 1024  # Largest moov / Tracks element read into memory
+MAX_ELEMENTS = 512  # Top-level boxes / segment children walked before giving up
+
+MP4_CODECS = {
+    'avc1': 'h264', 'avc3': 'h264', 'hvc1': 'hevc', 'hev1': 'hevc', 'av01': 'av1', 'vp09': 'vp9',
+    'vp08': 'vp8', 'mp4v': 'mpeg4', 'apcn': 'prores', 'apch': 'prores', 'jpeg': 'mjpeg',
+    'mp4a': 'aac', 'ac-3': 'ac3', 'ec-3': 'eac3', 'Opus': 'opus', '.mp3': 'mp3',
+}
+MATROSKA_CODECS = {
+    'V_MPEG4/ISO/AVC': 'h264', 'V_MPEGH/ISO/HEVC': 'hevc', 'V_AV1': 'av1', 'V_VP9': 'vp9', 'V_VP8': 'vp8',
+    'V_MPEG4/ISO/ASP': 'mpeg4', 'A_AAC': 'aac', 'A_OPUS': 'opus', 'A_VORBIS': 'vorbis', 'A_MPEG/L3': 'mp3',
+    'A_AC3': 'ac3', 'A_EAC3': 'eac3', 'A_FLAC': 'flac',
+}
+MP4_TOP_LEVEL = {b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pnot', b'uuid', b'styp', b'sidx', b'moof'}
+EBML_MAGIC = b'\x1a\x45\xdf\xa3'
+
+
+class ProbeError(Exception):
+    """The file is not a supported container or its header is damaged."""
+
+
+class RangedReader:
+    """
+    Random access to a stored file. On S3 every read is a ranged GET; reads
+    are rounded to `block_size` blocks and the last few blocks are kept, so
+    walking box or element headers costs few requests.
+    """
+
+    def __init__(self, storage, name, block_size=64 * 1024, cached_blocks=16):
+        self.storage = storage
+        self.name = name
+        self.block_size = block_size
+        self.cached_blocks = cached_blocks
+        self.size = storage.size(name)
+        self.requests = 0
+        self._blocks = OrderedDict()
+        self._file = None
+
+    def _fetch(self, start, end):
+        """Bytes [start, end) from storage."""
+        self.requests += 1
+        if isinstance(self.storage, S3Boto3Storage):
+            response = get_s3_client().get_object(
+                Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=normalize_key(self.name), Range=f"bytes={start}-{end - 1}"
+            )
+            return response['Body'].read()
+        if self._file is None:
+            self._file = self.storage.open(self.name, 'rb')
+        self._file.seek(start)
+        return self._file.read(end - start)
+
+    def _block(self, index):
+        block = self._blocks.get(index)
+        if block is None:
+            start = index * self.block_size
+            block = self._fetch(start, min(start + self.block_size, self.size))
+            self._blocks[index] = block
+            while len(self._blocks) > self.cached_blocks:
+                self._blocks.popitem(last=False)
+        else:
+            self._blocks.move_to_end(index)
+        return block
+
+    def read(self, offset, length):
+        """Up to `length` bytes at `offset` (fewer at the end of the file)."""
+        end = min(offset + length, self.size)
+        if offset >= end:
+            return b''
+        if end - offset > self.block_size:
+            return self._fetch(offset, end)  # Large reads (moov) bypass the block cache
+        first, last = offset // self.block_size, (end - 1) // self.block_size
+        data = b''.join(self._block(index) for index in range(first, last + 1))
+        start = offset - first * self.block_size
+        return data[start:start + end - offset]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def probe_file(storage, name):
+    """
+    Return {"container", "duration" (seconds, float or None), "width", "height",
+    "codec", "audio_codec"} for a stored video. Raises ProbeError.
+    """
+    reader = RangedReader(storage, name)
+    try:
+        head = reader.read(0, 12)
+        if head.startswith(EBML_MAGIC):
+            return probe_matroska(reader)
+        if head[4:8] in MP4_TOP_LEVEL:
+            return probe_mp4(reader)
+        raise ProbeError("Unsupported container.")
+    except (struct.error, IndexError) as e:
+        # A box or element cut off by a damaged or truncated upload
+        raise ProbeError(f"Damaged or truncated header: {e}") from e
+    finally:
+        reader.close()
+
+
+def _result(container):
+    return {"container": container, "duration": None, "width": None, "height": None, "codec": None, "audio_codec": None}
+
+
+# MP4 / QuickTime
+
+def _boxes(data, start, end):
+    """Yield (type, payload_start, payload_end) for the boxes in data[start:end]."""
+    while start + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, start)
+        header = 8
+        if size == 1:
+            if start + 16 > end:
+                return
+            size = struct.unpack_from('>Q', data, start + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header:
+            raise ProbeError("Damaged MP4 box.")
+        yield box_type, start + header, min(start + size, end)
+        start += size
+
+
+def _child(data, start, end, *path):
+    for box_type in path:
+        for found_type, payload_start, payload_end in _boxes(data, start, end):
+            if found_type == box_type:
+                start, end = payload_start, payload_end
+                break
+        else:
+            return None
+    return start, end
+
+
+def probe_mp4(reader):
+    moov = None
+    position = 0
+    for _ in range(MAX_ELEMENTS):
+        header = reader.read(position, 16)
+        if len(header) < 8:
+            break
+        size, box_type = struct.unpack_from('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size, header_size = struct.unpack_from('>Q', header, 8)[0], 16
+        elif size == 0:
+            size = reader.size - position
+        if size < header_size:
+            raise ProbeError("Damaged MP4 box.")
+        if box_type == b'moov':
+            if size - header_size > MAX_HEADER_BYTES:
+                raise ProbeError("MP4 header is too large.")
+            moov = reader.read(position + header_size, size - header_size)
+            break
+        position += size  # Skip mdat and friends without reading them
+    if moov is None:
+        raise ProbeError("No moov box found.")
+
+    result = _result('mp4')
+    end = len(moov)
+    mvhd = _child(moov, 0, end, b'mvhd')
+    if mvhd:
+        start = mvhd[0]
+        if moov[start] == 1:
+            timescale, duration = struct.unpack_from('>IQ', moov, start + 20)
+            unknown = 0xFFFFFFFFFFFFFFFF
+        else:
+            timescale, duration = struct.unpack_from('>II', moov, start + 12)
+            unknown = 0xFFFFFFFF
+        if timescale and duration and duration != unknown:
+            result['duration'] = duration / timescale
+        mehd = _child(moov, 0, end, b'mvex', b'mehd')  # Fragmented files keep the duration here
+        if result['duration'] is None and mehd and timescale:
+            fragment_duration = struct.unpack_from('>Q' if moov[mehd[0]] == 1 else '>I', moov, mehd[0] + 4)[0]
+            result['duration'] = fragment_duration / timescale or None
+
+    for box_type, start, stop in _boxes(moov, 0, end):
+        if box_type != b'trak':
+            continue
+        hdlr = _child(moov, start, stop, b'mdia', b'hdlr')
+        stsd = _child(moov, start, stop, b'mdia', b'minf', b'stbl', b'stsd')
+        if not hdlr or not stsd or stsd[1] - stsd[0] < 16:
+            continue
+        handler = moov[hdlr[0] + 8:hdlr[0] + 12]
+        entry = stsd[0] + 8  # version/flags, entry_count
+        codec = moov[entry + 4:entry + 8].decode('latin-1')
+        if handler == b'vide' and result['codec'] is None:
+            result['codec'] = MP4_CODECS.get(codec, codec.strip())
+            if entry + 36 <= stsd[1]:
+                result['width'], result['height'] = struct.unpack_from('>HH', moov, entry + 32)
+        elif handler == b'soun' and result['audio_codec'] is None:
+            result['audio_codec'] = MP4_CODECS.get(codec, codec.strip())
+    return result
+
+
+# Matroska / WebM
+
+def _vint(data, offset, keep_marker=False):
+    """Decode an EBML variable-length integer; returns (value, length, all_ones)."""
+    if offset >= len(data):
+        raise ProbeError("Truncated Matroska element.")
+    first = data[offset]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8 or offset + length > len(data):
+        raise ProbeError("Damaged Matroska element.")
+    value = first if keep_marker else first & (0xFF >> length)
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+    all_ones = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, length, all_ones
+
+
+def _element_header(data, offset):
+    """(element id, data size or None if unknown, header length)."""
+    element_id, id_length, _ = _vint(data, offset, keep_marker=True)
+    size, size_length, unknown = _vint(data, offset + id_length)
+    return element_id, None if unknown else size, id_length + size_length
+
+
+def _elements(data, start, end):
+    while start < end:
+        element_id, size, header = _element_header(data, start)
+        body = start + header
+        stop = end if size is None else min(body + size, end)
+        yield element_id, body, stop
+        start = stop
+
+
+def _uint(data, start, end):
+    return int.from_bytes(data[start:end], 'big')
+
+
+def probe_matroska(reader):
+    head = reader.read(0, 64)
+    _, ebml_size, ebml_header = _element_header(head, 0)
+    if ebml_size is None:
+        raise ProbeError("Damaged EBML header.")
+    ebml = reader.read(ebml_header, ebml_size)
+    result = _result('matroska')
+    for element_id, start, stop in _elements(ebml, 0, len(ebml)):
+        if element_id == 0x4282:  # DocType
+            result['container'] = ebml[start:stop].decode('ascii', 'replace').rstrip('\x00') or 'matroska'
+
+    position = ebml_header + ebml_size
+    header = reader.read(position, 12)
+    segment_id, segment_size, segment_header = _element_header(header, 0)
+    if segment_id != 0x18538067:
+        raise ProbeError("No Matroska segment found.")
+    position += segment_header
+    segment_end = reader.size if segment_size is None else min(position + segment_size, reader.size)
+
+    timecode_scale, duration, tracks_seen = 1000000, None, False
+    for _ in range(MAX_ELEMENTS):
+        if position >= segment_end or (duration is not None and tracks_seen):
+            break
+        element_id, size, element_header = _element_header(reader.read(position, 12), 0)
+        if size is None:
+            break  # Unknown-size (live) cluster: the headers we need come before it
+        body = position + element_header
+        if element_id in (0x1549A966, 0x1654AE6B):  # Info, Tracks
+            if size > MAX_HEADER_BYTES:
+                raise ProbeError("Matroska header is too large.")
+            data = reader.read(body, size)
+            if element_id == 0x1549A966:
+                for child_id, start, stop in _elements(data, 0, len(data)):
+                    if child_id == 0x2AD7B1:  # TimecodeScale (ns)
+                        timecode_scale = _uint(data, start, stop)
+                    elif child_id == 0x4489:  # Duration, in TimecodeScale units
+                        duration = struct.unpack('>f' if stop - start == 4 else '>d', data[start:stop])[0]
+            else:
+                tracks_seen = True
+                _matroska_tracks(data, result)
+        position = body + size
+
+    if duration is not None:
+        result['duration'] = duration * timecode_scale / 1e9
+    return result
+
+
+def _matroska_tracks(data, result):
+    for element_id, start, stop in _elements(data, 0, len(data)):
+        if element_id != 0xAE:  # TrackEntry
+            continue
+        track_type, codec, width, height = None, None, None, None
+        for child_id, child_start, child_stop in _elements(data, start, stop):
+            if child_id == 0x83:  # TrackType: 1 video, 2 audio
+                track_type = _uint(data, child_start, child_stop)
+            elif child_id == 0x86:  # CodecID
+                codec = data[child_start:child_stop].decode('ascii', 'replace').rstrip('\x00')
+            elif child_id == 0xE0:  # Video
+                for video_id, video_start, video_stop in _elements(data, child_start, child_stop):
+                    if video_id == 0xB0:
+                        width = _uint(data, video_start, video_stop)
+                    elif video_id == 0xBA:
+                        height = _uint(data, video_start, video_stop)
+        if track_type == 1 and result['codec'] is None:
+            result['codec'] = MATROSKA_CODECS.get(codec, codec)
+            result['width'], result['height'] = width, height
+        elif track_type == 2 and result['audio_codec'] is None:
+            result['audio_codec'] = MATROSKA_CODECS.get(codec, codec)
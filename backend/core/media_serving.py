@@ -0,0 +1,139 @@
+"""
+Serving stored files from Django for FileSystemStorage deployments: single
+byte ranges (206), validators for conditional requests, and either a
+sendfile-able response or an offload header for the front-end server.
+
+The response body is a RangeFile over the open file. It exposes fileno(),
+so WSGI servers with a sendfile file_wrapper (gunicorn) hand the range to
+os.sendfile() and the bytes never pass through Python; other servers read
+it in FileResponse blocks. Nothing ever reads a whole file into memory.
+"""
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+OFFLOAD_NONE = ""
+OFFLOAD_X_ACCEL = "x-accel"  # nginx: X-Accel-Redirect to an `internal` location
+OFFLOAD_X_SENDFILE = "x-sendfile"  # Apache mod_xsendfile, lighttpd
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single-range Range header, or None to serve
+    the whole file (no header, several ranges, or a unit other than bytes).
+    Raises RangeNotSatisfiable for ranges outside the file.
+    """
+    match = RANGE_RE.match((header or "").strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if size == 0:
+        raise RangeNotSatisfiable()
+    if not first:
+        if not last or int(last) == 0:
+            raise RangeNotSatisfiable()
+        return max(size - int(last), 0), size - 1  # Suffix range: the last N bytes
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def file_etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def if_range_matches(request, etag, last_modified):
+    """False if an If-Range validator no longer matches, in which case the whole file is sent."""
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/"')):
+        return if_range == etag  # Strong comparison only
+    since = parse_http_date_safe(if_range)
+    return since is not None and last_modified <= since
+
+
+class RangeFile:
+    """A read-only window of `length` bytes of `file` starting at its current position."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def serve_file(request, path, content_type, offload_name):
+    """
+    Response for the local file at `path` honouring Range, If-Range and the
+    conditional request headers. With MEDIA_SERVE_OFFLOAD set, the response
+    only names the file (`offload_name` for X-Accel-Redirect) and the
+    front-end server sends it, answering those headers itself.
+    """
+    offload = getattr(settings, "MEDIA_SERVE_OFFLOAD", OFFLOAD_NONE)
+    if offload == OFFLOAD_X_ACCEL:
+        # nginx answers Range and conditional requests itself
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = settings.MEDIA_SERVE_ACCEL_PREFIX + quote(offload_name)
+        return response
+    if offload == OFFLOAD_X_SENDFILE:
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = path
+        return response
+
+    stat = os.stat(path)
+    size = stat.st_size
+    etag, last_modified = file_etag(stat), int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:  # 304 Not Modified or 412 Precondition Failed
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
+    byte_range = None
+    if if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    file = open(path, "rb")
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(RangeFile(file, end - start + 1), content_type=content_type, status=206)
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
+
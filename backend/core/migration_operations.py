@@ -0,0 +1,67 @@
+"""
+Migration operations that are safe to run against large, live tables.
+
+On PostgreSQL, indexes are built with CREATE INDEX CONCURRENTLY, which does not
+block writes, and unique constraints are attached to such an index afterwards.
+Other databases fall back to the regular operations. Migrations using these
+must set `atomic = False`, since PostgreSQL cannot build indexes concurrently
+inside a transaction.
+"""
+from django.db import migrations
+
+
+def _is_postgres(schema_editor):
+    return schema_editor.connection.vendor == "postgresql"
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """AddIndex that uses CREATE INDEX CONCURRENTLY on PostgreSQL."""
+
+    def describe(self):
+        return "Create index %s on field(s) %s of model %s (concurrently on PostgreSQL)" % (
+            self.index.name,
+            ", ".join(self.index.fields),
+            self.model_name,
+        )
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if _is_postgres(schema_editor):
+            schema_editor.add_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if _is_postgres(schema_editor):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.remove_index(model, self.index)
+
+
+class AddUniqueConstraintConcurrently(migrations.AddConstraint):
+    """
+    AddConstraint for a plain UniqueConstraint over fields. On PostgreSQL the
+    unique index is built concurrently first and then promoted to the
+    constraint, so the table is only locked for a catalog update.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if not _is_postgres(schema_editor):
+            schema_editor.add_constraint(model, self.constraint)
+            return
+        quote = schema_editor.quote_name
+        table = model._meta.db_table
+        name = self.constraint.name
+        columns = ", ".join(quote(model._meta.get_field(field).column) for field in self.constraint.fields)
+        # A failed earlier attempt leaves an INVALID index behind; rebuild it
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {quote(name)}")
+        schema_editor.execute(f"CREATE UNIQUE INDEX CONCURRENTLY {quote(name)} ON {quote(table)} ({columns})")
+        schema_editor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} UNIQUE USING INDEX {quote(name)}")
@@ -1,3 +1,41 @@
 from django.db import models
+from django.utils.timezone import now
 
-# Create your models here.
+
+class StorageDeletion(models.Model):
+    """
+    Outbox of stored files to delete. Rows are written in the same transaction
+    as the change that orphaned the files and drained by a worker once it
+    commits (see core.storage_deletion), so requests never wait on storage and
+    a rolled-back change never loses its files.
+    """
+    name = models.CharField(max_length=1024)  # Storage name, e.g. videos/course_1/lecture.mp4
+    is_prefix = models.BooleanField(default=False)  # Every file under `name`, e.g. an HLS package
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    not_before = models.DateTimeField(default=now)  # Pushed back after each failed attempt
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['not_before', 'id'], name='storage_deletion_due_idx')]
+
+    def __str__(self):
+        return f"{self.name}{'*' if self.is_prefix else ''}"
+
+
+class MediaBlob(models.Model):
+    """
+    A stored file shared by every row that uploaded the same bytes, found by
+    its SHA-256. The first upload stays where it was stored and becomes the
+    blob; later ones point their file field at `name` instead of storing
+    another copy. `ref_count` counts those rows, and the file is deleted once
+    the last one lets go of it (see core.media_blobs).
+    """
+    digest = models.CharField(max_length=64, unique=True)  # SHA-256, hex
+    size = models.PositiveBigIntegerField()
+    name = models.CharField(max_length=1024, unique=True)  # Storage name, e.g. videos/course_1/lecture.mp4
+    ref_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
@@ -0,0 +1,190 @@
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+from .s3_signed_url import get_s3_client, normalize_key
+
+BACKEND_S3 = "s3"  # Parts go straight to the bucket through presigned upload_part URLs
+BACKEND_LOCAL = "local"  # Parts are PUT to core.views.MultipartPartView (offline/testing stand-in)
+
+LOCAL_SALT = "core.multipart"
+
+# S3 limits: every part but the last must be at least 5 MiB, and an upload has at most 10,000 parts
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+def part_size_for(file_size):
+    """Part size for an upload of `file_size` bytes: UPLOAD_PART_SIZE, grown to stay within MAX_PARTS."""
+    part_size = max(settings.UPLOAD_PART_SIZE, MIN_PART_SIZE)
+    return max(part_size, -(-file_size // MAX_PARTS))
+
+
+class S3MultipartBackend:
+    """S3 multipart uploads on the media bucket; `name` is the storage name, without the "media/" prefix."""
+
+    @property
+    def client(self):
+        return get_s3_client()
+
+    @property
+    def bucket(self):
+        return settings.AWS_STORAGE_BUCKET_NAME
+
+    def create(self, name, content_type):
+        response = self.client.create_multipart_upload(Bucket=self.bucket, Key=normalize_key(name), ContentType=content_type)
+        return response["UploadId"]
+
+    def part_url(self, name, upload_id, part_number, expiration, request=None):
+        return self.client.generate_presigned_url(
+            "upload_part",
+            Params={"Bucket": self.bucket, "Key": normalize_key(name), "UploadId": upload_id, "PartNumber": part_number},
+            ExpiresIn=expiration,
+        )
+
+    def upload_part(self, name, upload_id, part_number, data):
+        """Upload one part from the server (used by the streaming upload handler); returns its ETag."""
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=normalize_key(name), UploadId=upload_id, PartNumber=part_number, Body=data
+        )
+        return response["ETag"]
+
+    def list_parts(self, name, upload_id):
+        """Uploaded parts as [(part_number, etag, size)], in part order."""
+        parts = []
+        params = {"Bucket": self.bucket, "Key": normalize_key(name), "UploadId": upload_id}
+        while True:
+            response = self.client.list_parts(**params)
+            parts.extend((part["PartNumber"], part["ETag"], part["Size"]) for part in response.get("Parts", []))
+            if not response.get("IsTruncated"):
+                return parts
+            params["PartNumberMarker"] = response["NextPartNumberMarker"]
+
+    def complete(self, name, upload_id, parts):
+        """Assemble the object from `parts` and return its storage name."""
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=normalize_key(name),
+            UploadId=upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": number, "ETag": etag} for number, etag, _ in parts]},
+        )
+        return name
+
+    def abort(self, name, upload_id):
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=normalize_key(name), UploadId=upload_id)
+
+
+class LocalMultipartBackend:
+    """
+    S3-compatible stand-in that keeps parts on local disk under
+    UPLOAD_SESSION_LOCAL_ROOT and writes the assembled file to default storage.
+    Part URLs point at core.views.MultipartPartView with a signed token.
+    """
+
+    upload_id_pattern = re.compile(r"^[0-9a-f]{32}$")
+
+    def __init__(self, root):
+        self.root = root
+
+    def _directory(self, upload_id):
+        if not self.upload_id_pattern.match(upload_id):
+            raise ValueError("Invalid upload id.")
+        return os.path.join(self.root, upload_id)
+
+    def _part_path(self, upload_id, part_number):
+        return os.path.join(self._directory(upload_id), f"{part_number:05d}")
+
+    def create(self, name, content_type):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._directory(upload_id))
+        return upload_id
+
+    def part_url(self, name, upload_id, part_number, expiration, request=None):
+        token = signing.dumps({"u": upload_id, "n": part_number, "e": int(time.time()) + expiration}, salt=LOCAL_SALT)
+        url = reverse("multipart-upload-part", kwargs={"upload_id": upload_id, "part_number": part_number})
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        return f"{url}?token={token}"
+
+    @staticmethod
+    def verify_token(token, upload_id, part_number):
+        try:
+            payload = signing.loads(token, salt=LOCAL_SALT)
+        except signing.BadSignature:
+            return False
+        return payload["u"] == upload_id and payload["n"] == part_number and payload["e"] >= time.time()
+
+    def write_part(self, upload_id, part_number, stream, chunk_size=64 * 1024):
+        """Store one part from a file-like stream, replacing an earlier attempt; returns its ETag."""
+        directory = self._directory(upload_id)
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(upload_id)
+        digest = hashlib.md5()
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as part_file:
+            while chunk := stream.read(chunk_size):
+                digest.update(chunk)
+                part_file.write(chunk)
+        etag = f'"{digest.hexdigest()}"'
+        os.replace(part_file.name, self._part_path(upload_id, part_number))
+        with open(self._part_path(upload_id, part_number) + ".etag", "w") as etag_file:
+            etag_file.write(etag)
+        return etag
+
+    def upload_part(self, name, upload_id, part_number, data):
+        return self.write_part(upload_id, part_number, io.BytesIO(data))
+
+    def list_parts(self, name, upload_id):
+        directory = self._directory(upload_id)
+        parts = []
+        for entry in sorted(os.listdir(directory)):
+            if not entry.isdigit():
+                continue
+            path = os.path.join(directory, entry)
+            try:
+                with open(path + ".etag") as etag_file:
+                    etag = etag_file.read()
+            except FileNotFoundError:
+                continue  # Still being written
+            parts.append((int(entry), etag, os.path.getsize(path)))
+        return parts
+
+    def complete(self, name, upload_id, parts):
+        with tempfile.TemporaryFile() as assembled:
+            for number, _, _ in parts:
+                with open(self._part_path(upload_id, number), "rb") as part_file:
+                    shutil.copyfileobj(part_file, assembled)
+            assembled.seek(0)
+            stored_name = default_storage.save(name, File(assembled, name=name))
+        self.abort(name, upload_id)
+        return stored_name
+
+    def abort(self, name, upload_id):
+        shutil.rmtree(self._directory(upload_id), ignore_errors=True)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_multipart_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if getattr(settings, "UPLOAD_SESSION_BACKEND", BACKEND_S3) == BACKEND_LOCAL:
+                    _backend = LocalMultipartBackend(settings.UPLOAD_SESSION_LOCAL_ROOT)
+                else:
+                    _backend = S3MultipartBackend()
+    return _backend
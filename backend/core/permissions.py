@@ -1,3 +1,4 @@
+from django.shortcuts import get_object_or_404
 from rest_framework.permissions import BasePermission
 
 class IsAdminOrStaff(BasePermission):
@@ -15,3 +16,23 @@ class IsRegularUser(BasePermission):
     """
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.user_type == 'student'
+
+class IsEnrolled(BasePermission):
+    """
+    Allows access to users enrolled in the course named by the view's `course_id`
+    URL argument. Uses the cached enrollment membership, not a query per request.
+    An unknown course is a 404, as if the view had looked it up first.
+    """
+    message = "You are not enrolled in this course."
+
+    def has_permission(self, request, view):
+        from courses.membership import is_enrolled  # courses depends on core, not the other way round
+        from courses.models import Course
+
+        course_id = view.kwargs.get('course_id')
+        if not request.user.is_authenticated or course_id is None:
+            return False
+        if is_enrolled(request.user, course_id):
+            return True
+        get_object_or_404(Course, id=course_id)
+        return False
@@ -0,0 +1,124 @@
+import hashlib
+import hmac
+import threading
+from datetime import datetime, timezone
+from functools import lru_cache
+from urllib.parse import quote
+
+from django.conf import settings
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+SERVICE = "s3"
+MAX_EXPIRES = 604800  # SigV4 presigned URLs are valid for at most 7 days
+
+
+def _hmac(key, msg):
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+@lru_cache(maxsize=64)
+def signing_key(secret_key, date_stamp, region, service=SERVICE):
+    """
+    Derive the SigV4 signing key. It only depends on the secret, the day and
+    the region, so it is computed once per day instead of once per URL.
+    """
+    k_date = _hmac(f"AWS4{secret_key}".encode("utf-8"), date_stamp)
+    k_region = _hmac(k_date, region)
+    k_service = _hmac(k_region, service)
+    return _hmac(k_service, "aws4_request")
+
+
+def _uri_encode(value, safe="-_.~"):
+    return quote(value, safe=safe)
+
+
+class SigV4Presigner:
+    """
+    Builds SigV4 presigned GET URLs for S3 without a boto3 client.
+
+    Only static credentials are supported; deployments that rely on role or
+    session credentials keep using the boto3 path.
+    """
+
+    def __init__(self, access_key, secret_key, region, bucket, endpoint=None):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.bucket = bucket
+        self.host = endpoint or f"{bucket}.s3.{region}.amazonaws.com"
+
+    def presign_get(self, key, expires_in=MAX_EXPIRES, response_content_type=None, signed_at=None):
+        """
+        Return a presigned GET URL for `key`.
+        `signed_at` is an aware datetime; it defaults to the current time.
+        """
+        if not 1 <= expires_in <= MAX_EXPIRES:
+            raise ValueError(f"expires_in must be between 1 and {MAX_EXPIRES} seconds.")
+
+        signed_at = (signed_at or datetime.now(timezone.utc)).astimezone(timezone.utc)
+        amz_date = signed_at.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = amz_date[:8]
+        scope = f"{date_stamp}/{self.region}/{SERVICE}/aws4_request"
+
+        query = {
+            "X-Amz-Algorithm": ALGORITHM,
+            "X-Amz-Credential": f"{self.access_key}/{scope}",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(expires_in),
+            "X-Amz-SignedHeaders": "host",
+        }
+        if response_content_type:
+            query["response-content-type"] = response_content_type
+        canonical_query = "&".join(
+            f"{_uri_encode(name)}={_uri_encode(value)}" for name, value in sorted(query.items())
+        )
+
+        canonical_uri = "/" + _uri_encode(key, safe="-_.~/")
+        canonical_request = "\n".join([
+            "GET",
+            canonical_uri,
+            canonical_query,
+            f"host:{self.host}\n",
+            "host",
+            "UNSIGNED-PAYLOAD",
+        ])
+        string_to_sign = "\n".join([
+            ALGORITHM,
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+        ])
+        signature = hmac.new(
+            signing_key(self.secret_key, date_stamp, self.region),
+            string_to_sign.encode("utf-8"),
+            hashlib.sha256,
+        ).hexdigest()
+
+        return f"https://{self.host}{canonical_uri}?{canonical_query}&X-Amz-Signature={signature}"
+
+
+_presigner = None
+_presigner_lock = threading.Lock()
+
+
+def get_presigner():
+    """
+    Return the offline presigner, or None when it is disabled or static
+    credentials are not configured (callers then fall back to boto3).
+    """
+    global _presigner
+    if not getattr(settings, "S3_OFFLINE_PRESIGNER", False):
+        return None
+    if not (settings.AWS_ACCESS_KEY_ID and settings.AWS_SECRET_ACCESS_KEY and settings.AWS_S3_REGION_NAME):
+        return None
+    if _presigner is None:
+        with _presigner_lock:
+            if _presigner is None:
+                _presigner = SigV4Presigner(
+                    access_key=settings.AWS_ACCESS_KEY_ID,
+                    secret_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region=settings.AWS_S3_REGION_NAME,
+                    bucket=settings.AWS_STORAGE_BUCKET_NAME,
+                    endpoint=getattr(settings, "S3_PRESIGNER_ENDPOINT", None) or None,
+                )
+    return _presigner
@@ -1,50 +1,137 @@
 import boto3
+import logging
 import mimetypes  # Detects file MIME type
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError
 from django.conf import settings
+from .presigner import get_presigner
+from .signed_url_cache import get_signed_url_cache
 
-def generate_signed_url(file_path, expiration=604800):  # 7 days expiration
+logger = logging.getLogger(__name__)
+
+# HLS packages (see core.media_packaging); the system tables map .ts to Qt translations
+mimetypes.add_type("application/vnd.apple.mpegurl", ".m3u8")
+mimetypes.add_type("video/mp2t", ".ts")
+
+
+@lru_cache(maxsize=1)
+def get_s3_client():
     """
-    Generate a signed URL for an object stored in S3.
-    Ensures correct 'media/' path for private storage.
+    Return a shared S3 client. boto3 clients are thread-safe, so building one
+    per process avoids paying credential and endpoint resolution on every URL.
     """
-    try:
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_S3_REGION_NAME,
-        )
+    return boto3.client(
+        's3',
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_S3_REGION_NAME,
+    )
+
+
+def normalize_key(file_path):
+    # S3 expects "media/" prefix for media files
+    if not file_path.startswith("media/"):
+        file_path = f"media/{file_path}"
+    return file_path
 
-        # ✅ Ensure correct file path (S3 expects "media/" prefix for media files)
-        if not file_path.startswith("media/"):
-            file_path = f"media/{file_path}"
 
-        # ✅ Detect Content Type
-        content_type, _ = mimetypes.guess_type(file_path)  # Get proper MIME type
-        
-        # ✅ Explicitly handle `.mkv` as `video/mp4`
-        if file_path.endswith(".mkv") or file_path.endswith(".mp4"):
-            content_type = "video/mp4"  # Ensure proper video format
-        
-        if not content_type:  # Default to binary stream if unknown
-            content_type = "application/octet-stream"
+def detect_content_type(file_path):
+    content_type, _ = mimetypes.guess_type(file_path)  # Get proper MIME type
+
+    # Explicitly handle `.mkv` as `video/mp4`
+    if file_path.endswith(".mkv") or file_path.endswith(".mp4"):
+        content_type = "video/mp4"  # Ensure proper video format
+
+    if not content_type:  # Default to binary stream if unknown
+        content_type = "application/octet-stream"
+    return content_type
+
+
+def _signer():
+    """
+    Return a callable(file_path, content_type, expiration, signed_at) sharing
+    one setup for a batch. Only the offline presigner can honour `signed_at`;
+    boto3 always signs at the current time.
+    """
+    presigner = get_presigner()
+    if presigner is not None:
+        return lambda file_path, content_type, expiration, signed_at: presigner.presign_get(
+            file_path,
+            expiration,
+            response_content_type=content_type,
+            signed_at=datetime.fromtimestamp(signed_at, timezone.utc),
+        )
+
+    s3_client = get_s3_client()
 
+    def sign(file_path, content_type, expiration, signed_at):
         params = {
             'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
             'Key': file_path,
             'ResponseContentType': content_type,  # Set proper content type
         }
+        return s3_client.generate_presigned_url('get_object', Params=params, ExpiresIn=expiration)
+    return sign
 
-        # ✅ Generate Signed URL
-        signed_url = s3_client.generate_presigned_url(
-            'get_object',
-            Params=params,
-            ExpiresIn=expiration,
-        )
 
-        print(f"🔹 Generated Signed URL for {file_path}: {signed_url}")  # Debugging Log
-        return signed_url
+def signing_window(asset_class=None, expiration=604800):
+    """
+    Return (expiration, signing window) for an asset class from SIGNED_URL_ASSET_CLASSES.
+    A window of 0 signs at the current time; otherwise the signing time is
+    aligned to the start of the window so URLs are identical within it.
+    """
+    if asset_class is None:
+        return expiration, 0
+    config = settings.SIGNED_URL_ASSET_CLASSES[asset_class]
+    return config.get("expiration", expiration), config.get("window", 0)
+
+
+def sign_many(keys, expiration=604800, asset_class=None, content_types=None):
+    """
+    Sign a batch of storage keys in one pass.
+    Returns {key: signed_url} for every key given, using the signed URL cache
+    for repeats and a single signer setup for the misses.
+    `asset_class` (video, thumbnail, course_image, profile_image) selects the
+    expiry and bucketing window configured in SIGNED_URL_ASSET_CLASSES.
+    `content_types` maps keys to content types stored at upload time; other
+    keys fall back to detection from the file name.
+    """
+    try:
+        expiration, window = signing_window(asset_class, expiration)
+        now = time.time()
+        signed_at = now - now % window if window else None
+
+        stored_types = content_types or {}
+        detected_types = {}  # Detected content type only depends on the extension
+        cache_keys = {}
+        for key in set(keys):
+            file_path = normalize_key(key)
+            content_type = stored_types.get(key)
+            if not content_type:
+                extension = file_path.rsplit(".", 1)[-1]
+                if extension not in detected_types:
+                    detected_types[extension] = detect_content_type(file_path)
+                content_type = detected_types[extension]
+            cache_keys[key] = (file_path, content_type, expiration, signed_at)
+
+        cache = get_signed_url_cache()
+        cached = cache.get_many(set(cache_keys.values()))
+        missing = {cache_key for cache_key in cache_keys.values() if cache_key not in cached}
+        if missing:
+            sign = _signer()
+            signing_time = signed_at or now
+            fresh = {}
+            for cache_key in missing:
+                file_path, content_type = cache_key[:2]
+                url = sign(file_path, content_type, expiration, signing_time)
+                fresh[cache_key] = (url, signing_time + expiration)
+            logger.debug("Signed %d URLs (%d served from cache)", len(fresh), len(cached))
+            cache.set_many(fresh)
+            cached.update({cache_key: url for cache_key, (url, _) in fresh.items()})
+
+        return {key: cached[cache_key] for key, cache_key in cache_keys.items()}
 
     except NoCredentialsError:
         raise Exception("AWS credentials not found. Check AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY.")
@@ -52,3 +139,13 @@ def generate_signed_url(file_path, expiration=604800):  # 7 days expiration
         raise Exception("Incomplete AWS credentials. Check your settings.")
     except Exception as e:
         raise Exception(f"Error generating signed URL: {str(e)}")
+
+
+def generate_signed_url(file_path, expiration=604800, asset_class=None, content_type=None):  # 7 days expiration
+    """
+    Generate a signed URL for an object stored in S3.
+    Ensures correct 'media/' path for private storage.
+    Signed URLs are reused from the signed URL cache while they stay valid.
+    """
+    content_types = {file_path: content_type} if content_type else None
+    return sign_many([file_path], expiration, asset_class, content_types)[file_path]
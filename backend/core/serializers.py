@@ -0,0 +1,75 @@
+from django.db import models
+from rest_framework import serializers
+from .media_access import media_url
+from .media_metadata import stored_content_type
+from .s3_signed_url import generate_signed_url, normalize_key, sign_many
+
+
+def resolve_source(instance, source):
+    """Follow a dotted attribute path such as "video.thumbnail"; None if any step is empty."""
+    for attr in source.split("."):
+        if instance is None:
+            return None
+        instance = getattr(instance, attr, None)
+    return instance
+
+
+class SignedURLListSerializer(serializers.ListSerializer):
+    """
+    Signs every storage key on the page in one pass before the items are
+    rendered, so a list response pays the signing setup once.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(iterable)
+        self.child.prefetch_signed_urls(items)
+        return super().to_representation(items)
+
+
+class SignedURLMixin:
+    """
+    For serializers that expose signed URLs for file fields.
+    `signed_url_sources` maps the (dotted) file field paths to sign to their
+    asset class. Set `list_serializer_class = SignedURLListSerializer` in Meta
+    so that many=True serializers sign them in bulk.
+
+    Files under the `plain_media_prefixes` passed in the context are covered by
+    a course media credential and get plain, unsigned URLs instead.
+    """
+    signed_url_sources = {}
+
+    def prefetch_signed_urls(self, instances):
+        keys_by_class = {}
+        content_types = {}
+        for instance in instances:
+            for source, asset_class in self.signed_url_sources.items():
+                field_file = resolve_source(instance, source)
+                if field_file and field_file.name and not self.plain_media_url_for(field_file):
+                    key = normalize_key(field_file.name)
+                    keys_by_class.setdefault(asset_class, set()).add(key)
+                    content_types[key] = stored_content_type(field_file)
+        self._signed_urls = {}
+        for asset_class, keys in keys_by_class.items():
+            for key, url in sign_many(keys, asset_class=asset_class, content_types=content_types).items():
+                self._signed_urls[(asset_class, key)] = url
+
+    def plain_media_url_for(self, field_file):
+        """Plain URL if the file is covered by the course media credential, else None."""
+        prefixes = tuple(self.context.get("plain_media_prefixes") or ())
+        if prefixes and field_file and field_file.name and field_file.name.startswith(prefixes):
+            return media_url(field_file.name, self.context.get("request"))
+        return None
+
+    def signed_url_for(self, field_file, asset_class=None):
+        """Return the signed URL for a file field, using the page's batch when available."""
+        if not field_file or not field_file.name:
+            return None
+        plain_url = self.plain_media_url_for(field_file)
+        if plain_url:
+            return plain_url
+        key = normalize_key(field_file.name)
+        signed_urls = getattr(self, "_signed_urls", None) or {}
+        return signed_urls.get((asset_class, key)) or generate_signed_url(
+            key, asset_class=asset_class, content_type=stored_content_type(field_file)
+        )
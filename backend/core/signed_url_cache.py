@@ -0,0 +1,122 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class SignedURLCache:
+    """
+    Two-tier cache for signed URLs.
+
+    Entries are keyed by (key, content type, expiry window) and remember when
+    the URL they hold stops working. A URL is only handed out while it still
+    has at least `min_remaining` seconds of validity left, so callers never get
+    a link that expires while the page is open.
+
+    The local tier is a bounded per-process LRU. The shared tier is an optional
+    Django cache alias (Redis in production, LocMemCache as a local stand-in)
+    so that all workers reuse the same signatures.
+    """
+
+    key_prefix = "signed-url"
+
+    def __init__(self, max_entries=2048, min_remaining=3600, shared_alias=None):
+        self.max_entries = max_entries
+        self.min_remaining = min_remaining
+        self.shared_alias = shared_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        if not self.shared_alias:
+            return None
+        return caches[self.shared_alias]
+
+    def _shared_key(self, cache_key):
+        digest = hashlib.sha1(repr(cache_key).encode("utf-8")).hexdigest()
+        return f"{self.key_prefix}:{digest}"
+
+    def _is_fresh(self, expires_at, now):
+        return expires_at - now > self.min_remaining
+
+    def get(self, cache_key):
+        """Return a cached URL for `cache_key`, or None if missing or near expiry."""
+        return self.get_many([cache_key]).get(cache_key)
+
+    def get_many(self, cache_keys):
+        """Return {cache_key: url} for every key that has a fresh cached URL."""
+        now = time.time()
+        found = {}
+        missing = []
+        with self._lock:
+            for cache_key in cache_keys:
+                entry = self._entries.get(cache_key)
+                if entry is not None and self._is_fresh(entry[1], now):
+                    self._entries.move_to_end(cache_key)
+                    found[cache_key] = entry[0]
+                else:
+                    self._entries.pop(cache_key, None)
+                    missing.append(cache_key)
+
+        shared = self.shared
+        if shared is None or not missing:
+            return found
+        shared_keys = {self._shared_key(cache_key): cache_key for cache_key in missing}
+        for shared_key, (url, expires_at) in shared.get_many(list(shared_keys)).items():
+            if self._is_fresh(expires_at, now):
+                cache_key = shared_keys[shared_key]
+                self._remember(cache_key, url, expires_at)
+                found[cache_key] = url
+        return found
+
+    def set(self, cache_key, url, expires_at):
+        """Store a URL that stops being valid at the unix timestamp `expires_at`."""
+        self.set_many({cache_key: (url, expires_at)})
+
+    def set_many(self, entries):
+        """Store {cache_key: (url, expires_at)} in both tiers."""
+        now = time.time()
+        fresh = {k: v for k, v in entries.items() if self._is_fresh(v[1], now)}
+        for cache_key, (url, expires_at) in fresh.items():
+            self._remember(cache_key, url, expires_at)
+
+        shared = self.shared
+        if shared is None or not fresh:
+            return
+        # Let the shared tier drop entries before they become unusable. set_many
+        # takes a single timeout, so use the one that expires first.
+        timeout = int(min(expires_at for _, expires_at in fresh.values()) - now - self.min_remaining)
+        shared.set_many({self._shared_key(k): v for k, v in fresh.items()}, timeout)
+
+    def _remember(self, cache_key, url, expires_at):
+        with self._lock:
+            self._entries[cache_key] = (url, expires_at)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_signed_url_cache():
+    """Return the process-wide signed URL cache configured from settings."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SignedURLCache(
+                    max_entries=getattr(settings, "SIGNED_URL_CACHE_MAX_ENTRIES", 2048),
+                    min_remaining=getattr(settings, "SIGNED_URL_CACHE_MIN_REMAINING", 3600),
+                    shared_alias=getattr(settings, "SIGNED_URL_CACHE_ALIAS", None),
+                )
+    return _cache
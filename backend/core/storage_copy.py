@@ -0,0 +1,53 @@
+"""
+Copying stored files without moving their bytes through Python. On S3 the
+bucket copies the object itself (CopyObject, or UploadPartCopy for objects
+over the multipart threshold); on FileSystemStorage the kernel does
+(shutil.copyfile uses copy_file_range/sendfile on Linux). Other storages
+fall back to streaming the file through the worker.
+"""
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .s3_signed_url import detect_content_type, get_s3_client, normalize_key
+
+COPY_ERRORS = (BotoCoreError, ClientError, OSError)
+
+
+def copy_file(storage, source, target):
+    """Copy the stored file `source` to `target`, or a free name next to it; returns the name used."""
+    target = storage.get_available_name(target)
+    if isinstance(storage, S3Boto3Storage):
+        bucket = settings.AWS_STORAGE_BUCKET_NAME
+        get_s3_client().copy(
+            {'Bucket': bucket, 'Key': normalize_key(source)}, bucket, normalize_key(target),
+            ExtraArgs={'ContentType': detect_content_type(target), 'MetadataDirective': 'REPLACE'},
+        )
+    elif isinstance(storage, FileSystemStorage):
+        path = storage.path(target)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(storage.path(source), path)
+    else:
+        with storage.open(source, "rb") as f:
+            target = storage.save(target, f)
+    return target
+
+
+def copy_files(storage, pairs, workers=None):
+    """
+    Copy (source, target) pairs in parallel, yielding (source, name used or
+    the exception) as each one finishes, so callers can report progress.
+    """
+    workers = workers or settings.STORAGE_COPY_WORKERS
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="storage-copy") as executor:
+        futures = {executor.submit(copy_file, storage, source, target): source for source, target in pairs}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except COPY_ERRORS as e:
+                yield futures[future], e
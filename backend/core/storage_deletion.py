@@ -0,0 +1,153 @@
+"""
+Deleting stored files off the request path. Callers enqueue names with
+delete_later() inside the transaction that orphans them; once it commits,
+a Celery task drains the StorageDeletion outbox in batches of up to 1000
+keys, one DeleteObjects call per batch on S3, and reschedules failures
+with a growing delay. Without BACKGROUND_TASKS the outbox is drained by
+the drain_storage_deletions command.
+"""
+import logging
+from datetime import timedelta
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.timezone import now
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .models import StorageDeletion
+from .s3_signed_url import get_s3_client, normalize_key
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = 1000  # DeleteObjects limit
+MAX_RETRY_DELAY = 6 * 3600
+
+
+def delete_later(*names, prefixes=()):
+    """
+    Queue stored files (and every file under `prefixes`) for deletion once
+    the current transaction commits. Empty names are skipped.
+    """
+    rows = [StorageDeletion(name=name) for name in names if name]
+    rows += [StorageDeletion(name=prefix, is_prefix=True) for prefix in prefixes if prefix]
+    if not rows:
+        return
+    StorageDeletion.objects.bulk_create(rows)
+    if not settings.BACKGROUND_TASKS:
+        return
+    connection = transaction.get_connection()
+    # One drain per transaction, however many deletes (e.g. a course cascading to its videos) enqueue
+    if not any(callback[1] is schedule_drain for callback in connection.run_on_commit):
+        transaction.on_commit(schedule_drain)
+
+
+def schedule_drain():
+    from .tasks import drain_storage_deletions_task  # The task module imports this one
+
+    drain_storage_deletions_task.delay()
+
+
+def iter_stored_files(storage, prefix):
+    """
+    Yield (name, size, last modified) for every stored file under `prefix` (a
+    directory, ending with a slash), a listing page at a time, so even
+    millions of objects are never held in memory.
+    """
+    if isinstance(storage, S3Boto3Storage):
+        paginator = get_s3_client().get_paginator('list_objects_v2')
+        root = normalize_key("")
+        for page in paginator.paginate(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Prefix=normalize_key(prefix)):
+            for item in page.get('Contents', []):
+                yield item['Key'][len(root):], item['Size'], item['LastModified']
+        return
+    try:
+        directories, files = storage.listdir(prefix)
+    except FileNotFoundError:
+        return
+    for name in files:
+        yield prefix + name, storage.size(prefix + name), storage.get_modified_time(prefix + name)
+    for name in directories:
+        yield from iter_stored_files(storage, f"{prefix}{name}/")
+
+
+def list_files(storage, prefix):
+    """Names of the stored files under `prefix` (a directory, ending with a slash)."""
+    for name, _, _ in iter_stored_files(storage, prefix):
+        yield name
+
+
+def delete_files(storage, names):
+    """Delete up to MAX_BATCH_SIZE stored files; returns {name: error} for the ones that failed."""
+    if not isinstance(storage, S3Boto3Storage):
+        errors = {}
+        for name in names:
+            try:
+                storage.delete(name)  # A missing file is not an error
+            except OSError as e:
+                errors[name] = str(e)
+        return errors
+
+    names_by_key = {normalize_key(name): name for name in names}
+    try:
+        response = get_s3_client().delete_objects(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+            Delete={'Objects': [{'Key': key} for key in names_by_key], 'Quiet': True},
+        )
+    except (BotoCoreError, ClientError) as e:
+        return {name: str(e) for name in names}
+    return {
+        names_by_key[error['Key']]: f"{error.get('Code')}: {error.get('Message')}"
+        for error in response.get('Errors', []) if error.get('Key') in names_by_key
+    }
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(settings.STORAGE_DELETION_RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY))
+
+
+def drain_storage_deletions(batch_size=None, storage=None):
+    """
+    Delete the files of every due outbox row, a batch at a time. Rows are
+    claimed with SKIP LOCKED, so several workers can drain side by side.
+    Returns (deleted, failed) counts.
+    """
+    batch_size = min(batch_size or settings.STORAGE_DELETION_BATCH_SIZE, MAX_BATCH_SIZE)
+    storage = storage or default_storage
+    deleted = failed = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                StorageDeletion.objects.select_for_update(skip_locked=True)
+                .filter(not_before__lte=now()).order_by('not_before', 'id')[:batch_size]
+            )
+            if not rows:
+                return deleted, failed
+
+            errors = {}  # Row id -> error
+            files = [row for row in rows if not row.is_prefix]
+            for row in rows:
+                if row.is_prefix:
+                    # Expand into one row per file, deleted by the next batches
+                    try:
+                        names = list(list_files(storage, row.name.rstrip('/') + '/'))
+                    except (BotoCoreError, ClientError, OSError) as e:
+                        errors[row.pk] = str(e)
+                        continue
+                    StorageDeletion.objects.bulk_create([StorageDeletion(name=name) for name in names], batch_size=batch_size)
+            if files:
+                failed_names = delete_files(storage, [row.name for row in files])
+                errors.update({row.pk: failed_names[row.name] for row in files if row.name in failed_names})
+
+            failed_rows = [row for row in rows if row.pk in errors]
+            StorageDeletion.objects.filter(pk__in=[row.pk for row in rows if row.pk not in errors]).delete()
+            for row in failed_rows:
+                row.attempts += 1
+                row.last_error = errors[row.pk][:2000]
+                row.not_before = now() + retry_delay(row.attempts)
+            StorageDeletion.objects.bulk_update(failed_rows, ['attempts', 'last_error', 'not_before'])
+        deleted += len(files) - len([row for row in files if row.pk in errors])
+        failed += len(failed_rows)
+        if failed_rows:
+            logger.warning("Deleting %d of %d stored files failed; retrying later", len(failed_rows), len(rows))
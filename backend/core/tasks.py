@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from .storage_deletion import drain_storage_deletions
+
+
+@shared_task(ignore_result=True)
+def drain_storage_deletions_task():
+    drain_storage_deletions()
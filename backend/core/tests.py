@@ -1,3 +1,425 @@
-from django.test import TestCase
+import base64
+import datetime
+import json
+import os
+import re
+import shutil
+import struct
+import tempfile
+import time
+from io import BytesIO
+from types import SimpleNamespace
+from urllib.parse import parse_qsl, urlsplit
 
-# Create your tests here.
+import boto3
+from botocore.config import Config
+
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.timezone import now
+from PIL import Image
+from rest_framework_simplejwt.tokens import RefreshToken
+
+import core.presigner
+import core.signed_url_cache
+import courses.membership
+
+from .media_access import issue_course_credential, set_credential_cookies, verify_local_token
+from .media_derivatives import StubGenerator, sprite_layout
+from .media_packaging import FakeTranscoder, ladder_for
+from .media_probe import ProbeError, probe_file
+from .media_serving import RangeNotSatisfiable, parse_range
+from .models import StorageDeletion
+from .s3_signed_url import generate_signed_url, sign_many, signing_window
+from .presigner import SigV4Presigner
+from .signed_url_cache import SignedURLCache
+from .storage_deletion import delete_later, drain_storage_deletions
+
+
+def mp4_box(box_type, payload):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def mp4_track(handler, codec, width=0, height=0):
+    hdlr = b'\0' * 8 + handler + b'\0' * 13
+    entry = b'\0' * 6 + struct.pack('>H', 1) + b'\0' * 16 + struct.pack('>HH', width, height) + b'\0' * 50
+    stsd = b'\0' * 4 + struct.pack('>I', 1) + mp4_box(codec, entry)
+    stbl = mp4_box(b'stbl', mp4_box(b'stsd', stsd))
+    return mp4_box(b'trak', mp4_box(b'mdia', mp4_box(b'hdlr', hdlr) + mp4_box(b'minf', stbl)))
+
+
+def ebml(element_id, payload):
+    return element_id + b'\x01' + len(payload).to_bytes(7, 'big') + payload
+
+
+class SignedURLCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches["shared"].clear()
+
+    def test_urls_are_reused_only_while_they_have_time_left(self):
+        cache = SignedURLCache(max_entries=10, min_remaining=3600)
+        now = time.time()
+        cache.set(("a",), "https://a", now + 3600 + 60)
+        cache.set(("b",), "https://b", now + 3600 - 60)  # Would expire within min_remaining: not kept
+        self.assertEqual(cache.get_many([("a",), ("b",)]), {("a",): "https://a"})
+        with mock.patch("core.signed_url_cache.time.time", return_value=now + 120):
+            self.assertIsNone(cache.get(("a",)))  # Now too close to expiry
+
+    def test_local_tier_is_a_bounded_lru(self):
+        cache = SignedURLCache(max_entries=2, min_remaining=0)
+        expires_at = time.time() + 600
+        cache.set(("a",), "https://a", expires_at)
+        cache.set(("b",), "https://b", expires_at)
+        cache.get(("a",))  # Most recently used
+        cache.set(("c",), "https://c", expires_at)
+        self.assertEqual(set(cache.get_many([("a",), ("b",), ("c",)])), {("a",), ("c",)})
+
+    def test_shared_tier_serves_other_workers(self):
+        worker, other_worker = SignedURLCache(shared_alias="shared"), SignedURLCache(shared_alias="shared")
+        worker.set(("a",), "https://a", time.time() + 7200)
+        self.assertEqual(other_worker.get(("a",)), "https://a")
+        self.assertIsNone(SignedURLCache().get(("a",)))  # Without a shared tier
+
+
+class PresignerTests(SimpleTestCase):
+    def test_matches_botocore(self):
+        client = boto3.client(
+            "s3", aws_access_key_id="AKIDEXAMPLE", aws_secret_access_key="secret", region_name="eu-west-1",
+            config=Config(signature_version="s3v4", s3={"addressing_style": "virtual"}),
+        )
+        presigner = SigV4Presigner("AKIDEXAMPLE", "secret", "eu-west-1", "bucket")
+        for key, content_type in (("media/videos/course_1/week 1/lecture (final).mp4", "video/mp4"), ("media/notes+draft.pdf", None)):
+            with self.subTest(key):
+                params = {"Bucket": "bucket", "Key": key}
+                if content_type:
+                    params["ResponseContentType"] = content_type
+                expected = client.generate_presigned_url("get_object", Params=params, ExpiresIn=3600)
+                query = dict(parse_qsl(urlsplit(expected).query))
+                signed_at = datetime.datetime.strptime(query["X-Amz-Date"], "%Y%m%dT%H%M%SZ").replace(tzinfo=datetime.timezone.utc)
+                url = presigner.presign_get(key, 3600, response_content_type=content_type, signed_at=signed_at)
+                self.assertEqual(urlsplit(url)[:3], urlsplit(expected)[:3])
+                self.assertEqual(dict(parse_qsl(urlsplit(url).query)), query)
+
+    def test_rejects_expiry_beyond_seven_days(self):
+        with self.assertRaises(ValueError):
+            SigV4Presigner("AKIDEXAMPLE", "secret", "eu-west-1", "bucket").presign_get("media/a.pdf", 604801)
+
+
+@override_settings(
+    S3_OFFLINE_PRESIGNER=True, S3_PRESIGNER_ENDPOINT="", AWS_ACCESS_KEY_ID="AKIDEXAMPLE", AWS_SECRET_ACCESS_KEY="secret",
+    AWS_S3_REGION_NAME="eu-west-1", AWS_STORAGE_BUCKET_NAME="bucket", SIGNED_URL_CACHE_ALIAS="shared",
+)
+class SignedURLBatchTests(SimpleTestCase):
+    def setUp(self):
+        for module, name in ((core.presigner, "_presigner"), (core.signed_url_cache, "_cache")):
+            setattr(module, name, None)
+            self.addCleanup(setattr, module, name, None)
+        caches["shared"].clear()
+
+    def test_signs_each_key_once_per_batch(self):
+        keys = ["videos/course_1/a.mp4", "images/b.png", "videos/course_1/a.mp4", "media/c.pdf"]
+        with mock.patch.object(SigV4Presigner, "presign_get", autospec=True, side_effect=SigV4Presigner.presign_get) as presign:
+            content_types = {"media/c.pdf": "application/pdf; charset=binary"}
+            urls = sign_many(keys, content_types=content_types)
+            self.assertEqual(presign.call_count, 3)
+            self.assertEqual(sign_many(keys, content_types=content_types), urls)  # Served from the cache
+            self.assertEqual(presign.call_count, 3)
+        self.assertEqual(set(urls), set(keys))
+        self.assertEqual(
+            {key: (urlsplit(url).path, dict(parse_qsl(urlsplit(url).query))["response-content-type"]) for key, url in urls.items()},
+            {
+                "videos/course_1/a.mp4": ("/media/videos/course_1/a.mp4", "video/mp4"),
+                "images/b.png": ("/media/images/b.png", "image/png"),
+                "media/c.pdf": ("/media/c.pdf", "application/pdf; charset=binary"),  # Stored at upload, not guessed
+            },
+        )
+        self.assertEqual(generate_signed_url("images/b.png"), urls["images/b.png"])
+
+    @override_settings(SIGNED_URL_ASSET_CLASSES={"thumbnail": {"expiration": 86400, "window": 3600}})
+    def test_signing_time_is_bucketed_per_asset_class(self):
+        def sign_at(timestamp):
+            core.signed_url_cache.get_signed_url_cache().clear()  # Equal URLs must not come from the cache
+            caches["shared"].clear()
+            with mock.patch("core.s3_signed_url.time.time", return_value=timestamp):
+                return generate_signed_url("images/b.png", asset_class="thumbnail")
+
+        start = 1800000000 - 1800000000 % 3600
+        url = sign_at(start + 100)
+        self.assertEqual(sign_at(start + 3500), url)
+        self.assertNotEqual(sign_at(start + 3600), url)
+        query = dict(parse_qsl(urlsplit(url).query))
+        self.assertEqual(
+            (query["X-Amz-Date"], query["X-Amz-Expires"]),
+            (datetime.datetime.fromtimestamp(start, datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ"), "86400"),
+        )
+        self.assertEqual(signing_window(None, 600), (600, 0))  # No class: signed at the current time
+
+
+class MediaProbeTests(SimpleTestCase):
+    """The probe reads container headers only; the media data here is filler."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.storage = FileSystemStorage(location=self.root)
+
+    def store(self, name, data):
+        return self.storage.save(name, ContentFile(data))
+
+    def test_mp4_with_moov_after_media_data(self):
+        mvhd = b'\0' * 12 + struct.pack('>II', 1000, 125500) + b'\0' * 80
+        moov = mp4_box(b'moov', mp4_box(b'mvhd', mvhd) + mp4_track(b'vide', b'avc1', 1280, 720) + mp4_track(b'soun', b'mp4a'))
+        data = mp4_box(b'ftyp', b'isom\0\0\2\0isomavc1') + mp4_box(b'mdat', b'\0' * 300000) + moov
+        info = probe_file(self.storage, self.store('lecture.mp4', data))
+        self.assertEqual(
+            (info['duration'], info['width'], info['height'], info['codec'], info['audio_codec']),
+            (125.5, 1280, 720, 'h264', 'aac'),
+        )
+
+    def test_matroska_segment_info_and_tracks(self):
+        info_element = ebml(b'\x15\x49\xa9\x66', ebml(b'\x2a\xd7\xb1', (1000000).to_bytes(3, 'big')) + ebml(b'\x44\x89', struct.pack('>d', 61234.0)))
+        video_track = ebml(b'\xae', ebml(b'\x83', b'\x01') + ebml(b'\x86', b'V_VP9') + ebml(
+            b'\xe0', ebml(b'\xb0', (640).to_bytes(2, 'big')) + ebml(b'\xba', (360).to_bytes(2, 'big'))
+        ))
+        audio_track = ebml(b'\xae', ebml(b'\x83', b'\x02') + ebml(b'\x86', b'A_OPUS'))
+        tracks = ebml(b'\x16\x54\xae\x6b', video_track + audio_track)
+        cluster = ebml(b'\x1f\x43\xb6\x75', b'\0' * 300000)
+        segment = b'\x18\x53\x80\x67' + b'\x01' + b'\xff' * 7 + info_element + tracks + cluster  # Unknown size
+        data = ebml(b'\x1a\x45\xdf\xa3', ebml(b'\x42\x82', b'webm')) + segment
+        info = probe_file(self.storage, self.store('lecture.webm', data))
+        self.assertEqual(
+            (info['container'], info['duration'], info['width'], info['height'], info['codec'], info['audio_codec']),
+            ('webm', 61.234, 640, 360, 'vp9', 'opus'),
+        )
+
+    def test_unknown_container(self):
+        with self.assertRaises(ProbeError):
+            probe_file(self.storage, self.store('notes.mp4', b'plain text, not a video'))
+
+    def test_damaged_headers_are_probe_errors(self):
+        ftyp = mp4_box(b'ftyp', b'isom\0\0\2\0isomavc1')
+        damaged = {
+            "truncated mvhd": ftyp + mp4_box(b'moov', mp4_box(b'mvhd', b'\0' * 14)),
+            "64-bit size cut off": ftyp + struct.pack('>I4s', 1, b'mdat') + b'\0\0',
+            "empty mvhd": ftyp + mp4_box(b'moov', mp4_box(b'mvhd', b'')),
+            "odd-sized duration": ebml(b'\x1a\x45\xdf\xa3', ebml(b'\x42\x82', b'webm')) + b'\x18\x53\x80\x67\x01' + b'\xff' * 7
+            + ebml(b'\x15\x49\xa9\x66', ebml(b'\x44\x89', b'\0\0\0')),
+        }
+        for case, data in damaged.items():
+            with self.subTest(case), self.assertRaises(ProbeError):
+                probe_file(self.storage, self.store('lecture.mp4', data))
+
+
+class MediaDerivativeTests(SimpleTestCase):
+    def test_sprite_layout_caps_tiles(self):
+        self.assertEqual(sprite_layout(25, 10, 100, 10), (10, 3, 3))
+        self.assertEqual(sprite_layout(3 * 3600, 10, 100, 10), (108, 100, 10))
+
+    def test_stub_sprite_matches_layout(self):
+        interval, count, columns = sprite_layout(95, 10, 100, 4)
+        sprite = StubGenerator().sprite(None, interval, count, columns, 160, 90)
+        self.assertEqual(Image.open(BytesIO(sprite)).size, (4 * 160, 3 * 90))
+
+
+class MediaPackagingTests(SimpleTestCase):
+    ladder = [("1080p", 1080, 5000, 192), ("360p", 360, 800, 96), ("720p", 720, 2800, 128)]
+
+    def test_ladder_never_upscales(self):
+        self.assertEqual([r.name for r in ladder_for(720, self.ladder)], ["360p", "720p"])
+        self.assertEqual([r.name for r in ladder_for(240, self.ladder)], ["360p"])
+        self.assertEqual([r.name for r in ladder_for(None, self.ladder)], ["360p", "720p", "1080p"])
+
+    def test_fake_transcoder_writes_relative_playlists(self):
+        output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output, ignore_errors=True)
+        FakeTranscoder(duration=13, width=1280, height=720).package(None, output, ladder_for(720, self.ladder), 6)
+        with open(f"{output}/master.m3u8") as f:
+            self.assertIn("RESOLUTION=1280x720\n720p/index.m3u8", f.read())
+        with open(f"{output}/360p/index.m3u8") as f:
+            self.assertEqual([line for line in f.read().splitlines() if line.endswith(".ts")], ["00000.ts", "00001.ts", "00002.ts"])
+
+
+class CourseMediaCredentialTests(SimpleTestCase):
+    user = SimpleNamespace(id=7)
+
+    def set_cookies(self, credential):
+        """(name, path) of the Set-Cookie headers, written the way Django's handlers write them."""
+        response = set_credential_cookies(HttpResponse(), credential)
+        headers = [morsel.output(header="").strip() for morsel in response.cookies.values()]
+        return sorted((header.split("=", 1)[0], re.search(r"Path=([^;]+)", header).group(1)) for header in headers)
+
+    @override_settings(COURSE_MEDIA_ACCESS_MODE="local", COURSE_MEDIA_BASE_URL="")
+    def test_local_token_covers_one_course(self):
+        credential = issue_course_credential(self.user, 3)
+        self.assertEqual(credential["base_url"], "/api/v1/media/")
+        self.assertEqual(self.set_cookies(credential), [("course_media_3", "/api/v1/media/")])
+        self.assertEqual(verify_local_token(credential["token"], "videos/course_3/lecture.mp4")["u"], 7)
+        self.assertIsNotNone(verify_local_token(credential["token"], "resources/course_3/notes.pdf"))
+        for key in ("videos/course_4/lecture.mp4", "videos/course_3/../course_4/lecture.mp4", "profile_images/7.jpg"):
+            self.assertIsNone(verify_local_token(credential["token"], key))
+        self.assertIsNone(verify_local_token(credential["token"] + "x", "videos/course_3/lecture.mp4"))
+
+    def test_cloudfront_cookies_per_prefix(self):
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()).decode()
+        with override_settings(
+            COURSE_MEDIA_ACCESS_MODE="cloudfront", COURSE_MEDIA_BASE_URL="https://media.example.com/media/",
+            CLOUDFRONT_PRIVATE_KEY=pem, CLOUDFRONT_KEY_PAIR_ID="K123",
+        ):
+            credential = issue_course_credential(self.user, 3)
+            cookies = self.set_cookies(credential)
+        self.assertIsNone(credential["token"])
+        self.assertEqual(cookies, sorted(
+            (name, path)
+            for name in ("CloudFront-Key-Pair-Id", "CloudFront-Policy", "CloudFront-Signature")
+            for path in ("/media/videos/course_3/", "/media/resources/course_3/")
+        ))
+
+        def decode(value):
+            return base64.b64decode(value.replace("-", "+").replace("_", "=").replace("~", "/"))
+
+        values = {(name, path): value for name, value, path in credential["cookies"]}
+        policy = decode(values["CloudFront-Policy", "/media/videos/course_3/"])
+        self.assertEqual(json.loads(policy)["Statement"][0]["Resource"], "https://media.example.com/media/videos/course_3/*")
+        signature = decode(values["CloudFront-Signature", "/media/videos/course_3/"])
+        key.public_key().verify(signature, policy, padding.PKCS1v15(), hashes.SHA1())  # Raises if invalid
+
+
+class MediaServingTests(SimpleTestCase):
+    def test_parse_range(self):
+        self.assertEqual(parse_range("bytes=100-199", 1000), (100, 199))
+        self.assertEqual(parse_range("bytes=900-", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=-10", 1000), (990, 999))
+        self.assertEqual(parse_range("bytes=0-5000", 1000), (0, 999))
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 1000))  # Several ranges: the whole file
+        self.assertIsNone(parse_range(None, 1000))
+        for header in ("bytes=1000-", "bytes=5-2", "bytes=-0"):
+            with self.assertRaises(RangeNotSatisfiable):
+                parse_range(header, 1000)
+
+
+@override_settings(MEDIA_SERVE_OFFLOAD="", MEDIA_SERVE_RECHECK_ENROLLMENT=True)
+class CourseMediaViewTests(TestCase):
+    """CourseMediaView on FileSystemStorage: who gets a file, and how it is sent."""
+
+    def setUp(self):
+        from courses.models import Course, Enrollment
+        from userauths.models import User
+
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings_override = override_settings(STORAGES={
+            "default": {"BACKEND": "django.core.files.storage.FileSystemStorage", "OPTIONS": {"location": self.root}},
+            "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        caches["shared"].clear()  # Membership sets of earlier tests' users, whose ids are reused
+        courses.membership._cache = None
+
+        self.admin = User.objects.create(username="admin", email="admin@example.com", user_type="admin")
+        self.student = User.objects.create(username="student", email="student@example.com", user_type="student")
+        today = datetime.date.today()
+        self.course, self.other_course = [
+            Course.objects.create(title=title, description="", start_date=today, end_date=today, created_by=self.admin)
+            for title in ("Course", "Other")
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.enrollment = Enrollment.objects.create(user=self.student, course=self.course)
+
+        self.data = bytes(range(256)) * 40
+        self.key = f"videos/course_{self.course.id}/lecture.mp4"
+        self.other_key = f"videos/course_{self.other_course.id}/lecture.mp4"
+        for key in (self.key, self.other_key):
+            FileSystemStorage(location=self.root).save(key, ContentFile(self.data))
+        self.token = issue_course_credential(self.student, self.course.id)["token"]
+
+    def get(self, key, **headers):
+        response = self.client.get(f"/api/v1/media/{key}", **headers)
+        self.addCleanup(response.close)
+        return response
+
+    def jwt(self, user):
+        return {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(user).access_token}"}
+
+    def test_ranges_and_conditional_requests(self):
+        self.client.cookies[f"course_media_{self.course.id}"] = self.token
+        response = self.get(self.key)
+        self.assertEqual((response.status_code, response["Accept-Ranges"]), (200, "bytes"))
+        self.assertEqual(b"".join(response.streaming_content), self.data)
+
+        response = self.get(self.key, HTTP_RANGE="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual((response["Content-Range"], response["Content-Length"]), (f"bytes 100-199/{len(self.data)}", "100"))
+        self.assertEqual(b"".join(response.streaming_content), self.data[100:200])
+
+        response = self.get(self.key, HTTP_RANGE=f"bytes={len(self.data)}-")
+        self.assertEqual((response.status_code, response["Content-Range"]), (416, f"bytes */{len(self.data)}"))
+
+        response = self.get(self.key, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)  # Changed since: the whole file
+        full = self.get(self.key)
+        self.assertEqual(self.get(self.key, HTTP_IF_NONE_MATCH=full["ETag"]).status_code, 304)
+        self.assertEqual(self.get(self.key, HTTP_IF_MODIFIED_SINCE=full["Last-Modified"]).status_code, 304)
+
+    def test_token_and_jwt_access(self):
+        self.assertEqual(self.get(self.key).status_code, 403)
+        self.assertEqual(self.get(f"{self.key}?token={self.token}").status_code, 200)
+        self.assertEqual(self.get(f"{self.other_key}?token={self.token}").status_code, 403)  # Another course's key
+        self.client.cookies[f"course_media_{self.course.id}"] = self.token
+        self.assertEqual(self.get(self.other_key).status_code, 403)  # Only the cookie of the key's course is read
+        del self.client.cookies[f"course_media_{self.course.id}"]
+
+        self.assertEqual(self.get(self.key, **self.jwt(self.student)).status_code, 200)
+        self.assertEqual(self.get(self.other_key, **self.jwt(self.student)).status_code, 403)
+        self.assertEqual(self.get(self.other_key, **self.jwt(self.admin)).status_code, 200)
+        self.assertEqual(self.get(self.key, HTTP_AUTHORIZATION="Bearer invalid").status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.enrollment.delete()
+        self.assertEqual(self.get(f"{self.key}?token={self.token}").status_code, 403)  # Revoked before it expires
+        self.assertEqual(self.get(self.key, **self.jwt(self.student)).status_code, 403)
+
+    def test_offload_to_the_front_end_server(self):
+        with override_settings(MEDIA_SERVE_OFFLOAD="x-sendfile"):
+            response = self.get(self.key, **self.jwt(self.admin))
+        self.assertEqual((response.status_code, response.content), (200, b""))
+        self.assertEqual(response["X-Sendfile"], os.path.join(self.root, self.key))
+        with override_settings(MEDIA_SERVE_OFFLOAD="x-accel", MEDIA_SERVE_ACCEL_PREFIX="/protected-media/"):
+            response = self.get(self.key, **self.jwt(self.admin))
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.key}")
+
+
+class StorageDeletionTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.storage = FileSystemStorage(location=self.root)
+
+    def test_drained_after_commit_with_retries(self):
+        for name in ('videos/course_1/a.mp4', 'videos/course_1/hls/1/x/master.m3u8', 'videos/course_1/hls/1/x/360p/00000.ts'):
+            self.storage.save(name, ContentFile(b'data'))
+        with mock.patch('core.storage_deletion.schedule_drain') as schedule:
+            with override_settings(BACKGROUND_TASKS=True), self.captureOnCommitCallbacks(execute=True):
+                delete_later('videos/course_1/a.mp4', 'videos/course_1/gone.mp4', '', prefixes=['videos/course_1/hls/1/'])
+                delete_later('videos/course_1/b.mp4')
+            self.assertEqual(schedule.call_count, 1)  # Once per transaction
+            with override_settings(BACKGROUND_TASKS=False), self.captureOnCommitCallbacks(execute=True):
+                delete_later('videos/course_1/c.mp4')  # Left to the drain_storage_deletions command
+            self.assertEqual(schedule.call_count, 1)
+        StorageDeletion.objects.filter(name='videos/course_1/c.mp4').delete()
+
+        # Files first, then the two found under the prefix; b.mp4 fails once
+        with mock.patch.object(self.storage, 'delete', side_effect=[None, None, OSError('busy'), None, None]):
+            self.assertEqual(drain_storage_deletions(storage=self.storage), (4, 1))
+        self.assertEqual(list(StorageDeletion.objects.values_list('name', 'attempts')), [('videos/course_1/b.mp4', 1)])
+        StorageDeletion.objects.update(not_before=now())
+        self.assertEqual(drain_storage_deletions(storage=self.storage), (1, 0))
@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+from .multipart import MIN_PART_SIZE, get_multipart_backend
+from .s3_signed_url import detect_content_type
+from .storage_deletion import delete_later
+
+logger = logging.getLogger(__name__)
+
+
+class StoredUploadedFile(UploadedFile):
+    """
+    An uploaded file that is already in storage as `stored_name`. Saving it to
+    a FileField only records that name (see FileMetadataMixin), and `metadata`
+    carries the (content type, size, SHA-256) computed while it streamed in.
+    Reading it, e.g. to validate an image, opens the stored object.
+    """
+
+    def __init__(self, storage, stored_name, name, content_type, size, charset, content_type_extra, metadata):
+        self.storage = storage
+        self.stored_name = stored_name
+        self.metadata = metadata
+        self._stored_file = None
+        super().__init__(None, name, content_type, size, charset, content_type_extra)
+
+    @property
+    def file(self):
+        if self._stored_file is None:
+            self._stored_file = self.storage.open(self.stored_name, "rb")
+        return self._stored_file
+
+    @file.setter
+    def file(self, value):
+        self._stored_file = value
+
+    @property
+    def closed(self):
+        return self._stored_file is None or self._stored_file.closed
+
+    def close(self):
+        if self._stored_file is not None:
+            self._stored_file.close()
+
+
+class StorageMultipartUploadHandler(FileUploadHandler):
+    """
+    Streams the named file fields of a request into storage multipart uploads
+    while the request body is still arriving, instead of spooling them to
+    memory or a temporary file first. At most one part is being uploaded
+    while the next one fills, so memory stays at about two parts per request.
+
+    `instance` is the (possibly unsaved) model instance the files belong to;
+    its fields' upload_to decides the storage names. Other fields fall
+    through to the next handlers.
+    """
+
+    def __init__(self, instance, field_names, request=None):
+        super().__init__(request)
+        self.instance = instance
+        self.field_names = set(field_names)
+        self.part_size = max(settings.UPLOAD_PART_SIZE, MIN_PART_SIZE)
+        self.backend = get_multipart_backend()
+        self.stored = []  # StoredUploadedFile objects written by this request
+        self._executor = None
+        self.upload_id = None
+
+    def storage_name(self, field_name, file_name):
+        field = self.instance._meta.get_field(field_name)
+        name = field.generate_filename(self.instance, file_name)
+        if field.storage.exists(name):
+            # Never overwrite, even on storages that allow it: the upload may still be rejected
+            root, ext = os.path.splitext(name)
+            name = field.storage.get_alternative_name(root, ext)
+        return name
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.upload_id = None
+        if field_name not in self.field_names:
+            return
+        self.name = self.storage_name(field_name, os.path.basename(file_name))
+        self.upload_id = self.backend.create(self.name, detect_content_type(self.name))
+        self.buffer = bytearray()
+        self.parts = []  # (part_number, future, size)
+        self.digest = hashlib.sha256()
+        self.size = 0
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.upload_id is None:
+            return raw_data
+        self.digest.update(raw_data)
+        self.size += len(raw_data)
+        self.buffer += raw_data
+        if len(self.buffer) >= self.part_size:
+            self._send_part()
+        return None
+
+    def _send_part(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-parts")
+        if self.parts:
+            self.parts[-1][1].result()  # Wait for the previous part (and surface its error)
+        data, self.buffer = bytes(self.buffer), bytearray()
+        number = len(self.parts) + 1
+        future = self._executor.submit(self.backend.upload_part, self.name, self.upload_id, number, data)
+        self.parts.append((number, future, len(data)))
+
+    def file_complete(self, file_size):
+        if self.upload_id is None:
+            return None
+        if self.buffer or not self.parts:
+            self._send_part()
+        parts = [(number, future.result(), size) for number, future, size in self.parts]
+        stored_name = self.backend.complete(self.name, self.upload_id, parts)
+        self.upload_id = None
+        uploaded = StoredUploadedFile(
+            self.instance._meta.get_field(self.field_name).storage,
+            stored_name,
+            self.file_name,
+            self.content_type,
+            self.size,
+            self.charset,
+            self.content_type_extra,
+            (detect_content_type(stored_name), self.size, self.digest.hexdigest()),
+        )
+        self.stored.append(uploaded)
+        return uploaded
+
+    def upload_complete(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def upload_interrupted(self):
+        self.discard()
+
+    def discard(self):
+        """Abort an unfinished upload and delete the files this request stored, e.g. when it fails validation."""
+        if self.upload_id is not None:
+            try:
+                for _, future, _ in self.parts:
+                    future.exception()  # Let in-flight parts finish before aborting
+                self.backend.abort(self.name, self.upload_id)
+            except Exception:
+                logger.exception("Aborting streamed upload %s failed", self.name)
+            self.upload_id = None
+        for uploaded in self.stored:
+            uploaded.close()
+            delete_later(uploaded.stored_name)
+        self.stored = []
+        self.upload_complete()
+
+
+@contextmanager
+def streamed_uploads(request, instance, field_names):
+    """
+    For views: install a StorageMultipartUploadHandler on the request before
+    its body is parsed and yield it. Whatever it stored is deleted if the block
+    raises; call `discard()` on it when the request is rejected.
+    """
+    handler = StorageMultipartUploadHandler(instance, field_names, request._request)
+    request._request.upload_handlers = [handler, *request._request.upload_handlers]
+    try:
+        yield handler
+    except BaseException:
+        handler.discard()
+        raise
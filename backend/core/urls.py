@@ -0,0 +1,8 @@
+from django.urls import path, re_path
+from .views import CourseMediaView, MultipartPartView
+
+urlpatterns = [
+    # Local stand-in for presigned multipart part uploads (UPLOAD_SESSION_BACKEND = 'local')
+    path('multipart/<str:upload_id>/<int:part_number>/', MultipartPartView.as_view(), name='multipart-upload-part'),
+    re_path(r'^(?P<key>.*)$', CourseMediaView.as_view(), name='course-media'),
+]
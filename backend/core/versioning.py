@@ -0,0 +1,104 @@
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def _cache():
+    return caches[settings.RESOURCE_VERSION_CACHE_ALIAS]
+
+
+def versions_are_shared():
+    """
+    False when the version cache is per-process (LocMemCache without REDIS_URL):
+    a bump would then only be seen by the worker that made it.
+    """
+    return not isinstance(_cache(), (LocMemCache, DummyCache))
+
+
+def _key(scope):
+    return "version:" + ":".join(str(part) for part in scope)
+
+
+def get_versions(*scopes):
+    """
+    Return {scope: (token, timestamp)} for each scope tuple, e.g. ("course", 3).
+    A scope that has never been bumped (or was evicted) gets a fresh random
+    token, which only ever causes a cache miss, never a stale hit.
+    """
+    cache = _cache()
+    keys = {_key(scope): scope for scope in scopes}
+    found = cache.get_many(list(keys))
+    for key in set(keys) - set(found):
+        cache.add(key, (uuid.uuid4().hex, time.time()), None)
+        found[key] = cache.get(key) or (uuid.uuid4().hex, time.time())
+    return {keys[key]: value for key, value in found.items()}
+
+
+def bump_versions(*scopes):
+    """
+    Give each scope a new version once the current transaction commits, so
+    no request can pair the new version with data that is not yet visible.
+    """
+    if not scopes:
+        return
+
+    def bump():
+        now = time.time()
+        _cache().set_many({_key(scope): (uuid.uuid4().hex, now) for scope in scopes}, None)
+    transaction.on_commit(bump)
+
+
+def conditional_get(scopes, per_user=False):
+    """
+    Decorator for APIView.get methods: answers If-None-Match / If-Modified-Since
+    with 304 from resource versions alone, before the view runs serializers or
+    signs URLs, and sets a strong ETag and Last-Modified on 200 responses.
+
+    `scopes(request, **kwargs)` returns the version scopes the response depends on.
+    The validators also roll over every CONDITIONAL_GET_MAX_AGE seconds so clients
+    refetch bodies before the signed URLs inside them expire.
+
+    Without a version cache shared by all workers the view always runs and
+    sends no validators, since another worker's version could be stale.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if not versions_are_shared():
+                return method(view, request, *args, **kwargs)
+            versions = get_versions(*scopes(request, **kwargs))
+            max_age = settings.CONDITIONAL_GET_MAX_AGE
+            now = time.time()
+            period_start = now - now % max_age
+
+            parts = [request.get_full_path(), request.headers.get("Accept", ""), int(period_start)]
+            if per_user:
+                parts.append(request.user.pk)
+            parts.extend(f"{scope}={token}" for scope, (token, _) in sorted(versions.items(), key=repr))
+            etag = quote_etag(hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()[:32])
+            last_modified = int(max([period_start] + [timestamp for _, timestamp in versions.values()]))
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = method(view, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response.headers["ETag"] = etag
+            response.headers["Last-Modified"] = http_date(last_modified)
+            if per_user:
+                patch_vary_headers(response, ["Authorization"])
+                patch_cache_control(response, no_cache=True, private=True)
+            else:
+                patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -1,3 +1,96 @@
-from django.shortcuts import render
+import io
+import posixpath
+import re
 
-# Create your views here.
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponseRedirect
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .media_access import local_cookie_name, verify_local_token
+from .media_serving import serve_file
+from .multipart import LocalMultipartBackend, get_multipart_backend
+from .s3_signed_url import detect_content_type, generate_signed_url, normalize_key
+
+COURSE_MEDIA_KEY_RE = re.compile(r"^(?:videos|resources)/course_(\d+)/")
+
+
+class CourseMediaView(APIView):
+    """
+    Serves course media in course credential mode: the local stand-in for the
+    media CDN, and the media server of FileSystemStorage installs.
+    Holders of a valid course media credential (cookie or ?token=) and API
+    clients whose JWT belongs to staff or to a student enrolled in the course
+    get the file, with byte ranges and conditional requests honoured and the
+    bytes sent by sendfile or the front-end server (see core.media_serving).
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []  # The credential is checked first; a JWT is only tried if it does not grant access
+
+    @swagger_auto_schema(auto_schema=None)
+    def get(self, request, key):
+        if not self.has_access(request, key):
+            return Response({"message": "A valid course media credential is required."}, status=status.HTTP_403_FORBIDDEN)
+
+        if not default_storage.exists(key):
+            raise Http404
+        try:
+            path = default_storage.path(key)
+        except NotImplementedError:
+            # Remote storage: let the client fetch it from there
+            return HttpResponseRedirect(generate_signed_url(normalize_key(key)))
+        response = serve_file(request, path, detect_content_type(key), key)
+        response["Cache-Control"] = "private, max-age=3600"
+        return response
+
+    def has_access(self, request, key):
+        from courses.membership import get_membership_cache  # courses depends on core, not the other way round
+
+        match = COURSE_MEDIA_KEY_RE.match(key)
+        course_id = int(match.group(1)) if match else None
+        token = (request.COOKIES.get(local_cookie_name(course_id)) if course_id is not None else None) or request.query_params.get("token")
+        payload = verify_local_token(token, key) if token else None
+        if payload is not None:
+            # Unenrolling revokes access right away, not when the credential expires
+            if not settings.MEDIA_SERVE_RECHECK_ENROLLMENT or course_id is None or get_membership_cache().is_enrolled(payload["u"], course_id):
+                return True
+
+        try:
+            authenticated = JWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        if authenticated is None or posixpath.normpath(key) != key:
+            return False
+        user = authenticated[0]
+        if user.user_type == "admin" or user.is_staff:
+            return True
+        return course_id is not None and get_membership_cache().is_enrolled(user.pk, course_id)
+
+
+class MultipartPartView(APIView):
+    """
+    Local stand-in for S3 upload_part URLs: stores the request body as one part
+    of a local multipart upload and returns its ETag, like S3 does.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    parser_classes = []
+
+    def put(self, request, upload_id, part_number):
+        backend = get_multipart_backend()
+        token = request.query_params.get("token", "")
+        if not isinstance(backend, LocalMultipartBackend) or not backend.verify_token(token, upload_id, part_number):
+            return Response({"message": "A valid part upload URL is required."}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            etag = backend.write_part(upload_id, part_number, request.stream or io.BytesIO())
+        except (FileNotFoundError, ValueError):
+            raise Http404  # Unknown, completed or aborted upload
+        response = Response(status=status.HTTP_200_OK)
+        response["ETag"] = etag
+        return response
@@ -0,0 +1,91 @@
+"""
+ZIP archives of stored files, written while they are sent. zipfile writes
+into a buffer that is drained after every chunk, and each file is read from
+storage a chunk at a time, so memory stays at about one chunk whatever the
+size of the archive. Entries are stored uncompressed (course files are
+mostly PDFs and media, which do not deflate) with data descriptors, since
+the output cannot be seeked back into.
+"""
+import zipfile
+
+from django.conf import settings
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .s3_signed_url import get_s3_client, normalize_key
+
+
+class ZipEntry:
+    """A stored file to add to an archive as `name`."""
+
+    def __init__(self, name, storage, stored_name, size, modified):
+        self.name = name
+        self.storage = storage
+        self.stored_name = stored_name
+        self.size = size or 0
+        self.modified = modified
+
+
+class ZipSink:
+    """Write-only stream that collects what zipfile writes until it is drained."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offset = 0
+
+    def write(self, data):
+        self.buffer += data
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def stored_file_chunks(storage, name, chunk_size):
+    """Yield a stored file in chunks; S3 objects are streamed rather than spooled to a temporary file first."""
+    if isinstance(storage, S3Boto3Storage):
+        body = get_s3_client().get_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=normalize_key(name))['Body']
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+        return
+    with storage.open(name, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+def stream_zip(entries, chunk_size, extra_files=(), on_entry=None):
+    """
+    Yield the bytes of a ZIP archive of `entries` (ZipEntry objects), after
+    the in-memory `extra_files` ((name, bytes) pairs, e.g. a manifest).
+    `on_entry` is called with each entry once it is completely written.
+    """
+    sink = ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for name, data in extra_files:
+            archive.writestr(name, data)
+        if sink.buffer:
+            yield sink.drain()
+        for entry in entries:
+            info = zipfile.ZipInfo(entry.name, date_time=entry.modified.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            info.file_size = entry.size  # Decides whether the entry needs ZIP64 sizes
+            with archive.open(info, "w", force_zip64=not entry.size) as target:  # Unknown size: allow for a large one
+                for chunk in stored_file_chunks(entry.storage, entry.stored_name, chunk_size):
+                    target.write(chunk)
+                    if len(sink.buffer) >= chunk_size:
+                        yield sink.drain()
+            if sink.buffer:
+                yield sink.drain()
+            if on_entry is not None:
+                on_entry(entry)
+    yield sink.drain()  # The central directory
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.urls import path
-from .models import Course, Video, Resource, VideoProgress, Enrollment
+from .models import Course, Video, Resource, VideoProgress, Enrollment, CourseProgress, UploadSession, CourseCloneJob
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
@@ -13,19 +13,22 @@ class CourseAdmin(admin.ModelAdmin):
 
 @admin.register(Video)
 class VideoAdmin(admin.ModelAdmin):
-    list_display = ('title', 'course', 'duration', 'uploaded_at','is_published','description')
+    list_display = ('title', 'course', 'duration', 'uploaded_at','is_published','derivatives_status','packaging_status','description')
     search_fields = ('title', 'course__title')
-    list_filter = ('is_published','uploaded_at',)
+    list_filter = ('is_published','derivatives_status','packaging_status','uploaded_at',)
     ordering = ('-uploaded_at',)
 
 
 @admin.register(Resource)
 class ResourceAdmin(admin.ModelAdmin):
-    list_display = ('title', 'course', 'uploaded_at','download_count')
+    list_display = ('title', 'course', 'uploaded_at','total_download_count')
     search_fields = ('title', 'course__title')
     list_filter = ('uploaded_at',)
     ordering = ('-uploaded_at',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_download_totals()
+
 @admin.register(VideoProgress)
 class VideoProgressAdmin(admin.ModelAdmin):
     list_display = ('user', 'video', 'progress_percentage', 'last_watched_position', 'is_completed', 'updated_at')
@@ -41,3 +44,27 @@ class EnrollmentAdmin(admin.ModelAdmin):
     list_filter = ('enrolled_date',)
     ordering = ('-enrolled_date',)
     list_per_page = 20  # Show 20 records per page
+
+@admin.register(CourseProgress)
+class CourseProgressAdmin(admin.ModelAdmin):
+    list_display = ('user', 'course', 'completed_videos', 'total_videos', 'watch_seconds', 'last_activity')
+    search_fields = ('user__username', 'course__title')
+    readonly_fields = ('completed_videos', 'total_videos', 'watch_seconds', 'last_activity')  # Maintained automatically
+    ordering = ('-last_activity',)
+    list_per_page = 20  # Show 20 records per page
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ('file_name', 'kind', 'course', 'file_size', 'status', 'created_by', 'created_at')
+    search_fields = ('file_name', 'course__title', 'created_by__username')
+    list_filter = ('kind', 'status', 'created_at')
+    readonly_fields = ('upload_id', 'parts', 'video', 'resource')
+    ordering = ('-created_at',)
+    list_per_page = 20  # Show 20 records per page
+
+@admin.register(CourseCloneJob)
+class CourseCloneJobAdmin(admin.ModelAdmin):
+    list_display = ('title', 'source', 'course', 'status', 'copied_files', 'total_files', 'created_by', 'created_at')
+    search_fields = ('title', 'source__title', 'created_by__username')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('course', 'status', 'total_files', 'copied_files', 'error', 'finished_at')  # Maintained by the clone job
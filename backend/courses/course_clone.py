@@ -0,0 +1,225 @@
+"""
+Cloning a course for a new term: the course, its videos and its resources,
+with the dates moved by the job's date shift. Files shared through a blob
+(see core.media_blobs) just gain a reference; every other file, including
+generated previews and HLS packages, is copied inside storage in parallel
+(core.storage_copy), so no bytes pass through the web node. The clone stays
+unpublished until every file is in place.
+"""
+import logging
+import posixpath
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.utils.timezone import now
+
+from core.media_blobs import share_blob
+from core.storage_copy import COPY_ERRORS, copy_files
+from core.storage_deletion import iter_stored_files
+from core.versioning import bump_versions
+from .video_derivatives import derivatives_prefix
+from .video_packaging import packaging_prefix
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL = 1  # Seconds between progress writes
+
+# Not copied onto the clone: counters start again and upload times are set below
+SKIPPED_FIELDS = {'id', 'course', 'uploaded_at', 'download_count'}
+
+
+def copied_values(row):
+    """Field values of a Video/Resource row for its clone, without files."""
+    values = {}
+    for field in row._meta.concrete_fields:
+        if field.name in SKIPPED_FIELDS:
+            continue
+        values[field.attname] = '' if isinstance(field, models.FileField) else getattr(row, field.attname)
+    return values
+
+
+def clone_target(name, field, source_row, row):
+    """Where a clone's copy of a stored file goes: the same place under the new row's prefixes."""
+    if hasattr(source_row, 'video_file'):
+        for prefix_for in (derivatives_prefix, packaging_prefix):
+            if name.startswith(prefix_for(source_row)):
+                return prefix_for(row) + name[len(prefix_for(source_row)):]
+    return field.generate_filename(row, posixpath.basename(name))
+
+
+def create_clone(job):
+    """
+    Create the course, video and resource rows of a clone, pointing at the
+    names their files will be copied to. Returns the course, the copies still
+    to make ({source: target}), the number of shared files and the (model,
+    row) pairs created. Call inside a transaction.
+    """
+    from .models import Course, Resource, Video
+
+    source = job.source
+    shift = timedelta(days=job.date_shift)
+    course = Course.objects.create(
+        title=job.title, description=source.description, created_by=job.created_by, is_published=False,
+        start_date=source.start_date + shift, end_date=source.end_date + shift,
+        image_content_type=source.image_content_type, image_size=source.image_size, image_checksum=source.image_checksum,
+    )
+    copies = {}
+    shared = 0
+    created = []
+
+    def place(row, source_row, field_name):
+        nonlocal shared
+        field_file = getattr(source_row, field_name)
+        if not field_file:
+            return
+        name = field_file.name
+        if share_blob(name):
+            shared += 1  # Same bytes, one more reference
+            target = name
+        else:
+            target = copies.setdefault(name, clone_target(name, field_file.field, source_row, row))
+        setattr(row, field_name, target)
+
+    if source.image:
+        place(course, source, 'image')
+        course.save(update_fields=['image'])
+
+    # Bulk inserts skip the post_save receivers: the files need no probing or packaging again
+    for model, file_fields in ((Video, ('video_file', 'thumbnail', 'poster', 'preview_sprite', 'preview_vtt', 'hls_manifest')), (Resource, ('file',))):
+        source_rows = list(model.objects.filter(course=source).order_by('uploaded_at', 'pk'))
+        rows = model.objects.bulk_create([model(course=course, **copied_values(row)) for row in source_rows])
+        for source_row, row in zip(source_rows, rows):
+            row.uploaded_at = source_row.uploaded_at + shift  # Keeps the course order
+            for field_name in file_fields:
+                place(row, source_row, field_name)
+            if model is Video and source_row.hls_manifest:
+                # The renditions and segments next to the master playlist
+                package = posixpath.dirname(source_row.hls_manifest.name) + "/"
+                for name, _, _ in iter_stored_files(source_row.hls_manifest.storage, package):
+                    copies.setdefault(name, clone_target(name, source_row.hls_manifest.field, source_row, row))
+        model.objects.bulk_update(rows, ['uploaded_at', *file_fields], batch_size=500)
+        created += [(model, row) for row in rows]
+    return course, copies, shared, created
+
+
+def fail_clone(job_id, error, copied=None, course_id=None):
+    """
+    Mark an unfinished clone job failed and delete the clone it created, if
+    any. With `course_id`, only while the job is still copying into that clone.
+    """
+    from .models import Course, CourseCloneJob
+
+    with transaction.atomic():
+        job = CourseCloneJob.objects.select_for_update().filter(pk=job_id).first()
+        if job is None or job.status not in (CourseCloneJob.STATUS_PENDING, CourseCloneJob.STATUS_COPYING):
+            return
+        if course_id is not None and job.course_id != course_id:
+            return  # Reset as stale meanwhile, and the clone with it
+        if job.course_id:
+            Course.objects.filter(pk=job.course_id).delete()  # The receivers let go of the shared files and delete the copies
+        changes = {'copied_files': copied} if copied is not None else {}
+        CourseCloneJob.objects.filter(pk=job_id).update(
+            status=CourseCloneJob.STATUS_FAILED, error=error, finished_at=now(), updated_at=now(), **changes,
+        )
+
+
+def reset_stale_clone_jobs(stale_after=None):
+    """
+    Put copying jobs that have reported no progress for `stale_after` seconds
+    (COURSE_CLONE_STALE_AFTER; their worker died) back to pending, deleting
+    the half-made clone, so they run again. Returns the ids of the jobs reset.
+    """
+    from .models import Course, CourseCloneJob
+
+    cutoff = now() - timedelta(seconds=settings.COURSE_CLONE_STALE_AFTER if stale_after is None else stale_after)
+    stale = CourseCloneJob.objects.filter(status=CourseCloneJob.STATUS_COPYING, updated_at__lt=cutoff)
+    reset = []
+    for job_id in stale.values_list('pk', flat=True):
+        with transaction.atomic():
+            job = stale.select_for_update().filter(pk=job_id).first()
+            if job is None:
+                continue  # Reported progress or finished in the meantime
+            if job.course_id:
+                Course.objects.filter(pk=job.course_id).delete()
+            CourseCloneJob.objects.filter(pk=job_id).update(
+                status=CourseCloneJob.STATUS_PENDING, course=None, total_files=0, copied_files=0, updated_at=now(),
+            )
+        logger.warning("Clone job %s stalled while copying; it will run again", job_id)
+        reset.append(job_id)
+    return reset
+
+
+def clone_course(job_id):
+    """Run a clone job. Returns True if the clone is complete; any failure marks the job failed."""
+    try:
+        return run_clone(job_id)
+    except Exception as e:
+        logger.exception("Clone job %s failed", job_id)
+        fail_clone(job_id, str(e) or e.__class__.__name__)
+        return False
+
+
+def run_clone(job_id):
+    from .models import Course, CourseCloneJob, Video
+    from .tasks import schedule_video_processing
+
+    try:
+        with transaction.atomic():
+            job = CourseCloneJob.objects.select_for_update().select_related('source').filter(pk=job_id).first()
+            if job is None or job.status != CourseCloneJob.STATUS_PENDING:
+                return False  # Gone, or picked up by another worker
+            course, copies, shared, rows = create_clone(job)
+            job.course = course
+            job.status = CourseCloneJob.STATUS_COPYING
+            job.total_files = len(copies) + shared
+            job.copied_files = shared
+            job.save(update_fields=['course', 'status', 'total_files', 'copied_files', 'updated_at'])
+    except COPY_ERRORS as e:
+        # Listing an HLS package failed; nothing was created
+        fail_clone(job_id, str(e))
+        return False
+    # Updates below only apply while this run still owns the job (see reset_stale_clone_jobs)
+    running = CourseCloneJob.objects.filter(pk=job_id, status=CourseCloneJob.STATUS_COPYING, course=course)
+
+    renamed = {}
+    errors = []
+    copied = shared
+    reported_at = time.monotonic()
+    for source_name, result in copy_files(default_storage, copies.items()):
+        if isinstance(result, Exception):
+            errors.append(f"{source_name}: {result}")
+            continue
+        copied += 1
+        if result != copies[source_name]:
+            renamed[copies[source_name]] = result  # Storage picked a free name
+        if time.monotonic() - reported_at >= PROGRESS_INTERVAL:
+            running.update(copied_files=copied, updated_at=now())
+            reported_at = time.monotonic()
+
+    if errors:
+        logger.warning("Cloning course %s failed: %d of %d copies failed", job.source_id, len(errors), len(copies))
+        fail_clone(job_id, "\n".join(errors[:20]), copied, course_id=course.pk)
+        return False
+
+    with transaction.atomic():
+        if running.select_for_update().first() is None:
+            return False  # Reset as stale meanwhile; the clone was deleted
+        for model, row in rows:
+            changes = {
+                field.name: renamed[getattr(row, field.name).name]
+                for field in row._meta.concrete_fields
+                if isinstance(field, models.FileField) and getattr(row, field.name).name in renamed
+            }
+            if changes:
+                model.objects.filter(pk=row.pk).update(**changes)
+            if model is Video and row.derivatives_status != Video.DERIVATIVES_READY:
+                schedule_video_processing(row.pk)  # Never finished on the source either
+        if course.image and course.image.name in renamed:
+            Course.objects.filter(pk=course.pk).update(image=renamed[course.image.name])
+        Course.objects.filter(pk=course.pk).update(is_published=True)
+        running.update(status=CourseCloneJob.STATUS_COMPLETED, copied_files=copied, finished_at=now(), updated_at=now())
+        bump_versions(("catalog",), ("course", course.pk))  # update() skips the receivers
+    return True
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from courses.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = "Abort resumable uploads that have not been completed within UPLOAD_SESSION_TTL, releasing their parts in storage."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, metavar='SECONDS', help="Override UPLOAD_SESSION_TTL.")
+
+    def handle(self, *args, **options):
+        ttl = options['older_than'] or settings.UPLOAD_SESSION_TTL
+        stale = UploadSession.objects.filter(status=UploadSession.STATUS_ACTIVE, updated_at__lt=now() - timedelta(seconds=ttl))
+        aborted = 0
+        for session in stale.iterator():
+            try:
+                session.abort()
+            except Exception as e:
+                self.stderr.write(f"{session.pk}: {e}")
+                continue
+            aborted += 1
+        self.stdout.write(f"UploadSession: {aborted} stale uploads aborted")
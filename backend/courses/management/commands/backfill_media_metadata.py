@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.media_metadata import compute_file_metadata
+from courses.models import Course, Resource, Video
+
+
+class Command(BaseCommand):
+    help = "Store content type, size and checksum for media uploaded before metadata was captured."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Recompute metadata for rows that already have it.")
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        for model in (Course, Video, Resource):
+            for field_name, attrs in model.file_metadata_fields.items():
+                self.backfill(model, field_name, attrs, options)
+
+    def backfill(self, model, field_name, attrs, options):
+        content_type_attr, size_attr, checksum_attr = attrs
+        queryset = model.objects.exclude(Q(**{f"{field_name}__isnull": True}) | Q(**{field_name: ""}))
+        if not options['force']:
+            queryset = queryset.filter(Q(**{checksum_attr: ""}) | Q(**{f"{size_attr}__isnull": True}))
+
+        updated = failed = 0
+        for instance in queryset.only('pk', field_name).iterator(chunk_size=options['batch_size']):
+            field_file = getattr(instance, field_name)
+            try:
+                with field_file.open('rb') as stored_file:
+                    content_type, size, checksum = compute_file_metadata(stored_file, field_file.name)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"{model.__name__} {instance.pk} {field_file.name}: {e}")
+                continue
+            # update() rather than save() so auto_now fields are left alone
+            model.objects.filter(pk=instance.pk).update(**{
+                content_type_attr: content_type,
+                size_attr: size,
+                checksum_attr: checksum,
+            })
+            updated += 1
+
+        self.stdout.write(f"{model.__name__}.{field_name}: {updated} updated, {failed} failed")
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand
+
+from core.storage_deletion import MAX_BATCH_SIZE, delete_files
+from courses.media_gc import GC_PREFIXES, chunked, find_orphans
+
+
+class Command(BaseCommand):
+    help = (
+        "Find stored course media that no row points at any more (e.g. left behind by deletes before "
+        "the storage deletion outbox) and delete it once it is older than the grace period."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report the orphans.")
+        parser.add_argument('--prefix', action='append', dest='prefixes', help=f"Storage prefix to scan (repeatable; default: {', '.join(GC_PREFIXES)}).")
+        parser.add_argument('--grace-period', type=int, metavar='SECONDS', help="Override MEDIA_GC_GRACE_PERIOD.")
+        parser.add_argument('--chunk-size', type=int, default=MAX_BATCH_SIZE, help="Keys checked (and deleted) per batch, at most 1000.")
+        parser.add_argument('--local-root', metavar='PATH', help="Scan a local directory instead of the default storage.")
+
+    def handle(self, *args, **options):
+        storage = FileSystemStorage(location=options['local_root']) if options['local_root'] else default_storage
+        grace_period = options['grace_period'] if options['grace_period'] is not None else settings.MEDIA_GC_GRACE_PERIOD
+        orphans = find_orphans(
+            storage,
+            prefixes=options['prefixes'] or GC_PREFIXES,
+            grace_period=grace_period,
+            chunk_size=min(options['chunk_size'], MAX_BATCH_SIZE),
+        )
+
+        found = found_bytes = deleted = failed = 0
+        for batch in chunked(orphans, min(options['chunk_size'], MAX_BATCH_SIZE)):
+            found += len(batch)
+            found_bytes += sum(size for _, size, _ in batch)
+            if options['verbosity'] >= 2:
+                for name, size, modified in batch:
+                    self.stdout.write(f"{name}\t{size}\t{modified.isoformat()}")
+            if options['dry_run']:
+                continue
+            errors = delete_files(storage, [name for name, _, _ in batch])
+            for name, error in errors.items():
+                self.stderr.write(f"{name}: {error}")
+            deleted += len(batch) - len(errors)
+            failed += len(errors)
+
+        if options['dry_run']:
+            self.stdout.write(f"Orphaned media: {found} files ({found_bytes} bytes) would be deleted")
+        else:
+            self.stdout.write(f"Orphaned media: {found} files ({found_bytes} bytes) found, {deleted} deleted, {failed} failed")
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+
+from core.models import MediaBlob
+from courses.media_dedup import deduplicate_file
+from courses.models import Resource, Video
+from courses.tasks import deduplicate_file_task
+
+
+class Command(BaseCommand):
+    help = (
+        "Share the stored files of videos and resources with their identical copies: every file not yet "
+        "counted by a blob becomes one, or is replaced by the existing copy and deleted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='course_ids', help="Limit to a course (repeatable).")
+        parser.add_argument('--queue', action='store_true', help="Hand the rows to the Celery workers instead of processing them here.")
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        for model, field_name in ((Video, 'video_file'), (Resource, 'file')):
+            queryset = model.objects.exclude(**{field_name: ''}).exclude(
+                Exists(MediaBlob.objects.filter(name=OuterRef(field_name)))
+            )
+            if options['course_ids']:
+                queryset = queryset.filter(course_id__in=options['course_ids'])
+
+            linked = shared = failed = 0
+            for pk in queryset.values_list('pk', flat=True).iterator(chunk_size=options['batch_size']):
+                if options['queue']:
+                    deduplicate_file_task.delay(model._meta.label, pk, field_name)
+                    linked += 1
+                    continue
+                try:
+                    if deduplicate_file(model._meta.label, pk, field_name):
+                        shared += 1
+                    linked += 1
+                except OSError as e:
+                    failed += 1
+                    self.stderr.write(f"{model.__name__} {pk}: {e}")
+            if options['queue']:
+                self.stdout.write(f"{model.__name__}: {linked} queued")
+            else:
+                self.stdout.write(f"{model.__name__}: {linked} linked ({shared} were copies, now deleted), {failed} failed")
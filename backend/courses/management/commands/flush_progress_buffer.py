@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from courses.progress_buffer import flush_progress_buffer
+
+
+class Command(BaseCommand):
+    help = "Write buffered video progress heartbeats (redis backend) to the database, once or every interval with --loop."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep flushing every PROGRESS_BUFFER_FLUSH_INTERVAL seconds.")
+
+    def handle(self, *args, **options):
+        while True:
+            written = flush_progress_buffer()
+            if written or not options['loop']:
+                self.stdout.write(f"VideoProgress: {written} positions written")
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(settings.PROGRESS_BUFFER_FLUSH_INTERVAL)
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from courses.models import ResourceDownloadCounter
+
+
+class Command(BaseCommand):
+    help = "Fold the sharded resource download counters into Resource.download_count."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Resources folded per transaction.")
+        parser.add_argument('--loop', type=int, metavar='SECONDS', help="Keep folding every SECONDS seconds.")
+
+    def handle(self, *args, **options):
+        while True:
+            folded = ResourceDownloadCounter.fold(batch_size=options['batch_size'])
+            if folded or not options['loop']:
+                self.stdout.write(f"Resource.download_count: {folded} downloads folded")
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(options['loop'])
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from courses.models import Video
+from courses.tasks import generate_video_derivatives_task
+from courses.video_derivatives import generate_video_derivatives
+
+
+class Command(BaseCommand):
+    help = "Generate the poster, thumbnail and seek-preview sprite of stored videos that do not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate videos that already have derivatives.")
+        parser.add_argument('--course', type=int, action='append', dest='course_ids', help="Limit to a course (repeatable).")
+        parser.add_argument('--queue', action='store_true', help="Hand the videos to the Celery workers instead of processing them here.")
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        queryset = Video.objects.exclude(video_file='')
+        if not options['force']:
+            queryset = queryset.exclude(derivatives_status=Video.DERIVATIVES_READY)
+        if options['course_ids']:
+            queryset = queryset.filter(course_id__in=options['course_ids'])
+
+        done = failed = 0
+        for video_id in queryset.values_list('pk', flat=True).iterator(chunk_size=options['batch_size']):
+            if options['queue']:
+                generate_video_derivatives_task.delay(video_id)
+                done += 1
+            elif generate_video_derivatives(video_id):
+                done += 1
+            else:
+                failed += 1
+                self.stderr.write(f"Video {video_id}: derivatives could not be generated")
+        self.stdout.write(f"Video: {done} {'queued' if options['queue'] else 'generated'}, {failed} failed")
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from courses.models import Video
+from courses.tasks import package_video_task
+from courses.video_packaging import package_video
+
+
+class Command(BaseCommand):
+    help = "Transcode stored videos that are not packaged yet into the HLS ladder."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Repackage videos that are already packaged.")
+        parser.add_argument('--course', type=int, action='append', dest='course_ids', help="Limit to a course (repeatable).")
+        parser.add_argument('--queue', action='store_true', help="Hand the videos to the Celery workers instead of processing them here.")
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        queryset = Video.objects.exclude(video_file='')
+        if not options['force']:
+            queryset = queryset.exclude(packaging_status=Video.PACKAGING_READY)
+        if options['course_ids']:
+            queryset = queryset.filter(course_id__in=options['course_ids'])
+
+        done = failed = 0
+        for video_id in queryset.values_list('pk', flat=True).iterator(chunk_size=options['batch_size']):
+            if options['queue']:
+                package_video_task.delay(video_id)
+                done += 1
+            elif package_video(video_id):
+                done += 1
+            else:
+                failed += 1
+                self.stderr.write(f"Video {video_id}: could not be packaged")
+        self.stdout.write(f"Video: {done} {'queued' if options['queue'] else 'packaged'}, {failed} failed")
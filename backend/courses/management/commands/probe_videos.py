@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from courses.models import Video
+from courses.video_probe import probe_video
+
+
+class Command(BaseCommand):
+    help = "Read duration, resolution and codec from the headers of stored videos that have not been probed yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Probe videos that were already probed.")
+        parser.add_argument('--course', type=int, action='append', dest='course_ids', help="Limit to a course (repeatable).")
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        queryset = Video.objects.exclude(video_file='')
+        if not options['force']:
+            queryset = queryset.filter(probed_at__isnull=True)
+        if options['course_ids']:
+            queryset = queryset.filter(course_id__in=options['course_ids'])
+
+        probed = failed = 0
+        for video_id in queryset.values_list('pk', flat=True).iterator(chunk_size=options['batch_size']):
+            if probe_video(video_id) is None:
+                failed += 1
+                self.stderr.write(f"Video {video_id}: could not be probed")
+            else:
+                probed += 1
+        self.stdout.write(f"Video: {probed} probed, {failed} failed")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.models import CourseProgress
+
+
+class Command(BaseCommand):
+    help = "Recompute the CourseProgress aggregate from Video, VideoProgress and Enrollment rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses', help="Only rebuild this course (repeatable).")
+        parser.add_argument('--user', type=int, action='append', dest='users', help="Only rebuild this user (repeatable).")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            written = CourseProgress.rebuild(user_ids=options['users'], course_ids=options['courses'])
+        self.stdout.write(f"CourseProgress: {written} rows rebuilt")
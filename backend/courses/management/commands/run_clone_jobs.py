@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from courses.course_clone import clone_course, reset_stale_clone_jobs
+from courses.models import CourseCloneJob
+
+
+class Command(BaseCommand):
+    help = "Run the pending course clone jobs (for cron, when BACKGROUND_TASKS is off and no Celery worker picks them up)."
+
+    def handle(self, *args, **options):
+        for job_id in reset_stale_clone_jobs():
+            self.stderr.write(f"{job_id}: stalled while copying, running it again")
+        completed = failed = 0
+        pending = CourseCloneJob.objects.filter(status=CourseCloneJob.STATUS_PENDING).order_by('created_at')
+        for job_id in pending.values_list('pk', flat=True):
+            if clone_course(job_id):
+                completed += 1
+            elif CourseCloneJob.objects.filter(pk=job_id, status=CourseCloneJob.STATUS_FAILED).exists():
+                failed += 1
+                self.stderr.write(f"{job_id}: clone failed")
+        self.stdout.write(f"CourseCloneJob: {completed} completed, {failed} failed")
@@ -0,0 +1,36 @@
+from django.apps import apps
+from django.db import transaction
+
+from core.media_blobs import hash_stored_file, link_blob
+from core.models import MediaBlob
+from core.versioning import bump_versions
+
+
+def deduplicate_file(model_label, pk, field_name):
+    """
+    Link the file a Video/Resource row already has in storage to its blob:
+    for resumable uploads, which go to storage without passing through
+    Django, and for rows stored before deduplication. The recorded checksum
+    is used when the row has one; otherwise the file is read back and hashed.
+    Returns the name the row points at afterwards, or None if nothing changed.
+    """
+    model = apps.get_model(model_label)
+    row = model.objects.filter(pk=pk).first()
+    field_file = getattr(row, field_name, None)
+    if not field_file or MediaBlob.objects.filter(name=field_file.name).exists():
+        return None
+    name = field_file.name
+    _, size_attr, checksum_attr = row.file_metadata_fields[field_name]
+    digest, size = getattr(row, checksum_attr), getattr(row, size_attr)
+    if not digest or size is None:
+        digest, size = hash_stored_file(field_file.storage, name)
+
+    with transaction.atomic():
+        if not model.objects.select_for_update().filter(pk=pk, **{field_name: name}).exists():
+            return None  # Replaced or deleted while we read it
+        linked = link_blob(name, digest, size)
+        # Same bytes, so update() rather than save(): nothing needs probing or packaging again
+        model.objects.filter(pk=pk).update(**{field_name: linked, checksum_attr: digest, size_attr: size})
+        if linked != name:
+            bump_versions(("catalog",), ("course", row.course_id))  # Cached responses carry the old URL
+    return linked if linked != name else None
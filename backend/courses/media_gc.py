@@ -0,0 +1,80 @@
+"""
+Reconciling stored course media against the database. The storage listing
+is consumed as a generator and checked a chunk of keys at a time with IN
+queries against every column that can point at a file, so memory stays
+bounded by the chunk size however many objects the bucket holds.
+"""
+import re
+from datetime import timedelta
+from itertools import islice
+
+from django.utils.timezone import now
+
+from core.media_packaging import MASTER_PLAYLIST
+from core.storage_deletion import iter_stored_files
+
+GC_PREFIXES = ("videos/", "resources/", "thumbnails/", "course_images/")
+
+HLS_PACKAGE_RE = re.compile(r"^videos/course_\d+/hls/\d+/[^/]+/")
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def file_references():
+    """(queryset, field) pairs for every column that stores a media name under GC_PREFIXES."""
+    from core.models import MediaBlob
+    from .models import Course, Resource, UploadSession, Video
+
+    return [
+        (MediaBlob.objects.all(), 'name'),
+        (Course.objects.all(), 'image'),
+        (Video.objects.all(), 'video_file'),
+        (Video.objects.all(), 'thumbnail'),
+        (Video.objects.all(), 'poster'),
+        (Video.objects.all(), 'preview_sprite'),
+        (Video.objects.all(), 'preview_vtt'),
+        (Video.objects.all(), 'hls_manifest'),
+        (Resource.objects.all(), 'file'),
+        (UploadSession.objects.filter(status=UploadSession.STATUS_ACTIVE), 'file_name'),  # Not completed yet
+    ]
+
+
+def package_manifest(name):
+    """The master playlist an HLS segment or playlist belongs to, or None for other files."""
+    match = HLS_PACKAGE_RE.match(name)
+    return match.group(0) + MASTER_PLAYLIST if match else None
+
+
+def referenced_names(names):
+    """The subset of `names` that some row still points at."""
+    from .models import Video
+
+    found = set()
+    for queryset, field in file_references():
+        found.update(queryset.filter(**{f"{field}__in": names}).values_list(field, flat=True))
+    # Segments and rendition playlists live as long as the video records their package
+    manifests = {package_manifest(name) for name in names} - {None}
+    if manifests:
+        live = set(Video.objects.filter(hls_manifest__in=manifests).values_list('hls_manifest', flat=True))
+        found.update(name for name in names if package_manifest(name) in live)
+    return found
+
+
+def find_orphans(storage, prefixes=GC_PREFIXES, grace_period=86400, chunk_size=1000):
+    """
+    Yield (name, size, last modified) for stored files under `prefixes` that
+    no row points at and that are older than `grace_period` seconds, which
+    spares uploads and generated files whose rows are not committed yet.
+    """
+    cutoff = now() - timedelta(seconds=grace_period)
+    for prefix in prefixes:
+        old_files = (item for item in iter_stored_files(storage, prefix) if item[2] < cutoff)
+        for chunk in chunked(old_files, chunk_size):
+            referenced = referenced_names([name for name, _, _ in chunk])
+            for item in chunk:
+                if item[0] not in referenced:
+                    yield item
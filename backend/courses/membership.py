@@ -0,0 +1,159 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from core.versioning import get_versions, versions_are_shared
+
+
+class EnrollmentMembershipCache:
+    """
+    The set of course ids each user is enrolled in, so enrollment-gated views
+    can answer "is this user enrolled?" without a query.
+
+    The local tier is a bounded per-process LRU whose entries live for
+    `local_ttl` seconds. The shared tier is a Django cache alias that holds the
+    same sets for all workers, keyed by the user's ("enrollments", user_id)
+    resource version, so an enrollment change (which bumps the version) makes
+    older sets unreachable, including ones written by a request that raced it.
+    It is skipped when it or the version cache is per-process (LocMemCache
+    without REDIS_URL), since another worker's bump would never reach it.
+    A requested course missing from the cached set is always re-checked
+    against the database, so a new enrollment is visible at once on every
+    worker; only a removed enrollment can linger for up to `local_ttl` on
+    workers other than the one that removed it.
+    """
+
+    key_prefix = "enrollments"
+
+    def __init__(self, max_users=10000, local_ttl=30, shared_alias=None, shared_ttl=3600):
+        self.max_users = max_users
+        self.local_ttl = local_ttl
+        self.shared_alias = shared_alias
+        self.shared_ttl = shared_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        """The shared tier, or None when there is none shared between the workers."""
+        if not self.shared_alias or not versions_are_shared():
+            return None
+        cache = caches[self.shared_alias]
+        return None if isinstance(cache, (LocMemCache, DummyCache)) else cache
+
+    def _shared_key(self, user_id):
+        (token, _), = get_versions(("enrollments", user_id)).values()
+        return f"{self.key_prefix}:{user_id}:{token}"
+
+    def _local(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def _remember(self, user_id, course_ids):
+        with self._lock:
+            self._entries[user_id] = (time.time() + self.local_ttl, course_ids)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def load(self, user_id, refresh=False):
+        """
+        Fetch the user's course ids from the shared tier or the database (always
+        the database with `refresh`), refreshing the cached sets.
+        """
+        from .models import Enrollment
+
+        shared = self.shared
+        course_ids = None
+        if shared is not None:
+            shared_key = self._shared_key(user_id)
+            if not refresh:
+                course_ids = shared.get(shared_key)
+        if course_ids is None:
+            course_ids = frozenset(Enrollment.objects.filter(user_id=user_id).values_list('course_id', flat=True))
+            if shared is not None:
+                shared.set(shared_key, course_ids, self.shared_ttl)
+        self._remember(user_id, course_ids)
+        return course_ids
+
+    def course_ids(self, user_id):
+        """The user's enrolled course ids; may be up to `local_ttl` seconds old."""
+        course_ids = self._local(user_id)
+        return course_ids if course_ids is not None else self.load(user_id)
+
+    def enrolled_in(self, user_id, course_ids):
+        """The ones of `course_ids` the user is enrolled in."""
+        from .models import Enrollment
+
+        course_ids = set(course_ids)
+        found = course_ids & self.course_ids(user_id)
+        missing = course_ids - found
+        if missing:
+            # Never deny from a cached set alone: the user may have just enrolled on another worker
+            rechecked = set(Enrollment.objects.filter(user_id=user_id, course_id__in=missing).values_list('course_id', flat=True))
+            if rechecked:
+                self.load(user_id, refresh=True)  # The cached sets are stale
+                found |= rechecked
+        return found
+
+    def is_enrolled(self, user_id, course_id):
+        course_ids = self._local(user_id)
+        if course_ids is not None and course_id in course_ids:
+            return True
+        return course_id in self.enrolled_in(user_id, [course_id])
+
+    def invalidate(self, user_id):
+        """Drop the local entry; the shared tier follows the version bump of the enrollment change."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_membership_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EnrollmentMembershipCache(
+                    max_users=getattr(settings, "ENROLLMENT_CACHE_MAX_USERS", 10000),
+                    local_ttl=getattr(settings, "ENROLLMENT_CACHE_LOCAL_TTL", 30),
+                    shared_alias=getattr(settings, "ENROLLMENT_CACHE_ALIAS", None),
+                    shared_ttl=getattr(settings, "ENROLLMENT_CACHE_SHARED_TTL", 3600),
+                )
+    return _cache
+
+
+def is_enrolled(user, course_id):
+    return get_membership_cache().is_enrolled(user.pk, int(course_id))
+
+
+def enrolled_course_ids(user, course_ids=None):
+    """
+    The user's enrolled course ids, or the ones among `course_ids`. Only the
+    requested courses are rechecked against the database; the full set may be
+    up to ENROLLMENT_CACHE_LOCAL_TTL seconds old.
+    """
+    if course_ids is None:
+        return get_membership_cache().course_ids(user.pk)
+    return get_membership_cache().enrolled_in(user.pk, course_ids)
+
+
+def invalidate_enrollments(user_id):
+    """Forget a user's cached enrollments once the current transaction commits."""
+    transaction.on_commit(lambda: get_membership_cache().invalidate(user_id))
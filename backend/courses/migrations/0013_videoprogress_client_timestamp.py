@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_course_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoprogress',
+            name='client_timestamp',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
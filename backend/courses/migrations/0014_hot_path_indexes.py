@@ -0,0 +1,48 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+from core.migration_operations import AddIndexConcurrently, AddUniqueConstraintConcurrently
+
+
+def remove_duplicate_enrollments(apps, schema_editor):
+    """Keep the earliest enrollment of each (user, course) pair so the unique constraint can be added."""
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    duplicates = (
+        Enrollment.objects.values('user_id', 'course_id')
+        .annotate(keep=models.Min('id'), total=models.Count('id'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates.iterator():
+        Enrollment.objects.filter(user_id=row['user_id'], course_id=row['course_id']).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently on PostgreSQL, which cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('courses', '0013_videoprogress_client_timestamp'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='course',
+            index=models.Index(fields=['-created_at'], name='course_created_at_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='videoprogress',
+            index=models.Index(condition=models.Q(('is_completed', False)), fields=['user', '-updated_at'], name='vprogress_user_recent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='videoprogress',
+            index=models.Index(condition=models.Q(('is_completed', True)), fields=['user', 'video'], name='vprogress_user_done_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_enrollments, migrations.RunPython.noop, atomic=True),
+        AddUniqueConstraintConcurrently(
+            model_name='enrollment',
+            constraint=models.UniqueConstraint(fields=('user', 'course'), name='unique_enrollment_user_course'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceDownloadCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='download_counters', to='courses.resource')),
+            ],
+            options={
+                'unique_together': {('resource', 'slot')},
+            },
+        ),
+    ]
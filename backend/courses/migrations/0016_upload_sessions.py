@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:35
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_resource_download_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('video', 'Video'), ('resource', 'Resource')], max_length=10)),
+                ('file_name', models.CharField(max_length=255)),
+                ('upload_id', models.CharField(max_length=1024)),
+                ('content_type', models.CharField(max_length=100)),
+                ('file_size', models.PositiveBigIntegerField()),
+                ('part_size', models.PositiveBigIntegerField()),
+                ('fields', models.JSONField(default=dict)),
+                ('parts', models.JSONField(default=list)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('completed', 'Completed'), ('aborted', 'Aborted')], default='active', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='courses.course')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+                ('resource', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='courses.resource')),
+                ('video', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='courses.video')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:45
+
+import courses.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0017_video_probe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='derivatives_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='poster',
+            field=models.ImageField(blank=True, null=True, upload_to=courses.models.video_thumbnail_upload_path),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='preview_sprite',
+            field=models.ImageField(blank=True, null=True, upload_to=courses.models.video_thumbnail_upload_path),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='preview_vtt',
+            field=models.FileField(blank=True, null=True, upload_to=courses.models.video_thumbnail_upload_path),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:49
+
+import courses.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0018_video_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='hls_manifest',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to=courses.models.video_upload_path),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='hls_renditions',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='packaging_status',
+            field=models.CharField(choices=[('none', 'Not packaged'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='none', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0020_course_clone_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='is_published',
+            field=models.BooleanField(default=True),
+        ),
+    ]
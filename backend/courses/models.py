@@ -1,7 +1,26 @@
-from django.db import models
+import logging
+import random
+import uuid
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
 from django.conf import settings
 from django.utils.timezone import now
 from core.s3_signed_url import generate_signed_url
+from core.media_metadata import FileMetadataMixin
+from core.multipart import get_multipart_backend
+from core.versioning import bump_versions
+from .membership import invalidate_enrollments
+from .tasks import schedule_deduplication, schedule_video_processing
+from .video_derivatives import derivatives_prefix
+from .video_packaging import packaging_prefix
+from core.storage_deletion import delete_later
+from core.media_blobs import release_files
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
 
 
 def video_upload_path(instance, filename):
@@ -23,7 +42,42 @@ def video_thumbnail_upload_path(instance, filename):
     return f"thumbnails/course_{instance.course.id}/{filename}"
    
 
-class Course(models.Model):
+class CourseQuerySet(models.QuerySet):
+    def published(self):
+        """The courses students can see and enroll in."""
+        return self.filter(is_published=True)
+
+    def with_catalog_stats(self):
+        """
+        Annotate video_count, total_duration and resource_count using
+        correlated subqueries, so the whole catalog page is one query.
+        """
+        video_stats = (
+            Video.objects.filter(course=OuterRef('pk')).order_by().values('course')
+            .annotate(count=Count('id'), duration=Sum('duration'))
+        )
+        resource_stats = (
+            Resource.objects.filter(course=OuterRef('pk')).order_by().values('course')
+            .annotate(count=Count('id'))
+        )
+        return self.annotate(
+            video_count=Coalesce(Subquery(video_stats.values('count')), 0),
+            total_duration=Coalesce(Subquery(video_stats.values('duration')), 0),
+            resource_count=Coalesce(Subquery(resource_stats.values('count')), 0),
+        )
+
+
+class ResourceQuerySet(models.QuerySet):
+    def with_download_totals(self):
+        """Annotate pending_downloads (the unfolded counter slots) so total_download_count needs no query."""
+        pending = (
+            ResourceDownloadCounter.objects.filter(resource=OuterRef('pk')).order_by().values('resource')
+            .annotate(total=Sum('count')).values('total')
+        )
+        return self.annotate(pending_downloads=Coalesce(Subquery(pending), 0))
+
+
+class Course(FileMetadataMixin, models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     start_date = models.DateField()
@@ -31,9 +85,19 @@ class Course(models.Model):
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='courses')
     created_at = models.DateTimeField(auto_now=True)
     image = models.ImageField(upload_to= course_image_upload_path, null=True, blank=True)
+    # Captured when the image is uploaded
+    image_content_type = models.CharField(max_length=100, blank=True, default='')
+    image_size = models.PositiveBigIntegerField(null=True, blank=True)
+    image_checksum = models.CharField(max_length=64, blank=True, default='')  # SHA-256
+    is_published = models.BooleanField(default=True)  # A clone stays hidden until its files are copied
+
+    file_metadata_fields = {'image': ('image_content_type', 'image_size', 'image_checksum')}
+
+    objects = CourseQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['-created_at'], name='course_created_at_idx')]
 
     def clean(self):
         if self.end_date < self.start_date:
@@ -46,7 +110,7 @@ class Course(models.Model):
     def image_url(self):
         """Return a signed S3 URL for the image"""
         if self.image:
-            return generate_signed_url(f"media/{self.image.name}")  # Generate signed URL
+            return generate_signed_url(f"media/{self.image.name}", asset_class="course_image", content_type=self.image_content_type or None)  # Generate signed URL
         return None  # If no image, return None
     
 class Enrollment(models.Model):
@@ -54,26 +118,86 @@ class Enrollment(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
     enrolled_date = models.DateTimeField(default=now)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'course'], name='unique_enrollment_user_course'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} enrolled in {self.course.title} on {self.enrolled_date}"
     
 
-class Video(models.Model):
+class Video(FileMetadataMixin, models.Model):
+    DERIVATIVES_PENDING = 'pending'
+    DERIVATIVES_PROCESSING = 'processing'
+    DERIVATIVES_READY = 'ready'
+    DERIVATIVES_FAILED = 'failed'
+    PACKAGING_NONE = 'none'
+    PACKAGING_PROCESSING = 'processing'
+    PACKAGING_READY = 'ready'
+    PACKAGING_FAILED = 'failed'
+
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='videos')
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)  # Editable field for admins
     video_file = models.FileField(upload_to=video_upload_path)  # Files uploaded to 'videos/' folder in S3
     thumbnail = models.ImageField(upload_to=video_thumbnail_upload_path, null=True, blank=True)
-    duration = models.PositiveIntegerField()  # Duration in seconds
+    duration = models.PositiveIntegerField(default=0)  # Duration in seconds; the media probe replaces it with the file's own
     is_published = models.BooleanField(default=True)  # Admin can unpublish videos
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Captured when the video file / thumbnail is uploaded
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    checksum = models.CharField(max_length=64, blank=True, default='')  # SHA-256
+    thumbnail_content_type = models.CharField(max_length=100, blank=True, default='')
+    thumbnail_size = models.PositiveBigIntegerField(null=True, blank=True)
+    thumbnail_checksum = models.CharField(max_length=64, blank=True, default='')
+    # Read from the container header by the media probe (courses.video_probe)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    codec = models.CharField(max_length=32, blank=True, default='')
+    probed_at = models.DateTimeField(null=True, blank=True)
+    # Generated after upload by courses.tasks (see courses.video_derivatives)
+    poster = models.ImageField(upload_to=video_thumbnail_upload_path, null=True, blank=True)
+    preview_sprite = models.ImageField(upload_to=video_thumbnail_upload_path, null=True, blank=True)  # Seek-preview tiles
+    preview_vtt = models.FileField(upload_to=video_thumbnail_upload_path, null=True, blank=True)  # WebVTT index into the sprite
+    derivatives_status = models.CharField(
+        max_length=10,
+        choices=[(DERIVATIVES_PENDING, 'Pending'), (DERIVATIVES_PROCESSING, 'Processing'), (DERIVATIVES_READY, 'Ready'), (DERIVATIVES_FAILED, 'Failed')],
+        default=DERIVATIVES_PENDING,
+    )
+    # HLS ladder, when VIDEO_HLS_PACKAGING is on (see courses.video_packaging)
+    hls_manifest = models.FileField(upload_to=video_upload_path, max_length=255, null=True, blank=True)  # Master playlist; renditions sit next to it
+    hls_renditions = models.JSONField(default=list, blank=True)  # e.g. ["360p", "720p"]
+    packaging_status = models.CharField(
+        max_length=10,
+        choices=[(PACKAGING_NONE, 'Not packaged'), (PACKAGING_PROCESSING, 'Processing'), (PACKAGING_READY, 'Ready'), (PACKAGING_FAILED, 'Failed')],
+        default=PACKAGING_NONE,
+    )
+
+    file_metadata_fields = {
+        'video_file': ('content_type', 'file_size', 'checksum'),
+        'thumbnail': ('thumbnail_content_type', 'thumbnail_size', 'thumbnail_checksum'),
+    }
+    deduplicated_fields = ('video_file',)  # Thumbnails are small and rarely shared
 
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_published = instance.__dict__.get('is_published')
+        instance._loaded_video_file = instance.__dict__.get('video_file')
+        return instance
+
     def formatted_duration(self):
         hours, remainder = divmod(self.duration, 3600)
         minutes, seconds = divmod(remainder, 60)
         return f"{hours:02}:{minutes:02}:{seconds:02}"
 
+    def is_watched_through(self, position):
+        #Completion is derived from the resume position, never taken from the client
+        return self.duration > 0 and position >= self.duration * settings.VIDEO_COMPLETION_THRESHOLD
+
     def __str__(self):
         return f"{self.title} (Course: {self.course.title})"
 
@@ -81,7 +205,7 @@ class Video(models.Model):
         ordering = ['uploaded_at']
 
 
-class Resource(models.Model):
+class Resource(FileMetadataMixin, models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='resources')
     title = models.CharField(max_length=255)
     file = models.FileField(upload_to=resource_upload_path)  #Files uploaded to 'resources/' folder in S3
@@ -92,6 +216,15 @@ class Resource(models.Model):
     )
     download_count = models.PositiveIntegerField(default=0)  # Track number of downloads
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Captured when the file is uploaded
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    checksum = models.CharField(max_length=64, blank=True, default='')  # SHA-256
+
+    file_metadata_fields = {'file': ('content_type', 'file_size', 'checksum')}
+    deduplicated_fields = ('file',)
+
+    objects = ResourceQuerySet.as_manager()
 
 
     def __str__(self):
@@ -100,10 +233,93 @@ class Resource(models.Model):
     class Meta:
         ordering = ['uploaded_at']
 
-    def increment_download_count(self):
-        # Increment the download count
-        self.download_count += 1
-        self.save()
+    def increment_download_count(self, amount=1):
+        """
+        Count a download in one of the resource's counter slots. Picking a random
+        slot spreads concurrent downloads over several rows, so they neither
+        lose increments nor queue on one row lock. fold_download_counters moves
+        the slots into download_count.
+        """
+        ResourceDownloadCounter.increment(self.pk, amount)
+
+    @property
+    def total_download_count(self):
+        """download_count plus the downloads still sitting in counter slots."""
+        pending = self.__dict__.get('pending_downloads')
+        if pending is None:
+            pending = self.download_counters.aggregate(total=Coalesce(Sum('count'), 0))['total']
+        return self.download_count + pending
+
+
+class ResourceDownloadCounter(models.Model):
+    """One of DOWNLOAD_COUNTER_SLOTS shards of a resource's not yet folded download count."""
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='download_counters')
+    slot = models.PositiveSmallIntegerField()
+    count = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('resource', 'slot')
+
+    @classmethod
+    def increment(cls, resource_id, amount=1):
+        slot = random.randrange(settings.DOWNLOAD_COUNTER_SLOTS)
+        if cls.objects.filter(resource_id=resource_id, slot=slot).update(count=F('count') + amount):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(resource_id=resource_id, slot=slot, count=amount)
+        except IntegrityError:
+            # Another request created the slot first
+            cls.objects.filter(resource_id=resource_id, slot=slot).update(count=F('count') + amount)
+
+    @classmethod
+    def increment_many(cls, resource_ids, amount=1):
+        """
+        increment() for many resources at once, e.g. every file of a course
+        archive: one slot for all of them, so a few queries in total rather
+        than some per resource.
+        """
+        pending = set(Resource.objects.filter(pk__in=set(resource_ids)).values_list('pk', flat=True))
+        slot = random.randrange(settings.DOWNLOAD_COUNTER_SLOTS)
+        for _ in range(3):
+            if not pending:
+                return
+            cls.objects.bulk_create([cls(resource_id=resource_id, slot=slot) for resource_id in pending], ignore_conflicts=True)
+            with transaction.atomic():
+                # Locked first, so a fold cannot delete a slot between finding and counting it
+                counters = dict(
+                    cls.objects.select_for_update().filter(resource_id__in=pending, slot=slot).values_list('pk', 'resource_id')
+                )
+                cls.objects.filter(pk__in=counters).update(count=F('count') + amount)
+            pending -= set(counters.values())
+        for resource_id in pending:
+            cls.increment(resource_id, amount)  # Folded away under us repeatedly
+
+    @classmethod
+    def fold(cls, batch_size=500):
+        """
+        Add the slot counts to Resource.download_count and delete the folded
+        slots, one locked batch of resources at a time. Returns the number of
+        downloads folded. An increment racing with the fold waits for the lock
+        and then recreates its slot, so nothing is counted twice or lost.
+        """
+        folded = 0
+        while True:
+            with transaction.atomic():
+                resource_ids = list(
+                    cls.objects.order_by().values_list('resource_id', flat=True).distinct()[:batch_size]
+                )
+                if not resource_ids:
+                    return folded
+                slots = list(cls.objects.select_for_update().filter(resource_id__in=resource_ids))
+                totals = {}
+                for counter in slots:
+                    totals[counter.resource_id] = totals.get(counter.resource_id, 0) + counter.count
+                for resource_id, total in totals.items():
+                    if total:
+                        Resource.objects.filter(pk=resource_id).update(download_count=F('download_count') + total)
+                cls.objects.filter(pk__in=[counter.pk for counter in slots]).delete()
+                folded += sum(totals.values())
 
 class VideoProgress(models.Model):
     
@@ -114,18 +330,408 @@ class VideoProgress(models.Model):
     last_watched_position = models.PositiveIntegerField(default=0)  #In seconds
     is_completed = models.BooleanField(default=False)  #Tracks completion status
     updated_at = models.DateTimeField(auto_now=True)
+    client_timestamp = models.DateTimeField(null=True, blank=True)  #Client clock of the last offline-synced event
 
     class Meta:
         unique_together = ('user', 'video')  #Ensure unique progress per user per video
+        indexes = [
+            #Partial on is_completed: the flag is matched by the condition, which SQLite can also use (unlike a key column)
+            models.Index(fields=['user', '-updated_at'], condition=models.Q(is_completed=False), name='vprogress_user_recent_idx'),  #Continue watching
+            models.Index(fields=['user', 'video'], condition=models.Q(is_completed=True), name='vprogress_user_done_idx'),  #Completed counts per course
+        ]
         verbose_name = "Video Progress"
         verbose_name_plural = "Video Progress"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        #Remember what was loaded so CourseProgress can be updated by the difference
+        instance._loaded_progress = (instance.__dict__.get('is_completed'), instance.__dict__.get('last_watched_position'))
+        return instance
+
     def save(self, *args, **kwargs):
         #Automatically mark as completed if progress_percentage reaches 100.
         if self.progress_percentage == 100:
             self.is_completed = True
-        super().save(*args, **kwargs)
+        #The row and its CourseProgress aggregate are written together (see apply_video_progress)
+        with transaction.atomic():
+            if self.pk is not None:
+                #Lock the row and take the values being replaced from it rather than from when this
+                #instance was loaded, so concurrent saves fold deltas that do not overlap
+                current = VideoProgress.objects.select_for_update().filter(pk=self.pk).values_list('is_completed', 'last_watched_position').first()
+                if current is not None:
+                    self._loaded_progress = current
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user.username} - {self.video.title} ({self.progress_percentage}%)"
 
+
+class CourseProgress(models.Model):
+    """
+    Per-user course progress, kept up to date as VideoProgress rows and videos
+    change so readers need a single lookup instead of counting progress rows.
+    Only published videos count towards total_videos / completed_videos;
+    watch_seconds is the sum of the resume positions of all the user's videos.
+    Drift (e.g. VideoProgress rows deleted directly) is fixed by the
+    rebuild_course_progress command.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='course_progress')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='progress_summaries')
+    completed_videos = models.PositiveIntegerField(default=0)
+    total_videos = models.PositiveIntegerField(default=0)
+    watch_seconds = models.PositiveBigIntegerField(default=0)
+    last_activity = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('user', 'course')  #Also the index behind every progress lookup
+        verbose_name = "Course Progress"
+        verbose_name_plural = "Course Progress"
+
+    @property
+    def progress_percentage(self):
+        return (self.completed_videos / self.total_videos * 100) if self.total_videos > 0 else 0
+
+    @classmethod
+    def for_user(cls, user_id, course_id):
+        """The user's progress in a course, computed on the spot if it has never been stored."""
+        progress = cls.objects.filter(user_id=user_id, course_id=course_id).first()
+        if progress is None:
+            cls.rebuild(user_ids=[user_id], course_ids=[course_id], include_missing=True)
+            progress = cls.objects.get(user_id=user_id, course_id=course_id)
+        return progress
+
+    @classmethod
+    def rebuild(cls, user_ids=None, course_ids=None, include_missing=False, pairs=None):
+        """
+        Recompute the aggregate from Video / VideoProgress / Enrollment rows for
+        every enrolled or active (user, course) pair matching the filters, and
+        upsert the result. `pairs` limits it to those (user_id, course_id)
+        pairs rather than every combination of the ids. `include_missing` also
+        stores an empty row for the exact pairs asked for. Returns the number of
+        rows written.
+        """
+        progress_rows = VideoProgress.objects.all()
+        enrollments = Enrollment.objects.all()
+        videos = Video.objects.filter(is_published=True)
+        if pairs is not None:
+            users_by_course = {}
+            for user_id, course_id in pairs:
+                users_by_course.setdefault(course_id, set()).add(user_id)
+            if not users_by_course:
+                return 0
+            progress_filter, enrollment_filter = Q(), Q()
+            for course_id, course_user_ids in users_by_course.items():
+                progress_filter |= Q(video__course_id=course_id, user_id__in=course_user_ids)
+                enrollment_filter |= Q(course_id=course_id, user_id__in=course_user_ids)
+            progress_rows = progress_rows.filter(progress_filter)
+            enrollments = enrollments.filter(enrollment_filter)
+            videos = videos.filter(course_id__in=users_by_course)
+        if user_ids is not None:
+            progress_rows = progress_rows.filter(user_id__in=user_ids)
+            enrollments = enrollments.filter(user_id__in=user_ids)
+        if course_ids is not None:
+            progress_rows = progress_rows.filter(video__course_id__in=course_ids)
+            enrollments = enrollments.filter(course_id__in=course_ids)
+            videos = videos.filter(course_id__in=course_ids)
+
+        totals = dict(videos.values_list('course_id').annotate(total=Count('id')).order_by())
+        stats = {}
+        for row in progress_rows.values('user_id', 'video__course_id').annotate(
+            completed=Count('id', filter=Q(is_completed=True, video__is_published=True)),
+            watched=Sum('last_watched_position'),
+            last_activity=Max('updated_at'),
+        ).order_by():
+            stats[(row['user_id'], row['video__course_id'])] = row
+        requested = pairs
+        pairs = set(stats) | set(enrollments.values_list('user_id', 'course_id'))
+        if include_missing:
+            pairs.update(requested if requested is not None else (
+                (user_id, course_id) for user_id in user_ids for course_id in course_ids
+            ))
+
+        rows = []
+        for user_id, course_id in pairs:
+            row = stats.get((user_id, course_id), {})
+            rows.append(cls(
+                user_id=user_id,
+                course_id=course_id,
+                completed_videos=row.get('completed', 0),
+                total_videos=totals.get(course_id, 0),
+                watch_seconds=row.get('watched') or 0,
+                last_activity=row.get('last_activity'),
+            ))
+        cls.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['user', 'course'],
+            update_fields=['completed_videos', 'total_videos', 'watch_seconds', 'last_activity'],
+        )
+        return len(rows)
+
+    @classmethod
+    def refresh_course(cls, course_id):
+        """
+        Recompute the stored rows of one course in a single UPDATE. Rows are
+        never inserted here, so it is safe while the course is being deleted.
+        """
+        published = Video.objects.filter(course_id=course_id, is_published=True).order_by().values('course_id')
+        user_rows = VideoProgress.objects.filter(user_id=OuterRef('user_id'), video__course_id=course_id).order_by().values('user_id')
+        return cls.objects.filter(course_id=course_id).update(
+            total_videos=Coalesce(Subquery(published.annotate(n=Count('id')).values('n')), 0),
+            completed_videos=Coalesce(Subquery(
+                user_rows.filter(is_completed=True, video__is_published=True).annotate(n=Count('id')).values('n')
+            ), 0),
+            watch_seconds=Coalesce(Subquery(
+                user_rows.annotate(n=Sum('last_watched_position')).values('n')
+            ), 0),
+        )
+
+    def __str__(self):
+        return f"{self.user.username} - {self.course.title} ({self.completed_videos}/{self.total_videos})"
+
+
+class UploadSession(models.Model):
+    """
+    A resumable multipart upload of a video or resource file straight to
+    storage. The client PUTs parts to presigned URLs and can ask which parts
+    storage already has after a failure; the Video/Resource row is only
+    created once the upload is completed.
+    """
+    KIND_VIDEO = 'video'
+    KIND_RESOURCE = 'resource'
+    STATUS_ACTIVE = 'active'
+    STATUS_COMPLETED = 'completed'
+    STATUS_ABORTED = 'aborted'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='upload_sessions')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    kind = models.CharField(max_length=10, choices=[(KIND_VIDEO, 'Video'), (KIND_RESOURCE, 'Resource')])
+    file_name = models.CharField(max_length=255)  # Storage name, e.g. videos/course_1/lecture.mp4
+    upload_id = models.CharField(max_length=1024)  # Storage multipart upload id
+    content_type = models.CharField(max_length=100)
+    file_size = models.PositiveBigIntegerField()
+    part_size = models.PositiveBigIntegerField()
+    fields = models.JSONField(default=dict)  # Validated title, duration, ... for the row created on completion
+    parts = models.JSONField(default=list)  # [part_number, etag, size] as last listed from storage
+    status = models.CharField(
+        max_length=10,
+        choices=[(STATUS_ACTIVE, 'Active'), (STATUS_COMPLETED, 'Completed'), (STATUS_ABORTED, 'Aborted')],
+        default=STATUS_ACTIVE,
+    )
+    video = models.ForeignKey(Video, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    resource = models.ForeignKey(Resource, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def part_count(self):
+        return max(-(-self.file_size // self.part_size), 1)
+
+    @property
+    def uploaded_bytes(self):
+        return sum(size for _, _, size in self.parts)
+
+    def missing_parts(self):
+        uploaded = {number for number, _, _ in self.parts}
+        return [number for number in range(1, self.part_count + 1) if number not in uploaded]
+
+    def refresh_parts(self):
+        """Ask storage which parts it has; storage, not the client, is the record of what was uploaded."""
+        self.parts = [list(part) for part in get_multipart_backend().list_parts(self.file_name, self.upload_id)]
+        UploadSession.objects.filter(pk=self.pk).update(parts=self.parts, updated_at=now())
+        return self.parts
+
+    def part_urls(self, part_numbers, request=None):
+        backend = get_multipart_backend()
+        expiration = settings.UPLOAD_PART_URL_EXPIRATION
+        return {
+            number: backend.part_url(self.file_name, self.upload_id, number, expiration, request=request)
+            for number in part_numbers
+        }
+
+    def complete(self):
+        """
+        Assemble the uploaded parts and create the Video/Resource row. Call
+        inside a transaction with the session row locked. Raises ValueError if
+        parts are missing or do not add up to the declared file size.
+        """
+        self.refresh_parts()
+        missing = self.missing_parts()
+        if missing:
+            raise ValueError(f"Parts {missing[:20]} have not been uploaded yet.")
+        parts = [part for part in self.parts if part[0] <= self.part_count]
+        if sum(size for _, _, size in parts) != self.file_size:
+            raise ValueError("The uploaded parts do not add up to the declared file size.")
+
+        self.file_name = get_multipart_backend().complete(self.file_name, self.upload_id, parts)
+        metadata = {'content_type': self.content_type, 'file_size': self.file_size}
+        if self.kind == self.KIND_VIDEO:
+            self.video = Video.objects.create(course=self.course, video_file=self.file_name, **metadata, **self.fields)
+        else:
+            self.resource = Resource.objects.create(course=self.course, file=self.file_name, **metadata, **self.fields)
+        #The parts went straight to storage, so the file is hashed (and shared if it is a copy) by a worker
+        row = self.video or self.resource
+        schedule_deduplication(row, 'video_file' if self.video else 'file')
+        self.status = self.STATUS_COMPLETED
+        self.save()
+        return self.video or self.resource
+
+    def abort(self):
+        get_multipart_backend().abort(self.file_name, self.upload_id)
+        self.status = self.STATUS_ABORTED
+        self.save(update_fields=['status', 'updated_at'])
+
+    def __str__(self):
+        return f"{self.kind} upload {self.file_name} ({self.status})"
+
+
+
+class CourseCloneJob(models.Model):
+    """
+    A course being cloned in the background (see courses.course_clone). The
+    new course, its videos and its resources are created first; then their
+    files are shared or copied in storage while `copied_files` counts up to
+    `total_files` for clients polling the job.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_COPYING = 'copying'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    source = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='clone_jobs')
+    course = models.ForeignKey(Course, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')  # The clone
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='course_clone_jobs')
+    title = models.CharField(max_length=255)
+    date_shift = models.IntegerField(default=0)  # Days added to the start and end dates
+    status = models.CharField(
+        max_length=10,
+        choices=[(STATUS_PENDING, 'Pending'), (STATUS_COPYING, 'Copying'), (STATUS_COMPLETED, 'Completed'), (STATUS_FAILED, 'Failed')],
+        default=STATUS_PENDING,
+    )
+    total_files = models.PositiveIntegerField(default=0)
+    copied_files = models.PositiveIntegerField(default=0)  # Shared files count as copied right away
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def progress(self):
+        """Percentage of the files in place."""
+        if self.status == self.STATUS_COMPLETED:
+            return 100
+        return self.copied_files * 100 // self.total_files if self.total_files else 0
+
+    def __str__(self):
+        return f"Clone of {self.source_id} as {self.title} ({self.status})"
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Video)
+@receiver([post_save, post_delete], sender=Resource)
+def bump_course_content_version(sender, instance, **kwargs):
+    #Any course content write invalidates the catalog and that course's ETags
+    course_id = instance.pk if sender is Course else instance.course_id
+    bump_versions(("catalog",), ("course", course_id))
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def bump_enrollment_version(sender, instance, **kwargs):
+    #Also retires the user's cached enrollment membership (see courses.membership)
+    bump_versions(("enrollments", instance.user_id))
+    invalidate_enrollments(instance.user_id)
+
+
+@receiver(post_save, sender=VideoProgress)
+def apply_video_progress(sender, instance, created, **kwargs):
+    #Fold the change into CourseProgress by difference; runs inside VideoProgress.save's transaction
+    was_completed, was_position = (False, 0) if created else getattr(instance, '_loaded_progress', (None, None))
+    instance._loaded_progress = (instance.is_completed, instance.last_watched_position)
+    video = instance.video
+    if was_completed is None or was_position is None:
+        #Saved without being loaded first, so the previous values are unknown
+        CourseProgress.rebuild(user_ids=[instance.user_id], course_ids=[video.course_id], include_missing=True)
+        return
+
+    changes = {'last_activity': instance.updated_at}
+    position_delta = instance.last_watched_position - was_position
+    if position_delta:
+        changes['watch_seconds'] = Greatest(F('watch_seconds') + position_delta, 0)
+    if video.is_published and instance.is_completed != was_completed:
+        changes['completed_videos'] = Greatest(F('completed_videos') + (1 if instance.is_completed else -1), 0)
+    if not CourseProgress.objects.filter(user_id=instance.user_id, course_id=video.course_id).update(**changes):
+        CourseProgress.rebuild(user_ids=[instance.user_id], course_ids=[video.course_id], include_missing=True)
+
+
+@receiver(post_save, sender=Video)
+def refresh_progress_on_video_save(sender, instance, created, **kwargs):
+    #Adding or (un)publishing a video changes every enrolled student's totals
+    if created or getattr(instance, '_loaded_published', None) != instance.is_published:
+        CourseProgress.refresh_course(instance.course_id)
+    instance._loaded_published = instance.is_published
+
+
+@receiver(post_save, sender=Video)
+def process_new_video_file(sender, instance, created, **kwargs):
+    #Duration, resolution, codec, poster and previews all come from the uploaded file itself
+    name = instance.video_file.name
+    if name and (created or getattr(instance, '_loaded_video_file', None) != name):
+        schedule_video_processing(instance.pk)
+    instance._loaded_video_file = name
+
+
+@receiver(post_delete, sender=Video)
+def refresh_progress_on_video_delete(sender, instance, **kwargs):
+    CourseProgress.refresh_course(instance.course_id)
+
+
+@receiver(post_save, sender=Enrollment)
+def create_course_progress(sender, instance, created, **kwargs):
+    if created:
+        CourseProgress.rebuild(user_ids=[instance.user_id], course_ids=[instance.course_id], include_missing=True)
+
+
+@receiver(post_delete, sender=UploadSession)
+def abort_deleted_upload(sender, instance, **kwargs):
+    #Deleting an unfinished session (or its course) releases the parts held in storage
+    if instance.status != UploadSession.STATUS_ACTIVE:
+        return
+
+    def abort():
+        try:
+            get_multipart_backend().abort(instance.file_name, instance.upload_id)
+        except Exception:
+            logger.exception("Aborting upload %s failed", instance.pk)
+    transaction.on_commit(abort)
+
+
+@receiver(post_delete, sender=Course)
+def queue_course_image_deletion(sender, instance, **kwargs):
+    #Stored files of deleted rows are deleted after commit by the storage deletion worker
+    if instance.image:
+        delete_later(instance.image.name)
+
+
+@receiver(post_delete, sender=Video)
+def queue_video_files_deletion(sender, instance, **kwargs):
+    release_files(instance.video_file.name)  # Other videos may share it
+    files = (instance.thumbnail, instance.poster, instance.preview_sprite, instance.preview_vtt)
+    delete_later(
+        *(field_file.name for field_file in files if field_file),
+        prefixes=[derivatives_prefix(instance), packaging_prefix(instance)],  # Every generation, not just the current one
+    )
+
+
+@receiver(post_delete, sender=Resource)
+def queue_resource_file_deletion(sender, instance, **kwargs):
+    if instance.file:
+        release_files(instance.file.name)
@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CatalogCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the course catalog. Ordering by the primary key keeps
+    cursors stable when courses are edited and lets every page use the PK index.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
@@ -0,0 +1,295 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+logger = logging.getLogger(__name__)
+
+BACKEND_REDIS = "redis"
+BACKEND_LOCAL = "local"  # Per-process stand-in; pending positions are only visible to this worker
+BACKEND_OFF = "off"  # Every heartbeat is written straight to the database
+
+
+class LocalProgressBuffer:
+    """Latest position per (user_id, video_id), held in process memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flushing = {}
+
+    def record(self, user_id, video_id, position):
+        with self._lock:
+            self._pending[(user_id, video_id)] = position
+
+    def discard(self, user_id, video_id):
+        with self._lock:
+            self._pending.pop((user_id, video_id), None)
+            self._flushing.pop((user_id, video_id), None)
+
+    def flushing(self, pairs):
+        """The ones of `pairs` still in the running flush, i.e. not discarded since it began."""
+        with self._lock:
+            return {pair for pair in pairs if pair in self._flushing}
+
+    def positions(self, pairs):
+        with self._lock:
+            found = {}
+            for pair in pairs:
+                position = self._pending.get(pair, self._flushing.get(pair))
+                if position is not None:
+                    found[pair] = position
+            return found
+
+    def begin_flush(self):
+        """Move the pending entries aside and return them, or None if a flush is already running."""
+        with self._lock:
+            if self._flushing:
+                return None
+            self._flushing, self._pending = self._pending, {}
+            return dict(self._flushing)
+
+    def end_flush(self, succeeded):
+        with self._lock:
+            if not succeeded:
+                # Keep whatever arrived during the flush, it is newer
+                self._pending = {**self._flushing, **self._pending}
+            self._flushing = {}
+
+
+class RedisProgressBuffer:
+    """
+    Latest position per (user_id, video_id) in a Redis hash shared by all
+    workers. A flush renames the hash aside, so heartbeats that arrive while it
+    runs land in a fresh hash and are never lost or overwritten by older data.
+    """
+    key = "progress-buffer:pending"
+    flushing_key = "progress-buffer:flushing"
+    lock_key = "progress-buffer:lock"
+
+    def __init__(self, url, lock_timeout=60):
+        import redis  # Only needed when the Redis backend is configured
+
+        self.client = redis.Redis.from_url(url)
+        self.lock_timeout = lock_timeout
+
+    @staticmethod
+    def _field(user_id, video_id):
+        return f"{user_id}:{video_id}"
+
+    def record(self, user_id, video_id, position):
+        self.client.hset(self.key, self._field(user_id, video_id), position)
+
+    def discard(self, user_id, video_id):
+        field = self._field(user_id, video_id)
+        pipe = self.client.pipeline()
+        pipe.hdel(self.key, field)
+        pipe.hdel(self.flushing_key, field)
+        pipe.execute()
+
+    def flushing(self, pairs):
+        pairs = list(pairs)
+        if not pairs:
+            return set()
+        values = self.client.hmget(self.flushing_key, [self._field(*pair) for pair in pairs])
+        return {pair for pair, value in zip(pairs, values) if value is not None}
+
+    def positions(self, pairs):
+        pairs = list(pairs)
+        if not pairs:
+            return {}
+        fields = [self._field(*pair) for pair in pairs]
+        pipe = self.client.pipeline()
+        pipe.hmget(self.key, fields)
+        pipe.hmget(self.flushing_key, fields)
+        pending, flushing = pipe.execute()
+        found = {}
+        for pair, new, old in zip(pairs, pending, flushing):
+            value = new if new is not None else old
+            if value is not None:
+                found[pair] = int(value)
+        return found
+
+    def begin_flush(self):
+        if not self.client.set(self.lock_key, 1, nx=True, ex=self.lock_timeout):
+            return None  # Another worker is flushing
+        # A failed flush leaves its entries in flushing_key; those are retried first
+        if not self.client.exists(self.flushing_key) and self.client.exists(self.key):
+            self.client.rename(self.key, self.flushing_key)
+        entries = {}
+        for field, value in self.client.hgetall(self.flushing_key).items():
+            user_id, video_id = field.decode().split(":")
+            entries[(int(user_id), int(video_id))] = int(value)
+        return entries
+
+    def end_flush(self, succeeded):
+        if succeeded:
+            self.client.delete(self.flushing_key)
+        self.client.delete(self.lock_key)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+_flusher = None
+
+
+def buffer_backend():
+    return getattr(settings, "PROGRESS_BUFFER_BACKEND", BACKEND_OFF)
+
+
+def get_progress_buffer():
+    """The configured buffer, or None when heartbeats are written through."""
+    global _buffer
+    if buffer_backend() == BACKEND_OFF:
+        return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                if buffer_backend() == BACKEND_REDIS:
+                    _buffer = RedisProgressBuffer(settings.REDIS_URL)
+                else:
+                    _buffer = LocalProgressBuffer()
+    return _buffer
+
+
+def record_heartbeat(user_id, video_id, position):
+    """Buffer a resume position; the flusher writes it to VideoProgress later."""
+    get_progress_buffer().record(user_id, video_id, position)
+    start_flusher()
+
+
+def discard_heartbeat(user_id, video_id):
+    """Drop a buffered position that a direct write has superseded."""
+    progress_buffer = get_progress_buffer()
+    if progress_buffer is not None:
+        progress_buffer.discard(user_id, video_id)
+
+
+def apply_pending_positions(progress_records):
+    """
+    Overlay buffered resume positions onto VideoProgress instances, so reads
+    see the latest heartbeat before it has been flushed. Returns the records.
+    """
+    progress_buffer = get_progress_buffer()
+    records = [record for record in progress_records if record is not None]
+    if progress_buffer is None or not records:
+        return progress_records
+    positions = progress_buffer.positions((record.user_id, record.video_id) for record in records)
+    for record in records:
+        position = positions.get((record.user_id, record.video_id))
+        if position is not None:
+            record.last_watched_position = position
+    return progress_records
+
+
+def pending_position(user_id, video_id):
+    """Buffered resume position for one video, or None."""
+    progress_buffer = get_progress_buffer()
+    if progress_buffer is None:
+        return None
+    return progress_buffer.positions([(user_id, video_id)]).get((user_id, video_id))
+
+
+def flush_progress_buffer():
+    """
+    Write buffered positions to VideoProgress with one upsert and refresh the
+    affected CourseProgress rows. Returns the number of positions written.
+
+    A direct write (a completion, or an offline sync) that lands while the
+    flush runs wins: with the rows locked, entries discarded since the flush
+    began, and rows written since, are left out of the upsert.
+    """
+    from .models import CourseProgress, Video, VideoProgress
+
+    progress_buffer = get_progress_buffer()
+    if progress_buffer is None:
+        return 0
+    started = now()
+    entries = progress_buffer.begin_flush()
+    if entries is None:
+        return 0
+    if not entries:
+        progress_buffer.end_flush(True)
+        return 0
+
+    succeeded = False
+    try:
+        # Heartbeats for videos or users deleted in the meantime are dropped
+        video_courses = dict(Video.objects.filter(pk__in={video_id for _, video_id in entries}).values_list('id', 'course_id'))
+        user_ids = set(get_user_model().objects.filter(pk__in={user_id for user_id, _ in entries}).values_list('id', flat=True))
+        entries = {
+            (user_id, video_id): position for (user_id, video_id), position in entries.items()
+            if user_id in user_ids and video_id in video_courses
+        }
+        users_by_video = {}
+        for user_id, video_id in entries:
+            users_by_video.setdefault(video_id, set()).add(user_id)
+        existing = Q()
+        for video_id, video_user_ids in users_by_video.items():
+            existing |= Q(video_id=video_id, user_id__in=video_user_ids)
+        with transaction.atomic():
+            # Direct writes lock the row too, so none can slip in between these checks and the upsert
+            locked = VideoProgress.objects.select_for_update().filter(existing) if entries else VideoProgress.objects.none()
+            written_since = {
+                (user_id, video_id) for user_id, video_id, updated_at in locked.values_list('user_id', 'video_id', 'updated_at')
+                if updated_at >= started
+            }
+            current = progress_buffer.flushing(entries) - written_since
+            rows = [
+                VideoProgress(user_id=user_id, video_id=video_id, last_watched_position=position)
+                for (user_id, video_id), position in entries.items()
+                if (user_id, video_id) in current
+            ]
+            VideoProgress.objects.bulk_create(
+                rows,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['user', 'video'],
+                update_fields=['last_watched_position', 'client_timestamp', 'updated_at'],  # Live: clears client_timestamp
+            )
+            CourseProgress.rebuild(pairs={(row.user_id, video_courses[row.video_id]) for row in rows})
+        succeeded = True
+        return len(rows)
+    finally:
+        progress_buffer.end_flush(succeeded)
+
+
+def _flush_forever(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush_progress_buffer()
+        except Exception:
+            logger.exception("Flushing buffered video progress failed")
+        finally:
+            close_old_connections()
+
+
+def start_flusher():
+    """Start this process's background flusher thread once."""
+    global _flusher
+    if _flusher is not None:
+        return
+    with _buffer_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_flush_forever,
+                args=(settings.PROGRESS_BUFFER_FLUSH_INTERVAL,),
+                name="progress-buffer-flusher",
+                daemon=True,
+            )
+            _flusher.start()
+            atexit.register(_flush_at_exit)
+
+
+def _flush_at_exit():
+    try:
+        flush_progress_buffer()
+    except Exception:
+        logger.exception("Flushing buffered video progress at exit failed")
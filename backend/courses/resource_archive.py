@@ -0,0 +1,76 @@
+"""
+A course's resources as one ZIP, streamed while it is written (see
+core.zip_stream). Every file keeps the same name in every archive of the
+course, and the manifest lists them with their sizes and checksums, so a
+client whose download broke off asks for the files it is missing with
+?ids= instead of starting over (the archive is generated, so it has no
+byte ranges to resume).
+"""
+import json
+import os
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.timezone import localtime
+
+from core.zip_stream import ZipEntry, stream_zip
+
+MANIFEST_NAME = "manifest.json"
+
+
+def archive_names(resources):
+    """{resource id: name in the archive}, from the titles, unique within the course."""
+    names = {}
+    taken = {MANIFEST_NAME}
+    for resource in resources:
+        extension = os.path.splitext(resource.file.name)[1]
+        stem = resource.title.replace("/", "-").replace("\\", "-").strip(" .") or f"resource-{resource.pk}"
+        name, number = f"{stem}{extension}", 1
+        while name.lower() in taken:
+            number += 1
+            name = f"{stem} ({number}){extension}"
+        taken.add(name.lower())
+        names[resource.pk] = name
+    return names
+
+
+def archive_manifest(course, resources, names, request=None):
+    url = reverse("student-course-resources-archive", kwargs={"course_id": course.pk})
+    return {
+        "course": {"id": course.pk, "title": course.title},
+        "archive_url": request.build_absolute_uri(url) if request is not None else url,
+        "files": [
+            {
+                "id": resource.pk,
+                "title": resource.title,
+                "name": names[resource.pk],
+                "size": resource.file_size,
+                "checksum": resource.checksum or None,  # SHA-256
+                "content_type": resource.content_type or None,
+                "uploaded_at": resource.uploaded_at.isoformat(),
+            }
+            for resource in resources
+        ],
+    }
+
+
+def stream_resource_archive(course, resources, names, on_complete):
+    """
+    Yield the ZIP of `resources` with its manifest as the first entry. Once
+    the response ends, finished or not, `on_complete` gets the ids of the
+    resources that were sent completely.
+    """
+    ids_by_name = {names[resource.pk]: resource.pk for resource in resources}
+    entries = [
+        ZipEntry(names[resource.pk], resource.file.storage, resource.file.name, resource.file_size, localtime(resource.uploaded_at))
+        for resource in resources
+    ]
+    manifest = json.dumps(archive_manifest(course, resources, names), indent=2)
+    sent = []
+    try:
+        yield from stream_zip(
+            entries, settings.RESOURCE_ARCHIVE_CHUNK_SIZE, extra_files=[(MANIFEST_NAME, manifest)],
+            on_entry=lambda entry: sent.append(ids_by_name[entry.name]),
+        )
+    finally:
+        on_complete(sent)
@@ -1,37 +1,82 @@
 from rest_framework import serializers
 from django.core.files.base import File
-from .models import Course, Video, Resource,VideoProgress, Video, Enrollment
-from core.s3_signed_url import generate_signed_url
+from .models import Course, Video, Resource,VideoProgress, Video, Enrollment, CourseProgress, UploadSession, CourseCloneJob
+from core.s3_signed_url import generate_signed_url, detect_content_type
+from core.serializers import SignedURLListSerializer, SignedURLMixin
+from core.multipart import get_multipart_backend, part_size_for
+from core.storage_deletion import delete_later
+from core.media_blobs import acquire_blob, release_files
+from .membership import enrolled_course_ids
+from .progress_buffer import discard_heartbeat, get_progress_buffer
+from .tasks import schedule_course_clone
+from .video_packaging import playlist_url
 from django.core.validators import FileExtensionValidator
+from django.conf import settings
+from django.db import transaction
 import os
 
-class VideoSerializer(serializers.ModelSerializer):
+VIDEO_EXTENSIONS = ['mp4', 'mkv', 'avi', 'mov']
+
+class VideoSerializer(SignedURLMixin, serializers.ModelSerializer):
+    signed_url_sources = {
+        'video_file': 'video',
+        'thumbnail': 'thumbnail',
+        'poster': 'thumbnail',
+        'preview_sprite': 'thumbnail',
+        'preview_vtt': 'thumbnail',
+    }
     signed_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+    poster_url = serializers.SerializerMethodField()
+    preview_sprite_url = serializers.SerializerMethodField()
+    preview_vtt_url = serializers.SerializerMethodField()  # Cues point at the sprite by file name, relative to preview_sprite_url
+    hls_manifest_url = serializers.SerializerMethodField()  # None until packaged; play signed_url then
     is_published = serializers.BooleanField(read_only=True)  #Default read-only
 
     video_file = serializers.FileField(
         validators=[
             FileExtensionValidator(
-                allowed_extensions=['mp4', 'mkv', 'avi', 'mov']
+                allowed_extensions=VIDEO_EXTENSIONS
             )
         ],
         help_text="Allowed formats: mp4, mkv, avi, mov"
     )
 
     duration = serializers.IntegerField(
-        help_text="Duration must be an integer (e.g., 120 for 2 minutes)"
+        help_text="Duration must be an integer (e.g., 120 for 2 minutes); replaced by the one read from the file once it is probed"
     )
 
     class Meta:
         model = Video
-        fields = ['id', 'title','description', 'video_file', 'duration', 'uploaded_at','is_published', 'signed_url']
-        read_only_fields = ['id', 'uploaded_at', 'signed_url']
+        fields = [
+            'id', 'title','description', 'video_file', 'duration', 'width', 'height', 'codec', 'uploaded_at','is_published', 'signed_url',
+            'thumbnail_url', 'poster_url', 'preview_sprite_url', 'preview_vtt_url', 'derivatives_status',
+            'hls_manifest_url', 'hls_renditions', 'packaging_status',
+        ]
+        read_only_fields = ['id', 'width', 'height', 'codec', 'uploaded_at', 'signed_url', 'derivatives_status', 'hls_renditions', 'packaging_status']
+        list_serializer_class = SignedURLListSerializer
 
     def get_signed_url(self, obj):
-        #Generate signed URL for S3
-        if obj.video_file:
-            return generate_signed_url(f"media/{obj.video_file.name}")  #Ensure this method correctly generates an accessible signed URL
-        return None  #If no file is present, return None
+        #Generate signed URL for S3 (batched when serializing a list)
+        return self.signed_url_for(obj.video_file, 'video')  #None if no file is present
+
+    def get_thumbnail_url(self, obj):
+        return self.signed_url_for(obj.thumbnail, 'thumbnail')
+
+    def get_poster_url(self, obj):
+        return self.signed_url_for(obj.poster, 'thumbnail')
+
+    def get_preview_sprite_url(self, obj):
+        return self.signed_url_for(obj.preview_sprite, 'thumbnail')
+
+    def get_preview_vtt_url(self, obj):
+        return self.signed_url_for(obj.preview_vtt, 'thumbnail')
+
+    def get_hls_manifest_url(self, obj):
+        if not obj.hls_manifest or obj.packaging_status != Video.PACKAGING_READY:
+            return None
+        #Segments are relative to the playlist, so they need the course credential or the playlist endpoint
+        return self.plain_media_url_for(obj.hls_manifest) or playlist_url(obj.hls_manifest.name, self.context.get('request'))
 
     def validate_video_file(self, value):
         # Ensure only the base filename is saved, avoiding full paths
@@ -73,23 +118,33 @@ class VideoSerializer(serializers.ModelSerializer):
         instance.duration = validated_data.get('duration', instance.duration)
         instance.is_published = validated_data.get('is_published', instance.is_published)
 
-        #Check if a new file is uploaded, delete the old one & replace it
+        #Check if a new file is uploaded, replace it & delete the old one once saved
         new_file = validated_data.get('video_file', None)
+        old_name = None
         if new_file:
-            if instance.video_file:
-                instance.video_file.delete(save=False)  # Delete old video
+            old_name = instance.video_file.name if instance.video_file else None
             instance.video_file = new_file  # Assign new video
 
-        instance.save()
+        with transaction.atomic():
+            instance.save()
+            release_files(old_name)  # Deleted from storage after commit unless other videos share it
         return instance
 
-class ResourceSerializer(serializers.ModelSerializer):
-    download_count = serializers.IntegerField(read_only= True)
+class ResourceSerializer(SignedURLMixin, serializers.ModelSerializer):
+    download_count = serializers.IntegerField(source='total_download_count', read_only= True)  # Includes unfolded counter slots
     
     class Meta:
         model = Resource
         fields = ['id', 'title', 'file', 'uploaded_at','resource_type','download_count']
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        #Files covered by a course media credential are served from plain URLs
+        plain_url = self.plain_media_url_for(instance.file)
+        if plain_url:
+            data['file'] = plain_url
+        return data
+
     def validate_title(self, value):
         # Ensure the title is a valid string
         if not isinstance(value, str) or len(value.strip()) == 0:
@@ -106,8 +161,144 @@ class ResourceSerializer(serializers.ModelSerializer):
         # Save and return the resource object
         return Resource.objects.create(**validated_data)
 
+    def update(self, instance, validated_data):
+        #A replaced file lets go of the old one once saved
+        old_name = instance.file.name if validated_data.get('file') and instance.file else None
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            release_files(old_name)
+        return instance
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """
+    Starts a resumable upload: validates the file name and the fields of the
+    Video/Resource to create (with the same rules as VideoSerializer and
+    ResourceSerializer) and opens a multipart upload in storage.
+    """
+    filename = serializers.CharField(write_only=True, max_length=255)
+    file_size = serializers.IntegerField(min_value=1)
+    content_type = serializers.CharField(required=False, max_length=100)
+    title = serializers.CharField(write_only=True)
+    description = serializers.CharField(write_only=True, required=False, allow_blank=True, allow_null=True)
+    duration = serializers.IntegerField(write_only=True, required=False)
+    resource_type = serializers.CharField(write_only=True, required=False)
+    #Optional: when these bytes are stored already the session completes at once, without uploading them
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', write_only=True, required=False)
+    part_count = serializers.IntegerField(read_only=True)
+    uploaded_bytes = serializers.IntegerField(read_only=True)
+    uploaded_parts = serializers.SerializerMethodField()
+
+    row_serializers = {
+        UploadSession.KIND_VIDEO: (VideoSerializer, 'video_file', ['title', 'description', 'duration']),
+        UploadSession.KIND_RESOURCE: (ResourceSerializer, 'file', ['title', 'resource_type']),
+    }
 
-class CourseSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'kind', 'filename', 'file_name', 'file_size', 'content_type', 'part_size', 'part_count',
+            'status', 'uploaded_parts', 'uploaded_bytes', 'video', 'resource', 'created_at',
+            'title', 'description', 'duration', 'resource_type', 'sha256',
+        ]
+        read_only_fields = ['id', 'file_name', 'part_size', 'status', 'video', 'resource', 'created_at']
+
+    def get_uploaded_parts(self, obj):
+        return [{"part_number": number, "size": size} for number, _, size in obj.parts]
+
+    def validate_filename(self, value):
+        value = os.path.basename(value)
+        if not value:
+            raise serializers.ValidationError("A file name is required.")
+        return value
+
+    def validate(self, attrs):
+        kind = attrs['kind']
+        row_serializer_class, file_field, field_names = self.row_serializers[kind]
+        if kind == UploadSession.KIND_VIDEO:
+            extension = os.path.splitext(attrs['filename'])[1].lstrip('.').lower()
+            if extension not in VIDEO_EXTENSIONS:
+                raise serializers.ValidationError({"filename": f"Allowed formats: {', '.join(VIDEO_EXTENSIONS)}"})
+
+        # The row is validated now, so a finished upload cannot be refused for its title
+        row_serializer = row_serializer_class(data={name: attrs[name] for name in field_names if name in attrs})
+        row_serializer.fields.pop(file_field)
+        row_serializer.is_valid(raise_exception=True)
+        attrs['fields'] = dict(row_serializer.validated_data)
+        return attrs
+
+    def create(self, validated_data):
+        course = self.context['course']
+        row = Video(course=course) if validated_data['kind'] == UploadSession.KIND_VIDEO else Resource(course=course)
+        file_field = row._meta.get_field(self.row_serializers[validated_data['kind']][1])
+        file_name = file_field.storage.get_available_name(
+            file_field.generate_filename(row, validated_data['filename']), max_length=file_field.max_length
+        )
+        content_type = validated_data.get('content_type') or detect_content_type(file_name)
+        if validated_data.get('sha256') and settings.MEDIA_DEDUPLICATION:
+            session = self.link_stored_copy(row, file_field, content_type, validated_data)
+            if session is not None:
+                return session
+        return UploadSession.objects.create(
+            course=course,
+            created_by=self.context['user'],
+            kind=validated_data['kind'],
+            file_name=file_name,
+            upload_id=get_multipart_backend().create(file_name, content_type),
+            content_type=content_type,
+            file_size=validated_data['file_size'],
+            part_size=part_size_for(validated_data['file_size']),
+            fields=validated_data['fields'],
+        )
+
+    def link_stored_copy(self, row, file_field, content_type, validated_data):
+        """
+        A completed session whose row points at the stored copy of the
+        declared contents, or None if they are not stored yet. The declared
+        digest is trusted: only staff can upload, and they can read every
+        course's files anyway.
+        """
+        digest, file_size = validated_data['sha256'].lower(), validated_data['file_size']
+        with transaction.atomic():
+            name = acquire_blob(digest, file_size)
+            if name is None:
+                return None
+            setattr(row, file_field.name, name)
+            for attr, value in zip(row.file_metadata_fields[file_field.name], (content_type, file_size, digest)):
+                setattr(row, attr, value)
+            for attr, value in validated_data['fields'].items():
+                setattr(row, attr, value)
+            row.save()
+            return UploadSession.objects.create(
+                course=row.course,
+                created_by=self.context['user'],
+                kind=validated_data['kind'],
+                file_name=name,
+                upload_id='',  # Nothing to upload
+                content_type=content_type,
+                file_size=file_size,
+                part_size=part_size_for(file_size),
+                fields=validated_data['fields'],
+                status=UploadSession.STATUS_COMPLETED,
+                video=row if isinstance(row, Video) else None,
+                resource=row if isinstance(row, Resource) else None,
+            )
+
+
+class UploadPartURLSerializer(serializers.Serializer):
+    part_numbers = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000
+    )
+
+    def validate_part_numbers(self, value):
+        part_count = self.context['session'].part_count
+        if any(number > part_count for number in value):
+            raise serializers.ValidationError(f"This upload has {part_count} parts.")
+        return sorted(set(value))
+
+
+class CourseSerializer(SignedURLMixin, serializers.ModelSerializer):
+    signed_url_sources = {'image': 'course_image'}
     created_by = serializers.HiddenField(default=serializers.CurrentUserDefault())
     videos = VideoSerializer(many=True, read_only=True)
     resources = ResourceSerializer(many=True, read_only=True)
@@ -127,9 +318,11 @@ class CourseSerializer(serializers.ModelSerializer):
             'videos',
             'resources',
             'image',
-            'image_url'
+            'image_url',
+            'is_published',
         ]
-        read_only_fields = ['image_url']
+        read_only_fields = ['image_url', 'is_published']
+        list_serializer_class = SignedURLListSerializer
 
     def validate_title(self, value):
         # Ensure the title is a valid string
@@ -147,22 +340,90 @@ class CourseSerializer(serializers.ModelSerializer):
     
     def get_image_url(self, obj):
         #Generate signed URL for S3 images
-        if obj.image:
-            return generate_signed_url(f"media/{obj.image.name}")  
-        return None
+        return self.signed_url_for(obj.image, 'course_image')
     
     def update(self, instance, validated_data):
         #Preserve existing image if no new image is provided
+        old_name = None
         if 'image' in validated_data:
             if instance.image and validated_data['image'] is not None:
-                instance.image.delete(save=False)
+                old_name = instance.image.name
             instance.image = validated_data['image']
         instance.title = validated_data.get('title', instance.title)
         instance.description = validated_data.get('description', instance.description)
         instance.start_date = validated_data.get('start_date', instance.start_date)
         instance.end_date = validated_data.get('end_date', instance.end_date)
-        instance.save()
+        with transaction.atomic():
+            instance.save()
+            delete_later(old_name)  # Deleted from storage after commit, off the request
         return instance
+class CourseCloneJobSerializer(serializers.ModelSerializer):
+    """
+    Starts cloning a course: `title` defaults to the source's with " (copy)",
+    and the dates move either by `date_shift` days or so that the clone
+    starts on `start_date`. Read back to follow the job's progress.
+    """
+    title = serializers.CharField(required=False, max_length=255)
+    start_date = serializers.DateField(write_only=True, required=False)
+    date_shift = serializers.IntegerField(required=False, min_value=-3650, max_value=3650)
+    progress = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = CourseCloneJob
+        fields = [
+            'id', 'source', 'course', 'title', 'start_date', 'date_shift', 'status',
+            'total_files', 'copied_files', 'progress', 'error', 'created_at', 'finished_at',
+        ]
+        read_only_fields = ['id', 'source', 'course', 'status', 'total_files', 'copied_files', 'error', 'created_at', 'finished_at']
+
+    def validate(self, attrs):
+        source = self.context['course']
+        if 'start_date' in attrs:
+            if 'date_shift' in attrs:
+                raise serializers.ValidationError("Give either start_date or date_shift, not both.")
+            attrs['date_shift'] = (attrs.pop('start_date') - source.start_date).days
+        return attrs
+
+    def create(self, validated_data):
+        source = self.context['course']
+        validated_data.setdefault('title', f"{source.title} (copy)"[:255])
+        with transaction.atomic():
+            job = CourseCloneJob.objects.create(source=source, created_by=self.context['user'], **validated_data)
+            schedule_course_clone(job.pk)
+        return job
+
+
+class CatalogCourseSerializer(SignedURLMixin, serializers.ModelSerializer):
+    """
+    Course summary for catalog listings. Expects a queryset annotated with
+    `Course.objects.with_catalog_stats()`; videos and resources are not nested.
+    """
+    signed_url_sources = {'image': 'course_image'}
+    image_url = serializers.SerializerMethodField()
+    video_count = serializers.IntegerField(read_only=True)
+    total_duration = serializers.IntegerField(read_only=True)
+    resource_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Course
+        fields = [
+            'id',
+            'title',
+            'description',
+            'start_date',
+            'end_date',
+            'created_at',
+            'image_url',
+            'video_count',
+            'total_duration',
+            'resource_count',
+        ]
+        read_only_fields = fields
+        list_serializer_class = SignedURLListSerializer
+
+    def get_image_url(self, obj):
+        return self.signed_url_for(obj.image, 'course_image')
+
 
 class EnrollmentSerializer(serializers.ModelSerializer):
     """
@@ -178,10 +439,20 @@ class EnrollmentSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'course', 'enrolled_date']
 
 
-class VideoProgressSerializer(serializers.ModelSerializer):
+def course_progress_for(context, user_id, course_id):
+    """
+    CourseProgress for (user, course). Callers serializing many rows can pass the
+    user's rows in context as {"course_progress": {course_id: CourseProgress}}.
+    """
+    progress = (context.get('course_progress') or {}).get(course_id)
+    return progress or CourseProgress.for_user(user_id, course_id)
+
+
+class VideoProgressSerializer(SignedURLMixin, serializers.ModelSerializer):
     """
     Serializer to handle video progress for students and admins.
     """
+    signed_url_sources = {'video.thumbnail': 'thumbnail'}
     video = serializers.IntegerField(source='video.id', read_only=True)
     video_title = serializers.CharField(source='video.title', read_only=True)
     course_id = serializers.SerializerMethodField()
@@ -197,6 +468,7 @@ class VideoProgressSerializer(serializers.ModelSerializer):
             'progress_percentage', 'last_watched_position', 'is_completed', 'updated_at','video_thumbnail_url'
         ]
         read_only_fields = ['id', 'updated_at', 'user', 'video', 'video_title', 'course_id', 'course_title', 'is_completed']
+        list_serializer_class = SignedURLListSerializer
 
     def get_course_id(self, obj):
         """Fetch course ID from related Video object."""
@@ -208,20 +480,14 @@ class VideoProgressSerializer(serializers.ModelSerializer):
 
     def get_progress_percentage(self, obj):
         """
-        Dynamically calculate progress percentage for a course.
+        Progress percentage for the video's course, from the CourseProgress aggregate.
         Ensures consistency with `DashboardEnrollmentSerializer`.
         """
-        user = obj.user
-        course = obj.video.course
-        total_videos = course.videos.count()
-        completed_videos = VideoProgress.objects.filter(video__course=course, user=user, is_completed=True).count()
-        return (completed_videos / total_videos * 100) if total_videos > 0 else 0
+        return course_progress_for(self.context, obj.user_id, obj.video.course_id).progress_percentage
     
     def get_video_thumbnail_url(self, obj):
         """Generate signed URL for video thumbnail"""
-        if obj.video.thumbnail:  # Assuming video has a `thumbnail` field
-            return generate_signed_url(f"media/{obj.video.thumbnail.name}")  
-        return None  # If no thumbnail, return None
+        return self.signed_url_for(obj.video.thumbnail, 'thumbnail')  # None if no thumbnail
 
     def validate_progress_percentage(self, value):
         """
@@ -246,29 +512,114 @@ class VideoProgressSerializer(serializers.ModelSerializer):
         user = self.context['user']
         video = self.context['video']
 
-        # Fetch existing progress or create a new one
-        progress, created = VideoProgress.objects.update_or_create(
-            user=user,
-            video=video,
-            defaults={
-                'last_watched_position': validated_data.get('last_watched_position', 0),
-                'is_completed': validated_data.get('is_completed', False)
-            }
-        )
-
-        # Recalculate progress percentage dynamically
-        total_videos = video.course.videos.count()
-        completed_videos = VideoProgress.objects.filter(
-            user=user, video__course=video.course, is_completed=True
-        ).count()
-        
-        progress.progress_percentage = (completed_videos / total_videos * 100) if total_videos > 0 else 0
+        position = validated_data.get('last_watched_position', 0)
+        with transaction.atomic():
+            # Fetch existing progress or create a new one
+            progress, created = VideoProgress.objects.select_for_update().get_or_create(user=user, video=video)
+            progress.last_watched_position = position
+            # Completed once the position reaches the end; rewatching the start does not undo it
+            progress.is_completed = progress.is_completed or video.is_watched_through(position)
+            progress.client_timestamp = None  # Live update: updated_at is its timestamp for offline sync
+            progress.save()
+
+        # Course progress is kept up to date by the save above
+        progress.progress_percentage = CourseProgress.for_user(user.id, video.course_id).progress_percentage
         progress.save()
 
         return progress
 
 
     
+class ProgressSyncEventSerializer(serializers.Serializer):
+    course_id = serializers.IntegerField()
+    video_id = serializers.IntegerField()
+    position = serializers.IntegerField(min_value=0)  # Seconds
+    completed = serializers.BooleanField(default=False)
+    client_timestamp = serializers.DateTimeField()
+
+
+class ProgressSyncSerializer(serializers.Serializer):
+    """
+    Applies a batch of queued (offline) progress events for the user in context.
+    Enrollment is checked once for the batch, the newest event per video wins by
+    client_timestamp, and everything is written in one transaction with a bulk
+    upsert. Against stored progress, client clocks are only compared with client
+    clocks: progress last written live has no client_timestamp, so there the
+    further position wins. Completion follows the position, as for live updates.
+    """
+    MAX_EVENTS = 500
+
+    events = ProgressSyncEventSerializer(many=True, allow_empty=False, max_length=MAX_EVENTS)
+
+    def create(self, validated_data):
+        user = self.context['user']
+        events = validated_data['events']
+        rejected = []
+
+        course_ids = {event['course_id'] for event in events}
+        enrolled = enrolled_course_ids(user, course_ids)
+        videos = Video.objects.only('id', 'course_id', 'duration').in_bulk(
+            {event['video_id'] for event in events}
+        )
+        videos = {video_id: video for video_id, video in videos.items() if video.course_id in enrolled}
+
+        # Newest event per video within the batch
+        latest = {}
+        for index, event in enumerate(events):
+            video = videos.get(event['video_id'])
+            if event['course_id'] not in enrolled:
+                rejected.append({"index": index, "reason": "You are not enrolled in this course."})
+            elif video is None or video.course_id != event['course_id']:
+                rejected.append({"index": index, "reason": "Video not found in this course."})
+            elif event['completed'] and not video.is_watched_through(event['position']):
+                rejected.append({"index": index, "reason": "The position does not reach the end of the video."})
+            elif event['video_id'] not in latest or event['client_timestamp'] >= latest[event['video_id']]['client_timestamp']:
+                latest[event['video_id']] = event
+
+        applied = 0
+        with transaction.atomic():
+            stored = {
+                progress.video_id: progress
+                for progress in VideoProgress.objects.select_for_update().filter(user=user, video_id__in=latest)
+            }
+            # Heartbeats not flushed yet are live progress too
+            progress_buffer = get_progress_buffer()
+            buffered = progress_buffer.positions((user.id, video_id) for video_id in latest) if progress_buffer is not None else {}
+            rows = []
+            for video_id, event in latest.items():
+                current = stored.get(video_id)
+                live_position = buffered.get((user.id, video_id))
+                if live_position is None and current is not None:
+                    if current.client_timestamp is None:
+                        live_position = current.last_watched_position  # Written live: no client clock to compare
+                    elif event['client_timestamp'] <= current.client_timestamp:
+                        continue  # Stored progress is newer (last writer wins)
+                if live_position is not None and event['position'] < live_position:
+                    continue  # Live progress got further
+                rows.append(VideoProgress(
+                    user=user,
+                    video_id=video_id,
+                    last_watched_position=event['position'],
+                    # Replaying an old event never undoes a completion
+                    is_completed=videos[video_id].is_watched_through(event['position']) or bool(current and current.is_completed),
+                    client_timestamp=event['client_timestamp'],
+                ))
+            if rows:
+                VideoProgress.objects.bulk_create(
+                    rows,
+                    update_conflicts=True,
+                    unique_fields=['user', 'video'],
+                    update_fields=['last_watched_position', 'is_completed', 'client_timestamp', 'updated_at'],
+                )
+                for row in rows:
+                    discard_heartbeat(user.id, row.video_id)  # Superseded by the synced position
+                # bulk_create skips the signals that keep CourseProgress current
+                CourseProgress.rebuild(user_ids=[user.id], course_ids={videos[row.video_id].course_id for row in rows})
+            applied = len(rows)
+
+        return {"applied": applied, "skipped": len(latest) - applied, "rejected": rejected}
+
+
 class CourseProgressSerializer(serializers.Serializer):
     course_title = serializers.CharField(read_only=True)
     total_videos = serializers.IntegerField()
@@ -299,7 +650,7 @@ class StudentCourseSerializer(serializers.ModelSerializer):
         """
         is_enrolled = self.context.get("is_enrolled", False)
         if is_enrolled:
-            return VideoSerializer(obj.videos.all(), many=True).data
+            return VideoSerializer(obj.videos.all(), many=True, context=self.context).data
         return [{"title": video.title, "locked": True} for video in obj.videos.all()]
 
     def get_resources(self, obj):
@@ -308,7 +659,7 @@ class StudentCourseSerializer(serializers.ModelSerializer):
         """
         is_enrolled = self.context.get("is_enrolled", False)
         if is_enrolled:
-            return ResourceSerializer(obj.resources.all(), many=True).data
+            return ResourceSerializer(obj.resources.with_download_totals(), many=True, context=self.context).data
         return [{"title": resource.title, "locked": True} for resource in obj.resources.all()]
 
 
@@ -0,0 +1,74 @@
+from celery import chain, shared_task
+from django.conf import settings
+from django.db import transaction
+
+from .course_clone import clone_course, reset_stale_clone_jobs
+from .media_dedup import deduplicate_file
+from .video_derivatives import generate_video_derivatives
+from .video_packaging import package_video
+from .video_probe import probe_video
+
+
+@shared_task(ignore_result=True)
+def probe_video_task(video_id):
+    probe_video(video_id)
+
+
+@shared_task(ignore_result=True)
+def generate_video_derivatives_task(video_id):
+    generate_video_derivatives(video_id)
+
+
+@shared_task(ignore_result=True)
+def package_video_task(video_id):
+    package_video(video_id)
+
+
+def schedule_video_processing(video_id):
+    """
+    Once the current transaction commits, probe the video's header and then
+    generate its poster, thumbnail and seek previews, and its HLS package when
+    VIDEO_HLS_PACKAGING is on, on the Celery workers. Without BACKGROUND_TASKS
+    the processing commands pick the video up instead.
+    """
+    if not (settings.BACKGROUND_TASKS and settings.VIDEO_PROCESSING_ON_UPLOAD):
+        return
+    # The later steps need the probed duration and size, so they run after the probe
+    steps = [probe_video_task.si(video_id), generate_video_derivatives_task.si(video_id)]
+    if settings.VIDEO_HLS_PACKAGING:
+        steps.append(package_video_task.si(video_id))  # Last: the previews should not wait for the transcode
+    transaction.on_commit(lambda: chain(*steps).delay())
+
+
+@shared_task(ignore_result=True)
+def deduplicate_file_task(model_label, pk, field_name):
+    deduplicate_file(model_label, pk, field_name)
+
+
+def schedule_deduplication(row, field_name):
+    """
+    Once the current transaction commits, share a row's stored file with its
+    identical copies (see courses.media_dedup); without BACKGROUND_TASKS,
+    deduplicate_media does it later.
+    """
+    if not (settings.BACKGROUND_TASKS and settings.MEDIA_DEDUPLICATION):
+        return
+    label, pk = row._meta.label, row.pk
+    transaction.on_commit(lambda: deduplicate_file_task.delay(label, pk, field_name))
+
+
+@shared_task(ignore_result=True)
+def clone_course_task(job_id):
+    clone_course(job_id)
+
+
+@shared_task(ignore_result=True)
+def reset_stale_clone_jobs_task():
+    for job_id in reset_stale_clone_jobs():
+        schedule_course_clone(job_id)
+
+
+def schedule_course_clone(job_id):
+    """Once the current transaction commits, run a clone job on the Celery workers; without BACKGROUND_TASKS it waits for run_clone_jobs."""
+    if settings.BACKGROUND_TASKS:
+        transaction.on_commit(lambda: clone_course_task.delay(str(job_id)))
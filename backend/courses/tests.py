@@ -1,3 +1,812 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import io
+import os
+import re
+import shutil
+import struct
+import tempfile
+import time
+import zipfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+import core.multipart
+import core.presigner
+import courses.membership
+import courses.progress_buffer
+from core.models import MediaBlob
+from core.storage_deletion import drain_storage_deletions
+
+from notes.models import Note
+from notifications.models import Notification
+from userauths.models import User
+
+from .course_clone import clone_course
+from .membership import EnrollmentMembershipCache, enrolled_course_ids
+from .models import Course, CourseCloneJob, CourseProgress, Enrollment, Resource, ResourceDownloadCounter, UploadSession, Video, VideoProgress
+from .progress_buffer import flush_progress_buffer
+from .serializers import ResourceSerializer
+from .video_derivatives import generate_video_derivatives
+from .video_packaging import has_audio_track, package_video
+
+
+def forget_cached_state():
+    """Per-process caches outlive the rolled-back rows, and reused ids, of earlier tests."""
+    caches["shared"].clear()
+    courses.membership._cache = None
+
+
+class HotQueryPlanTests(TestCase):
+    """
+    EXPLAIN the hot read queries and fail if any of them has to scan a whole
+    table (or sort one) instead of using an index. Runs against SQLite and
+    PostgreSQL; on PostgreSQL sequential scans are disabled for the check so
+    the tiny test tables do not make the planner prefer them.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="admin", email="admin@example.com", user_type="admin")
+        cls.student = User.objects.create(username="student", email="student@example.com", user_type="student")
+        today = datetime.date.today()
+        cls.course = Course.objects.create(
+            title="Course", description="", start_date=today, end_date=today, created_by=cls.admin
+        )
+        cls.video = Video.objects.create(course=cls.course, title="Video", video_file="videos/course_1/video.mp4", duration=60)
+        Enrollment.objects.create(user=cls.student, course=cls.course)
+        VideoProgress.objects.create(user=cls.student, video=cls.video, last_watched_position=10)
+        Notification.objects.create(user=cls.student, message="Hello")
+        Note.objects.create(user=cls.student, video=cls.video, content="Note", video_position=5)
+
+    def hot_queries(self):
+        student, course, video = self.student, self.course, self.video
+        return {
+            "enrollment check": Enrollment.objects.filter(user=student, course=course),
+            "continue watching": VideoProgress.objects.filter(
+                user=student, is_completed=False, last_watched_position__gt=0
+            ).order_by('-updated_at'),
+            "completed videos in course": VideoProgress.objects.filter(
+                video__course=course, user=student, is_completed=True
+            ).values('id'),
+            "course progress": CourseProgress.objects.filter(user=student, course=course),
+            "general notifications": Notification.objects.filter(user=student, course__isnull=True).order_by('-created_at'),
+            "video notes": Note.objects.filter(user=student, video=video).order_by('video_position'),
+            "latest courses": Course.objects.order_by('-created_at')[:5],
+        }
+
+    def full_scans(self, plan):
+        if connection.vendor == "postgresql":
+            return re.findall(r"Seq Scan on (\w+)|(Sort)\b", plan)
+        # SQLite: "SCAN t" without an index reads the whole table; a temp B-tree means an unindexed sort
+        return re.findall(r"SCAN (\w+)(?!\w| USING (?:COVERING )?INDEX)|(USE TEMP B-TREE)", plan)
+
+    def test_hot_queries_use_indexes(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SET enable_seqscan = off")
+        for name, queryset in self.hot_queries().items():
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertFalse(self.full_scans(plan), f"{name} is not served by an index:\n{plan}")
+
+    def test_enrollment_is_unique(self):
+        from django.db import IntegrityError, transaction
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Enrollment.objects.create(user=self.student, course=self.course)
+
+
+class CatalogTests(TestCase):
+    def setUp(self):
+        forget_cached_state()
+        admin = User.objects.create(username="admin", email="admin@example.com", user_type="admin")
+        today = datetime.date.today()
+        self.courses = [
+            Course.objects.create(title=f"Course {n}", description="", start_date=today, end_date=today, created_by=admin)
+            for n in range(3)
+        ]
+        for duration in (60, 90):
+            Video.objects.create(course=self.courses[0], title="Video", video_file=f"videos/course_{self.courses[0].id}/{duration}.mp4", duration=duration)
+        Resource.objects.create(course=self.courses[0], title="Notes", file=f"resources/course_{self.courses[0].id}/notes.pdf")
+
+    def test_pages_carry_course_stats_and_a_cursor(self):
+        with self.assertNumQueries(1):
+            first = self.client.get("/api/v1/courses/public/", {"view": "catalog", "page_size": 2}).json()
+        self.assertEqual([course["id"] for course in first["results"]], [self.courses[2].id, self.courses[1].id])
+        self.assertIsNone(first["previous"])
+        self.assertEqual(
+            {key: first["results"][0][key] for key in ("video_count", "total_duration", "resource_count")},
+            {"video_count": 0, "total_duration": 0, "resource_count": 0},
+        )
+
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(
+            [(course["id"], course["video_count"], course["total_duration"], course["resource_count"]) for course in second["results"]],
+            [(self.courses[0].id, 2, 150, 1)],
+        )
+        self.assertIsNone(second["next"])
+        self.assertIsNotNone(second["previous"])
+
+    def test_plain_list_unless_the_catalog_is_asked_for(self):
+        courses = self.client.get("/api/v1/courses/public/").json()
+        self.assertEqual(
+            {course["id"]: (len(course["videos"]), len(course["resources"])) for course in courses},
+            {self.courses[0].id: (2, 1), self.courses[1].id: (0, 0), self.courses[2].id: (0, 0)},
+        )
+
+
+class VideoProgressTests(TestCase):
+    """Progress heartbeats from enrolled students, buffered or written through."""
+
+    def setUp(self):
+        forget_cached_state()
+        self.admin = User.objects.create(username="admin", email="admin@example.com", user_type="admin")
+        self.student = User.objects.create(username="student", email="student@example.com", user_type="student")
+        today = datetime.date.today()
+        self.course = Course.objects.create(
+            title="Course", description="", start_date=today, end_date=today, created_by=self.admin
+        )
+        self.video = Video.objects.create(course=self.course, title="Video", video_file="videos/course_1/video.mp4", duration=100)
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(user=self.student, course=self.course)
+        self.headers = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(self.student).access_token}"}
+        self.url = f"/api/v1/courses/student/{self.course.id}/videos/{self.video.id}/progress/"
+
+    def use_buffer(self, backend):
+        settings_override = override_settings(PROGRESS_BUFFER_BACKEND=backend)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        courses.progress_buffer._buffer = None
+        self.addCleanup(setattr, courses.progress_buffer, "_buffer", None)
+        flusher = mock.patch("courses.progress_buffer.start_flusher")  # Flushed by the test instead
+        flusher.start()
+        self.addCleanup(flusher.stop)
+
+    def post(self, data):
+        return self.client.post(self.url, data, content_type="application/json", **self.headers)
+
+    def test_completion_is_derived_from_position(self):
+        self.use_buffer("off")
+        response = self.post({"last_watched_position": 10, "is_completed": True})
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.json()["progress"]["is_completed"])  # The client's flag is read-only
+
+        self.post({"last_watched_position": 96})
+        self.assertTrue(VideoProgress.objects.get(user=self.student, video=self.video).is_completed)
+        self.post({"last_watched_position": 5})  # Rewatching
+        progress = VideoProgress.objects.get(user=self.student, video=self.video)
+        self.assertEqual((progress.last_watched_position, progress.is_completed), (5, True))
+        self.assertEqual(CourseProgress.for_user(self.student.id, self.course.id).completed_videos, 1)
+
+    def test_heartbeats_are_buffered_until_flushed(self):
+        self.use_buffer("local")
+        response = self.post({"last_watched_position": 30})
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(VideoProgress.objects.filter(user=self.student).exists())
+
+        self.assertEqual(flush_progress_buffer(), 1)
+        self.assertEqual(VideoProgress.objects.get(user=self.student, video=self.video).last_watched_position, 30)
+        self.assertEqual(CourseProgress.for_user(self.student.id, self.course.id).watch_seconds, 30)
+
+        self.post({"last_watched_position": 40})
+        response = self.post({"last_watched_position": 99})  # Reaching the end is written at once
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(flush_progress_buffer(), 0)  # The buffered 40 was superseded
+        progress = VideoProgress.objects.get(user=self.student, video=self.video)
+        self.assertEqual((progress.last_watched_position, progress.is_completed), (99, True))
+
+    def flush_with_write_in_between(self, write):
+        progress_buffer = courses.progress_buffer.get_progress_buffer()
+        begin_flush = progress_buffer.begin_flush
+
+        def begin_then_write():
+            entries = begin_flush()
+            write()  # Lands after the flush took its snapshot
+            return entries
+
+        with mock.patch.object(progress_buffer, "begin_flush", begin_then_write):
+            return flush_progress_buffer()
+
+    def test_direct_writes_during_a_flush_win(self):
+        self.use_buffer("local")
+        self.post({"last_watched_position": 30})
+        self.assertEqual(self.flush_with_write_in_between(lambda: self.sync((60, 0, False))), 0)  # The sync discards the heartbeat
+        progress = VideoProgress.objects.get(user=self.student, video=self.video)
+        self.assertEqual(progress.last_watched_position, 60)
+        self.assertIsNotNone(progress.client_timestamp)
+
+        self.post({"last_watched_position": 65})
+        def direct():  # A write that does not go through the buffer at all
+            VideoProgress.objects.filter(pk=progress.pk).update(last_watched_position=70, updated_at=timezone.now())
+
+        self.assertEqual(self.flush_with_write_in_between(direct), 0)
+        self.assertEqual(self.stored_position(), 70)
+        self.assertEqual(CourseProgress.for_user(self.student.id, self.course.id).watch_seconds, 60)  # Untouched: nothing was flushed
+
+    def sync(self, *events):
+        events = [
+            {"course_id": self.course.id, "video_id": self.video.id, "position": position,
+             "completed": completed, "client_timestamp": f"2026-01-01T10:{minute:02}:00Z"}
+            for position, minute, completed in events
+        ]
+        response = self.client.post("/api/v1/courses/student/progress/sync/", {"events": events}, content_type="application/json", **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def stored_position(self):
+        return VideoProgress.objects.get(user=self.student, video=self.video).last_watched_position
+
+    def test_sync_newest_client_event_wins(self):
+        self.use_buffer("off")
+        result = self.sync((50, 2, False), (20, 1, False), (10, 3, True))
+        self.assertEqual((result["applied"], len(result["rejected"])), (1, 1))  # Completion at 10 of 100 seconds is rejected
+        self.assertEqual(self.stored_position(), 50)
+
+        self.assertEqual(self.sync((80, 0, False))["skipped"], 1)  # Older than the stored client clock
+        self.assertEqual(self.sync((30, 4, False))["applied"], 1)
+        self.assertEqual(self.stored_position(), 30)
+
+    def test_sync_against_live_progress_keeps_the_furthest_position(self):
+        self.use_buffer("off")
+        self.post({"last_watched_position": 40})  # Live: no client clock
+        self.assertEqual(self.sync((20, 59, False))["skipped"], 1)
+        self.assertEqual(self.sync((60, 0, False))["applied"], 1)
+        self.assertEqual(self.stored_position(), 60)
+
+    def test_sync_discards_superseded_heartbeats(self):
+        self.use_buffer("local")
+        self.post({"last_watched_position": 30})
+        self.assertEqual(self.sync((20, 0, False))["skipped"], 1)  # The buffered position is further
+        self.assertEqual(self.sync((97, 0, True))["applied"], 1)
+        self.assertEqual(flush_progress_buffer(), 0)
+        progress = VideoProgress.objects.get(user=self.student, video=self.video)
+        self.assertEqual((progress.last_watched_position, progress.is_completed), (97, True))
+
+
+class CourseProgressTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username="admin", email="admin@example.com", user_type="admin")
+        self.student = User.objects.create(username="student", email="student@example.com", user_type="student")
+        today = datetime.date.today()
+        self.course = Course.objects.create(
+            title="Course", description="", start_date=today, end_date=today, created_by=self.admin
+        )
+        self.video = Video.objects.create(course=self.course, title="Video", video_file="videos/course_1/video.mp4", duration=100)
+        Enrollment.objects.create(user=self.student, course=self.course)
+
+    def stored(self):
+        progress = CourseProgress.objects.get(user=self.student, course=self.course)
+        return progress.completed_videos, progress.total_videos, progress.watch_seconds
+
+    def test_matches_a_rebuild_as_progress_changes(self):
+        draft = Video.objects.create(course=self.course, title="Draft", video_file="videos/course_1/draft.mp4", duration=100, is_published=False)
+        VideoProgress.objects.create(user=self.student, video=self.video, last_watched_position=100, is_completed=True)
+        VideoProgress.objects.create(user=self.student, video=draft, last_watched_position=100, is_completed=True)
+        # Only published videos count towards completion; every position counts towards watch time
+        self.assertEqual(self.stored(), (1, 1, 200))
+        self.assertEqual(CourseProgress.for_user(self.student.id, self.course.id).progress_percentage, 100)
+
+        draft.is_published = True
+        draft.save()
+        self.assertEqual(self.stored(), (2, 2, 200))
+        self.video.is_published = False
+        self.video.save()
+        self.assertEqual(self.stored(), (1, 1, 200))
+        draft.delete()
+        self.assertEqual(self.stored(), (0, 0, 100))
+
+        maintained = self.stored()
+        CourseProgress.rebuild(user_ids=[self.student.id], course_ids=[self.course.id])
+        self.assertEqual(self.stored(), maintained)
+
+    def test_concurrent_saves_do_not_double_count(self):
+        VideoProgress.objects.create(user=self.student, video=self.video, last_watched_position=10)
+        first, second = VideoProgress.objects.get(video=self.video), VideoProgress.objects.get(video=self.video)
+        first.last_watched_position = 20
+        first.save()
+        second.last_watched_position = 30  # Loaded before the first save
+        second.save()
+        self.assertEqual(self.stored()[2], 30)
+
+    def test_rebuild_of_pairs_skips_the_other_combinations(self):
+        other_student = User.objects.create(username="other", email="other@example.com", user_type="student")
+        other_course = Course.objects.create(
+            title="Other", description="", start_date=self.course.start_date, end_date=self.course.end_date, created_by=self.admin
+        )
+        Enrollment.objects.create(user=other_student, course=other_course)
+        CourseProgress.objects.all().delete()
+        self.assertEqual(CourseProgress.rebuild(pairs={(self.student.id, self.course.id), (other_student.id, other_course.id)}), 2)
+        self.assertEqual(
+            set(CourseProgress.objects.values_list('user_id', 'course_id')),
+            {(self.student.id, self.course.id), (other_student.id, other_course.id)},
+        )
+        Enrollment.objects.create(user=other_student, course=self.course)
+        CourseProgress.objects.all().delete()
+        self.assertEqual(CourseProgress.rebuild(pairs={(self.student.id, self.course.id)}), 1)  # Not other_student's enrollment in it
+        self.assertEqual(CourseProgress.rebuild(pairs=set()), 0)
+
+
+class EnrollmentMembershipTests(TestCase):
+    def setUp(self):
+        forget_cached_state()
+        self.admin = User.objects.create(username="admin", email="admin@example.com", user_type="admin")
+        self.student = User.objects.create(username="student", email="student@example.com", user_type="student")
+        today = datetime.date.today()
+        self.course = Course.objects.create(
+            title="Course", description="", start_date=today, end_date=today, created_by=self.admin
+        )
+        self.headers = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(self.student).access_token}"}
+
+    def test_is_enrolled_permission(self):
+        url = "/api/v1/courses/student/{}/progress/"
+        self.assertEqual(self.client.get(url.format(self.course.id), **self.headers).status_code, 403)
+        self.assertEqual(self.client.get(url.format(self.course.id + 1), **self.headers).status_code, 404)
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(user=self.student, course=self.course)
+        self.assertEqual(self.client.get(url.format(self.course.id), **self.headers).status_code, 200)
+
+    def test_requested_courses_missing_from_the_cache_are_rechecked(self):
+        self.assertEqual(enrolled_course_ids(self.student), frozenset())
+        # As if enrolled on another worker whose invalidation has not reached this one
+        Enrollment.objects.bulk_create([Enrollment(user=self.student, course=self.course)])
+        self.assertEqual(enrolled_course_ids(self.student), frozenset())
+        self.assertEqual(enrolled_course_ids(self.student, {self.course.id, self.course.id + 1}), {self.course.id})
+        self.assertEqual(enrolled_course_ids(self.student), {self.course.id})  # Refreshed by the recheck
+
+    def test_per_process_shared_tier_is_skipped(self):
+        # Another worker, whose local entries expire at once
+        worker = EnrollmentMembershipCache(local_ttl=-1, shared_alias="shared")
+        Enrollment.objects.bulk_create([Enrollment(user=self.student, course=self.course)])
+        self.assertTrue(worker.is_enrolled(self.student.id, self.course.id))
+        # Unenrolled on a worker whose version bump stays in its own LocMemCache
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {Enrollment._meta.db_table} WHERE user_id = %s", [self.student.id])
+        self.assertFalse(worker.is_enrolled(self.student.id, self.course.id))
+        self.assertIsNone(worker.shared)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username="admin", email="admin@example.com", user_type="admin")
+        today = datetime.date.today()
+        self.course = Course.objects.create(
+            title="Course", description="", start_date=today, end_date=today, created_by=self.admin
+        )
+        self.url = f"/api/v1/courses/public/{self.course.id}/"
+
+    def use_version_cache(self, backend, location):
+        settings_override = override_settings(CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "shared": {"BACKEND": backend, "LOCATION": location},
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_not_modified_until_the_course_changes(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        self.use_version_cache("django.core.cache.backends.filebased.FileBasedCache", cache_dir)  # Shared between processes
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.headers["ETag"]), (304, etag))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.title = "Renamed"
+            self.course.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title"], "Renamed")
+
+    def test_no_validators_without_a_shared_version_cache(self):
+        self.use_version_cache("django.core.cache.backends.locmem.LocMemCache", "shared")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response.headers)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH="*").status_code, 200)
+
+
+class StorageUploadTests(TestCase):
+    """Resumable and streamed uploads against the local multipart stand-in and a temporary media directory."""
+
+    def setUp(self):
+        forget_cached_state()
+        self.media_root = tempfile.mkdtemp()
+        self.parts_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.parts_root, ignore_errors=True)
+        settings_override = override_settings(
+            BACKGROUND_TASKS=True,  # Tasks run eagerly here, standing in for the workers
+            UPLOAD_SESSION_BACKEND="local",
+            UPLOAD_SESSION_LOCAL_ROOT=self.parts_root,
+            UPLOAD_PART_SIZE=5 * 1024 * 1024,
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage", "OPTIONS": {"location": self.media_root}},
+                "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+            },
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        core.multipart._backend = None
+        self.addCleanup(setattr, core.multipart, "_backend", None)
+
+        self.admin = User.objects.create(username="admin", email="admin@example.com", user_type="admin")
+        today = datetime.date.today()
+        self.course = Course.objects.create(
+            title="Course", description="", start_date=today, end_date=today, created_by=self.admin
+        )
+        self.headers = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(self.admin).access_token}"}
+        self.url = f"/api/v1/courses/{self.course.id}/uploads/"
+
+    def put_part(self, url, data):
+        response = self.client.put(url, data, content_type="application/octet-stream")
+        self.assertEqual(response.status_code, 200)
+
+    def test_interrupted_upload_resumes_and_creates_video_on_completion(self):
+        data = bytes(range(256)) * (44 * 1024) + b"tail"  # Three 5 MiB parts, the last one short
+        response = self.client.post(
+            self.url,
+            {"kind": "video", "filename": "lecture.mp4", "file_size": len(data), "title": "Lecture", "duration": 90},
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(response.status_code, 201)
+        upload, part_urls = response.json()["upload"], response.json()["part_urls"]
+        part_size = upload["part_size"]
+        self.assertEqual(upload["part_count"], 3)
+
+        # The second part is lost
+        self.put_part(part_urls["1"], data[:part_size])
+        self.put_part(part_urls["3"], data[2 * part_size:])
+        complete_url = f"{self.url}{upload['id']}/complete/"
+        self.assertEqual(self.client.post(complete_url, **self.headers).status_code, 400)
+        self.assertFalse(Video.objects.exists())
+
+        response = self.client.get(f"{self.url}{upload['id']}/", **self.headers)
+        self.assertEqual([part["part_number"] for part in response.json()["upload"]["uploaded_parts"]], [1, 3])
+        self.assertEqual(list(response.json()["part_urls"]), ["2"])
+        self.put_part(response.json()["part_urls"]["2"], data[part_size:2 * part_size])
+
+        response = self.client.post(complete_url, **self.headers)
+        self.assertEqual(response.status_code, 201)
+        video = Video.objects.get(pk=response.json()["video"]["id"])
+        self.assertEqual((video.title, video.duration, video.file_size), ("Lecture", 90, len(data)))
+        with video.video_file.open("rb") as stored:
+            self.assertEqual(stored.read(), data)
+        self.assertEqual(UploadSession.objects.get(pk=upload["id"]).video, video)
+        # A retried completion returns the same video
+        self.assertEqual(self.client.post(complete_url, **self.headers).json()["video"]["id"], video.id)
+
+    def test_form_upload_streams_into_storage(self):
+        data = bytes(range(256)) * (24 * 1024) + b"tail"  # Two parts
+        response = self.client.post(
+            f"/api/v1/courses/{self.course.id}/videos/",
+            {"title": "Lecture", "duration": 90, "video_file": SimpleUploadedFile("lecture.mp4", data)},
+            **self.headers,
+        )
+        self.assertEqual(response.status_code, 201)
+        video = Video.objects.get(pk=response.json()["video"]["id"])
+        self.assertEqual((video.video_file.name, video.file_size), (f"videos/course_{self.course.id}/lecture.mp4", len(data)))
+        with video.video_file.open("rb") as stored:
+            self.assertEqual(stored.read(), data)
+
+        # A rejected upload does not leave its file behind (deleted through the outbox after commit)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"/api/v1/courses/{self.course.id}/videos/",
+                {"title": "", "duration": 90, "video_file": SimpleUploadedFile("rejected.mp4", data)},
+                **self.headers,
+            )
+        self.assertEqual(response.status_code, 400)
+        # The client's duration stands until a probe reads one (never for AVI, or without the workers)
+        response = self.client.post(
+            f"/api/v1/courses/{self.course.id}/videos/",
+            {"title": "Lecture", "video_file": SimpleUploadedFile("lecture.avi", data)},
+            **self.headers,
+        )
+        self.assertEqual((response.status_code, list(response.json())), (400, ["duration"]))
+        drain_storage_deletions()  # The test transaction never commits, so the drain scheduled above does not rerun
+        self.assertEqual(os.listdir(os.path.join(self.media_root, f"videos/course_{self.course.id}")), ["lecture.mp4"])
+
+
+    def test_duplicate_uploads_share_one_stored_file(self):
+        data = b"%PDF-1.4 lecture notes" * 1000
+        resources_url = f"/api/v1/courses/{self.course.id}/resources/"
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post(resources_url, {"title": "Notes", "file": SimpleUploadedFile("notes.pdf", data)}, **self.headers)
+        with self.captureOnCommitCallbacks(execute=True):
+            second = self.client.post(resources_url, {"title": "Copy", "file": SimpleUploadedFile("copy.pdf", data)}, **self.headers)
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        first, second = Resource.objects.get(pk=first.json()["resource"]["id"]), Resource.objects.get(pk=second.json()["resource"]["id"])
+        self.assertEqual(second.file.name, first.file.name)
+        # The streamed copy was deleted once the second row committed
+        self.assertEqual(os.listdir(os.path.join(self.media_root, f"resources/course_{self.course.id}")), ["notes.pdf"])
+
+        # A resumable upload declaring the same digest completes without any parts
+        response = self.client.post(
+            self.url,
+            {"kind": "resource", "filename": "again.pdf", "file_size": len(data), "title": "Again",
+             "sha256": hashlib.sha256(data).hexdigest()},
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(response.status_code, 201)
+        third = Resource.objects.get(pk=response.json()["resource"]["id"])
+        self.assertEqual(third.file.name, first.file.name)
+        self.assertEqual(MediaBlob.objects.get(name=first.file.name).ref_count, 3)
+
+        # The file goes with its last reference
+        first.delete()
+        second.delete()
+        drain_storage_deletions()
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, third.file.name)))
+        third.delete()
+        drain_storage_deletions()
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, third.file.name)))
+        self.assertFalse(MediaBlob.objects.exists())
+
+
+    def test_saving_a_file_records_its_metadata(self):
+        data = b"%PDF-1.4 lecture notes" * 1000
+        resource = Resource.objects.create(course=self.course, title="Notes", file=SimpleUploadedFile("notes.pdf", data))
+        metadata = ("application/pdf", len(data), hashlib.sha256(data).hexdigest())
+        resource.refresh_from_db()
+        self.assertEqual((resource.content_type, resource.file_size, resource.checksum), metadata)
+        # Saving the row again does not read the stored file
+        resource.title = "Week one"
+        with mock.patch("core.media_metadata.compute_file_metadata") as compute:
+            resource.save()
+        compute.assert_not_called()
+        self.assertEqual((resource.content_type, resource.file_size, resource.checksum), metadata)
+
+        # Signed URLs carry the stored content type rather than one guessed from the name
+        Resource.objects.filter(pk=resource.pk).update(content_type="application/x-pdf-notes")
+        resource.refresh_from_db()
+        core.presigner._presigner = None
+        self.addCleanup(setattr, core.presigner, "_presigner", None)
+        with override_settings(S3_OFFLINE_PRESIGNER=True, S3_PRESIGNER_ENDPOINT="", AWS_ACCESS_KEY_ID="AKIDEXAMPLE", AWS_SECRET_ACCESS_KEY="secret"):
+            url = ResourceSerializer().signed_url_for(resource.file)
+        self.assertIn("response-content-type=application%2Fx-pdf-notes", url)
+
+        resource.file = None
+        resource.save()
+        self.assertEqual((resource.content_type, resource.file_size, resource.checksum), ("", None, ""))
+
+    def test_unexpected_derivative_failure_is_recorded(self):
+        with override_settings(VIDEO_PROCESSING_ON_UPLOAD=False):
+            video = Video.objects.create(course=self.course, title="Lecture", video_file=SimpleUploadedFile("lecture.mp4", b"\0" * 64), duration=60)
+        generator = mock.Mock()
+        generator.poster.side_effect = struct.error("unpack_from requires a buffer of at least 8 bytes")
+        with mock.patch("courses.video_derivatives.get_derivative_generator", return_value=generator), \
+                self.assertLogs("courses.video_derivatives", "ERROR"):
+            self.assertFalse(generate_video_derivatives(video.pk))
+        self.assertEqual(Video.objects.get(pk=video.pk).derivatives_status, Video.DERIVATIVES_FAILED)
+
+    def test_unexpected_packaging_failure_is_recorded(self):
+        ftyp = struct.pack('>I4s', 16, b'ftyp') + b'isom\0\0\2\0'
+        with override_settings(VIDEO_PROCESSING_ON_UPLOAD=False):
+            video = Video.objects.create(
+                course=self.course, title="Lecture", duration=60,
+                video_file=SimpleUploadedFile("lecture.mp4", ftyp + struct.pack('>I4s', 1, b'mdat') + b'\0\0'),  # Cut off in a box header
+            )
+        self.assertTrue(has_audio_track(video.video_file))  # Unreadable header: left to the transcoder
+        transcoder = mock.Mock()
+        transcoder.package.side_effect = KeyError("variant")
+        with mock.patch("courses.video_packaging.get_transcoder", return_value=transcoder), \
+                self.assertLogs("courses.video_packaging", "ERROR"):
+            self.assertFalse(package_video(video.pk))
+        self.assertEqual(Video.objects.get(pk=video.pk).packaging_status, Video.PACKAGING_FAILED)
+
+    def test_clone_shares_blobs_and_copies_the_rest_in_storage(self):
+        data = b"%PDF-1.4 lecture notes" * 1000
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/v1/courses/{self.course.id}/resources/", {"title": "Notes", "file": SimpleUploadedFile("notes.pdf", data)}, **self.headers)
+
+        def store(name):
+            os.makedirs(os.path.dirname(os.path.join(self.media_root, name)), exist_ok=True)
+            with open(os.path.join(self.media_root, name), "wb") as f:
+                f.write(name.encode())
+
+        store(f"videos/course_{self.course.id}/lecture.mp4")
+        with override_settings(VIDEO_PROCESSING_ON_UPLOAD=False):
+            video = Video.objects.create(
+                course=self.course, title="Lecture", video_file=f"videos/course_{self.course.id}/lecture.mp4",
+                derivatives_status=Video.DERIVATIVES_READY,
+            )
+        package = f"videos/course_{self.course.id}/hls/{video.id}/abcd1234/"
+        files = [video.video_file.name, f"videos/course_{self.course.id}/derived/{video.id}/poster.jpg", package + "master.m3u8", package + "360p/00000.ts"]
+        for name in files[1:]:
+            store(name)
+        video.poster, video.hls_manifest = files[1], files[2]
+        video.save()
+
+        start_date = self.course.start_date + datetime.timedelta(days=182)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/v1/courses/{self.course.id}/clones/", {"start_date": start_date}, content_type="application/json", **self.headers)
+        self.assertEqual(response.status_code, 202)
+        job = self.client.get(f"/api/v1/courses/{self.course.id}/clones/{response.json()['id']}/", **self.headers).json()
+        self.assertEqual((job["status"], job["progress"], job["total_files"], job["copied_files"]), ("completed", 100, 5, 5))
+
+        clone = Course.objects.get(pk=job["course"])
+        self.assertEqual((clone.title, clone.start_date, clone.end_date - clone.start_date), ("Course (copy)", start_date, datetime.timedelta(0)))
+        resource, video = clone.resources.get(), clone.videos.get()
+        self.assertEqual(resource.file.name, self.course.resources.get().file.name)  # Shared, not copied
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+        new_package = f"videos/course_{clone.id}/hls/{video.id}/abcd1234/"
+        self.assertEqual(
+            (video.video_file.name, video.poster.name, video.hls_manifest.name),
+            (f"videos/course_{clone.id}/lecture.mp4", f"videos/course_{clone.id}/derived/{video.id}/poster.jpg", new_package + "master.m3u8"),
+        )
+        with open(os.path.join(self.media_root, new_package, "360p/00000.ts"), "rb") as f:
+            self.assertEqual(f.read(), files[3].encode())
+
+    def test_clone_stays_hidden_until_copied_and_fails_cleanly(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/v1/courses/{self.course.id}/resources/", {"title": "Notes", "file": SimpleUploadedFile("notes.pdf", b"%PDF-1.4")}, **self.headers)
+        self.course.resources.update(file=f"resources/course_{self.course.id}/missing.pdf")  # Not a blob, so it is copied
+        seen_while_copying = []
+
+        def copy_files(storage, items):
+            clone = Course.objects.exclude(pk=self.course.pk).get()
+            catalog = self.client.get("/api/v1/courses/public/").json()
+            detail = self.client.get(f"/api/v1/courses/public/{clone.id}/")
+            seen_while_copying.append((clone.is_published, clone.id in [course["id"] for course in catalog], detail.status_code))
+            raise RuntimeError("worker lost its storage client")
+
+        with mock.patch("courses.course_clone.copy_files", copy_files), self.assertLogs("courses.course_clone", "ERROR"), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/v1/courses/{self.course.id}/clones/", {}, content_type="application/json", **self.headers)
+        self.assertEqual(seen_while_copying, [(False, False, 404)])
+        job = CourseCloneJob.objects.get(pk=response.json()["id"])
+        self.assertEqual((job.status, job.error, job.course), (CourseCloneJob.STATUS_FAILED, "worker lost its storage client", None))
+        self.assertEqual(list(Course.objects.values_list('pk', flat=True)), [self.course.pk])
+
+    def test_stalled_clone_is_reset_and_runs_again(self):
+        with override_settings(BACKGROUND_TASKS=False):
+            response = self.client.post(f"/api/v1/courses/{self.course.id}/clones/", {}, content_type="application/json", **self.headers)
+        job = CourseCloneJob.objects.get(pk=response.json()["id"])
+        # As if its worker died while copying
+        half_made = Course.objects.create(
+            title="Course (copy)", description="", start_date=self.course.start_date, end_date=self.course.end_date,
+            created_by=self.admin, is_published=False,
+        )
+        CourseCloneJob.objects.filter(pk=job.pk).update(
+            status=CourseCloneJob.STATUS_COPYING, course=half_made, updated_at=timezone.now() - datetime.timedelta(hours=2),
+        )
+        self.assertFalse(clone_course(job.pk))  # Not pending: left alone
+
+        out, err = StringIO(), StringIO()
+        with self.assertLogs("courses.course_clone", "WARNING"):
+            call_command("run_clone_jobs", stdout=out, stderr=err)
+        self.assertEqual(err.getvalue(), f"{job.pk}: stalled while copying, running it again\n")
+        self.assertEqual(out.getvalue().strip(), "CourseCloneJob: 1 completed, 0 failed")
+        job.refresh_from_db()
+        self.assertFalse(Course.objects.filter(pk=half_made.pk).exists())
+        self.assertEqual((job.status, job.course.is_published), (CourseCloneJob.STATUS_COMPLETED, True))
+        self.assertIn(job.course_id, [course["id"] for course in self.client.get("/api/v1/courses/public/").json()])
+
+    def test_resource_archive_streams_enrolled_students_a_zip(self):
+        contents = [b"%PDF-1.4 week one" * 500, b"%PDF-1.4 week two" * 500]
+        for data in contents:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f"/api/v1/courses/{self.course.id}/resources/", {"title": "Notes", "file": SimpleUploadedFile("notes.pdf", data)}, **self.headers)
+        first, second = Resource.objects.order_by('pk')
+        student = User.objects.create(username="student", email="student@example.com", user_type="student")
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(student).access_token}"}
+        url = f"/api/v1/courses/student/{self.course.id}/resources/archive/"
+        self.assertEqual(self.client.get(url, **headers).status_code, 403)
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(user=student, course=self.course)  # Retires the cached membership on commit
+
+        manifest = self.client.get(f"/api/v1/courses/student/{self.course.id}/resources/manifest/", **headers).json()
+        self.assertEqual([(f["id"], f["name"]) for f in manifest["files"]], [(first.id, "Notes.pdf"), (second.id, "Notes (2).pdf")])
+
+        response = self.client.get(url, **headers)
+        self.assertEqual((response.status_code, response["Content-Type"]), (200, "application/zip"))
+        with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), ["manifest.json", "Notes.pdf", "Notes (2).pdf"])
+            self.assertEqual([archive.read("Notes.pdf"), archive.read("Notes (2).pdf")], contents)
+        response.close()
+
+        # Resuming fetches only the missing file, under the same name
+        response = self.client.get(f"{url}?ids={second.id}", **headers)
+        with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), ["manifest.json", "Notes (2).pdf"])
+        response.close()
+        self.assertEqual([Resource.objects.get(pk=pk).total_download_count for pk in (first.id, second.id)], [1, 2])
+
+
+class DownloadCounterTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create(username="admin", email="admin@example.com", user_type="admin")
+        today = datetime.date.today()
+        course = Course.objects.create(title="Course", description="", start_date=today, end_date=today, created_by=admin)
+        self.notes, self.slides = (
+            Resource.objects.create(course=course, title=title, file=f"resources/course_{course.id}/{title}.pdf", download_count=5)
+            for title in ("notes", "slides")
+        )
+
+    def totals(self):
+        return dict(Resource.objects.with_download_totals().values_list('pk', 'download_count'))
+
+    @override_settings(DOWNLOAD_COUNTER_SLOTS=4)
+    def test_slots_count_until_folded_into_the_resource(self):
+        with mock.patch("courses.models.random.randrange", side_effect=[0, 1, 0, 2]):
+            for _ in range(3):
+                self.notes.increment_download_count()
+            ResourceDownloadCounter.increment_many([self.notes.pk, self.slides.pk, self.slides.pk, 0])  # A repeated id counts once, an unknown one not at all
+        self.assertEqual(
+            sorted(ResourceDownloadCounter.objects.values_list('resource_id', 'slot', 'count')),
+            sorted([(self.notes.pk, 0, 2), (self.notes.pk, 1, 1), (self.notes.pk, 2, 1), (self.slides.pk, 2, 1)]),
+        )
+        self.assertEqual([Resource.objects.get(pk=pk).total_download_count for pk in (self.notes.pk, self.slides.pk)], [9, 6])
+        self.assertEqual(
+            [resource.total_download_count for resource in Resource.objects.with_download_totals().order_by('pk')], [9, 6]
+        )
+
+        out = StringIO()
+        call_command("fold_download_counters", "--batch-size", "1", stdout=out)
+        self.assertEqual(out.getvalue().strip(), "Resource.download_count: 5 downloads folded")
+        self.assertFalse(ResourceDownloadCounter.objects.exists())
+        self.assertEqual(self.totals(), {self.notes.pk: 9, self.slides.pk: 6})
+        self.assertEqual(ResourceDownloadCounter.fold(), 0)
+
+
+class OrphanedMediaTests(TestCase):
+    """collect_orphaned_media against a temporary local root."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        admin = User.objects.create(username="admin", email="admin@example.com", user_type="admin")
+        today = datetime.date.today()
+        course = Course.objects.create(title="Course", description="", start_date=today, end_date=today, created_by=admin)
+        Video.objects.create(
+            course=course, title="Video", video_file="videos/course_1/kept.mp4", duration=60,
+            hls_manifest="videos/course_1/hls/1/abcd1234/master.m3u8",
+        )
+        Resource.objects.create(course=course, title="Slides", file="resources/course_1/slides.pdf")
+
+    def store(self, name, age=7 * 86400):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * 10)
+        os.utime(path, (time.time() - age, time.time() - age))
+
+    def collect(self, *args):
+        out = StringIO()
+        call_command("collect_orphaned_media", "--local-root", self.root, "--chunk-size", "2", *args, stdout=out)
+        return out.getvalue()
+
+    def test_deletes_only_old_unreferenced_files(self):
+        kept = [
+            "videos/course_1/kept.mp4",
+            "videos/course_1/hls/1/abcd1234/master.m3u8",
+            "videos/course_1/hls/1/abcd1234/720p/00000.ts",
+            "resources/course_1/slides.pdf",
+        ]
+        orphans = ["videos/course_1/gone.mp4", "videos/course_1/hls/1/old00000/720p/00000.ts", "thumbnails/course_1/gone.jpg"]
+        for name in kept + orphans:
+            self.store(name)
+        self.store("resources/course_1/uploading.pdf", age=60)  # Inside the grace period
+
+        self.assertIn("3 files (30 bytes) would be deleted", self.collect("--dry-run"))
+        self.assertTrue(all(os.path.exists(os.path.join(self.root, name)) for name in orphans))
+
+        self.assertIn("3 files (30 bytes) found, 3 deleted, 0 failed", self.collect())
+        self.assertFalse(any(os.path.exists(os.path.join(self.root, name)) for name in orphans))
+        self.assertTrue(all(os.path.exists(os.path.join(self.root, name)) for name in kept))
+        self.assertTrue(os.path.exists(os.path.join(self.root, "resources/course_1/uploading.pdf")))
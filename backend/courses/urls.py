@@ -2,8 +2,11 @@ from django.urls import path
 from .views import (
     CourseListCreateView, CourseDetailView, VideoListCreateView, ResourceListCreateView,
     AdminVideoProgressView,
-    VideoDetailView, ResourceDetailView, StudentVideoProgressView,
-    StudentCourseProgressView, StudentVideoHistoryView, StudentCourseDetailView, StudentVideoDetailView, StudentResourceDetailView,StudentCourseEnrollmentView,StudentEnrolledCoursesView, PublicCourseDetailView, PublicCourseListView
+    VideoDetailView, ResourceDetailView, StudentVideoProgressView, StudentProgressSyncView,
+    StudentCourseProgressView, StudentVideoHistoryView, StudentCourseDetailView, StudentVideoDetailView, StudentResourceDetailView,StudentCourseEnrollmentView,StudentEnrolledCoursesView, PublicCourseDetailView, PublicCourseListView,
+    UploadSessionCreateView, UploadSessionDetailView, UploadPartURLView, UploadSessionCompleteView,
+    CourseCloneView, CourseCloneJobView, StudentCourseResourcesManifestView, StudentCourseResourcesArchiveView,
+    VideoPlaylistView
 )
 
 urlpatterns = [
@@ -13,6 +16,16 @@ urlpatterns = [
     path('<int:course_id>/videos/', VideoListCreateView.as_view(), name='video-list-create'),
     path('<int:course_id>/resources/', ResourceListCreateView.as_view(), name='resource-list-create'),
 
+    # Resumable direct-to-storage uploads (videos and resources)
+    path('<int:course_id>/uploads/', UploadSessionCreateView.as_view(), name='upload-session-create'),
+    path('<int:course_id>/uploads/<uuid:upload_id>/', UploadSessionDetailView.as_view(), name='upload-session-detail'),
+    path('<int:course_id>/uploads/<uuid:upload_id>/parts/', UploadPartURLView.as_view(), name='upload-session-parts'),
+    path('<int:course_id>/uploads/<uuid:upload_id>/complete/', UploadSessionCompleteView.as_view(), name='upload-session-complete'),
+
+    # Course cloning (background job with progress)
+    path('<int:course_id>/clones/', CourseCloneView.as_view(), name='course-clone'),
+    path('<int:course_id>/clones/<uuid:job_id>/', CourseCloneJobView.as_view(), name='course-clone-job'),
+
     # Admin features
     path('admin/<int:course_id>/videos/<int:video_id>/progress/', AdminVideoProgressView.as_view(), name='admin-video-progress'),
     # path('admin/video/<int:video_id>/edit/', VideoEditView.as_view(), name='video-edit'),
@@ -29,9 +42,15 @@ urlpatterns = [
     path('student/enrolled/<int:course_id>/', StudentCourseDetailView.as_view(), name='student-course-detail'),
     path('student/<int:course_id>/videos/<int:video_id>/', StudentVideoDetailView.as_view(), name='student-video-detail'),
     path('student/<int:course_id>/resources/<int:resource_id>/', StudentResourceDetailView.as_view(), name='student-resource-detail'),
+    path('student/<int:course_id>/resources/manifest/', StudentCourseResourcesManifestView.as_view(), name='student-course-resources-manifest'),
+    path('student/<int:course_id>/resources/archive/', StudentCourseResourcesArchiveView.as_view(), name='student-course-resources-archive'),
+
+    #HLS playlists with presigned segments (token-granted; players send no auth header)
+    path('hls/<str:token>/<path:playlist>', VideoPlaylistView.as_view(), name='video-hls-playlist'),
 
     #Student Video Progress
     path('student/<int:course_id>/videos/<int:video_id>/progress/', StudentVideoProgressView.as_view(), name='student-track-video-progress'),
+    path('student/progress/sync/', StudentProgressSyncView.as_view(), name='student-progress-sync'),
     path('student/<int:course_id>/progress/', StudentCourseProgressView.as_view(), name='student-course-progress'),
     path('student/<int:course_id>/history/', StudentVideoHistoryView.as_view(), name='student-video-history'),
     # path('student/<int:course_id>/resource_download/<int:resource_id>/', ResourceDetailView.as_view(), name='resource-download'),
@@ -0,0 +1,129 @@
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from core.media_derivatives import DerivativeError, get_derivative_generator, resize_jpeg, sprite_layout
+from core.media_metadata import compute_file_metadata
+from core.s3_signed_url import generate_signed_url, normalize_key
+from core.storage_deletion import delete_later
+
+logger = logging.getLogger(__name__)
+
+
+def derivatives_prefix(video):
+    """Derived files live under the course's video prefix, so course media credentials cover them."""
+    return f"videos/course_{video.course_id}/derived/{video.pk}/"
+
+
+def is_generated(video, field_file):
+    return bool(field_file) and field_file.name.startswith(derivatives_prefix(video))
+
+
+def media_source(field_file):
+    """A local path or signed URL ffmpeg can seek in without downloading the whole file."""
+    try:
+        return field_file.storage.path(field_file.name)
+    except NotImplementedError:
+        return generate_signed_url(normalize_key(field_file.name), asset_class='video')
+
+
+def vtt_timestamp(seconds):
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:06.3f}"
+
+
+def sprite_vtt(sprite_name, duration, interval, count, columns, tile_width, tile_height):
+    """WebVTT cues mapping each interval to its tile (media fragment #xywh) in the sprite sheet."""
+    sprite_file = sprite_name.rsplit("/", 1)[-1]  # Relative to the .vtt, which sits next to it
+    duration = max(duration, 1)
+    cues = ["WEBVTT", ""]
+    for index in range(count):
+        start, end = index * interval, min((index + 1) * interval, duration)
+        x, y = (index % columns) * tile_width, (index // columns) * tile_height
+        cues += [
+            f"{vtt_timestamp(start)} --> {vtt_timestamp(end)}",
+            f"{sprite_file}#xywh={x},{y},{tile_width},{tile_height}",
+            "",
+        ]
+    return "\n".join(cues)
+
+
+def generate_video_derivatives(video_id):
+    """
+    Produce a poster frame, a thumbnail (unless one was uploaded by hand) and a
+    seek-preview sprite with its WebVTT index for a video, store them and
+    record them on the row. Returns True if the video got its derivatives.
+    """
+    from .models import Video
+
+    video = Video.objects.filter(pk=video_id).first()
+    if video is None or not video.video_file:
+        return False
+    source_name = video.video_file.name
+    Video.objects.filter(pk=video_id).update(derivatives_status=Video.DERIVATIVES_PROCESSING)
+
+    storage = video.video_file.storage
+    prefix = f"{derivatives_prefix(video)}{uuid.uuid4().hex[:8]}-"  # New names, so caches never see stale images
+    tile_width, tile_height = settings.VIDEO_SPRITE_TILE_SIZE
+    interval, count, columns = sprite_layout(
+        video.duration, settings.VIDEO_SPRITE_INTERVAL, settings.VIDEO_SPRITE_MAX_TILES, settings.VIDEO_SPRITE_COLUMNS
+    )
+    stored = []
+    try:
+        generator = get_derivative_generator()
+        source = media_source(video.video_file)
+        poster = generator.poster(source, min(video.duration * 0.1, 10) if video.duration else 0, settings.VIDEO_POSTER_MAX_WIDTH)
+        sprite = generator.sprite(source, interval, count, columns, tile_width, tile_height)
+        thumbnail = resize_jpeg(poster, settings.VIDEO_THUMBNAIL_WIDTH)
+
+        files = {}
+        for field_name, suffix, content in (
+            ('poster', 'poster.jpg', poster),
+            ('thumbnail', 'thumbnail.jpg', thumbnail),
+            ('preview_sprite', 'sprite.jpg', sprite),
+        ):
+            files[field_name] = storage.save(prefix + suffix, ContentFile(content))
+            stored.append(files[field_name])
+        vtt = sprite_vtt(files['preview_sprite'], video.duration, interval, count, columns, tile_width, tile_height)
+        files['preview_vtt'] = storage.save(prefix + 'sprite.vtt', ContentFile(vtt.encode('utf-8')))
+        stored.append(files['preview_vtt'])
+    except Exception as e:
+        if isinstance(e, (DerivativeError, OSError)):
+            logger.warning("Generating derivatives for video %s (%s) failed: %s", video_id, source_name, e)
+        else:
+            # e.g. a storage client error: still recorded, so the video does not stay in processing
+            logger.exception("Generating derivatives for video %s (%s) failed", video_id, source_name)
+        delete_later(*stored)
+        Video.objects.filter(pk=video_id, video_file=source_name).update(derivatives_status=Video.DERIVATIVES_FAILED)
+        return False
+
+    with transaction.atomic():
+        video = Video.objects.select_for_update().filter(pk=video_id).first()
+        if video is None or video.video_file.name != source_name:
+            # Deleted or replaced while we worked; the new file gets its own run
+            delete_later(*stored)
+            return False
+        replaced = [getattr(video, field) for field in ('poster', 'preview_sprite', 'preview_vtt')]
+        if not video.thumbnail or is_generated(video, video.thumbnail):
+            replaced.append(video.thumbnail)
+            video.thumbnail = files['thumbnail']
+            video.thumbnail_content_type, video.thumbnail_size, video.thumbnail_checksum = compute_file_metadata(
+                ContentFile(thumbnail), files['thumbnail']
+            )
+        else:
+            delete_later(files['thumbnail'])  # Keep the hand-picked one
+        video.poster = files['poster']
+        video.preview_sprite = files['preview_sprite']
+        video.preview_vtt = files['preview_vtt']
+        video.derivatives_status = Video.DERIVATIVES_READY
+        video.save(update_fields=[
+            'poster', 'thumbnail', 'thumbnail_content_type', 'thumbnail_size', 'thumbnail_checksum',
+            'preview_sprite', 'preview_vtt', 'derivatives_status',
+        ])
+        old_names = [field_file.name for field_file in replaced if is_generated(video, field_file)]
+        delete_later(*old_names)
+    return True
@@ -0,0 +1,167 @@
+import logging
+import os
+import posixpath
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.db import transaction
+from django.urls import reverse
+
+from core.media_packaging import MASTER_PLAYLIST, PackagingError, get_transcoder, ladder_for
+from core.media_probe import ProbeError, probe_file
+from core.s3_signed_url import sign_many, signing_window
+from core.storage_deletion import delete_later
+from .video_derivatives import media_source
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_SALT = "courses.hls"
+
+
+def packaging_prefix(video):
+    """HLS packages live under the course's video prefix, so course media credentials cover the segments."""
+    return f"videos/course_{video.course_id}/hls/{video.pk}/"
+
+
+def has_audio_track(field_file):
+    try:
+        return bool(probe_file(field_file.storage, field_file.name)['audio_codec'])
+    except (ProbeError, OSError, ValueError):
+        return True  # Let ffmpeg find out; a missing track fails the run rather than dropping sound
+    except Exception:
+        logger.exception("Probing %s for an audio track failed", field_file.name)
+        return True
+
+
+def upload_tree(storage, local_dir, prefix):
+    """Upload a packaged tree under `prefix`, in parallel (segments are many and small); returns the errors."""
+    names = []
+    for root, _, files in os.walk(local_dir):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            names.append((path, prefix + os.path.relpath(path, local_dir).replace(os.sep, "/")))
+
+    def upload(item):
+        path, name = item
+        with open(path, "rb") as f:
+            stored = storage.save(name, File(f))
+        if stored != name:
+            # Playlists refer to their segments by name, so a renamed file breaks playback
+            raise PackagingError(f"{name} was stored as {stored}")
+        return stored
+
+    with ThreadPoolExecutor(max_workers=settings.VIDEO_HLS_UPLOAD_WORKERS, thread_name_prefix="hls-upload") as executor:
+        futures = [executor.submit(upload, item) for item in names]
+    errors = []
+    for future in futures:
+        try:
+            future.result()
+        except Exception as e:  # e.g. a storage client error; every upload is waited for before giving up
+            errors.append(e)
+    return errors
+
+
+def package_video(video_id):
+    """
+    Transcode a video into the HLS ladder (VIDEO_HLS_LADDER, without upscaling
+    past the probed height), store the segments and playlists and record the
+    master playlist on the row. Returns True if the video got its package.
+    """
+    from .models import Video
+
+    video = Video.objects.filter(pk=video_id).first()
+    if video is None or not video.video_file:
+        return False
+    source_name = video.video_file.name
+    Video.objects.filter(pk=video_id).update(packaging_status=Video.PACKAGING_PROCESSING)
+
+    storage = video.video_file.storage
+    prefix = f"{packaging_prefix(video)}{uuid.uuid4().hex[:8]}/"  # New names, so caches never see a stale playlist
+    renditions = ladder_for(video.height, settings.VIDEO_HLS_LADDER)
+    work_dir = tempfile.mkdtemp(prefix="hls-")
+    try:
+        transcoder = get_transcoder(video.duration, video.width, video.height)
+        transcoder.package(
+            media_source(video.video_file), work_dir, renditions, settings.VIDEO_HLS_SEGMENT_SECONDS,
+            has_audio=has_audio_track(video.video_file),
+        )
+        errors = upload_tree(storage, work_dir, prefix)
+        if errors:
+            raise errors[0]
+    except Exception as e:
+        if isinstance(e, (PackagingError, OSError)):
+            logger.warning("Packaging video %s (%s) failed: %s", video_id, source_name, e)
+        else:
+            # e.g. a storage client error: still recorded, so the video does not stay in processing
+            logger.exception("Packaging video %s (%s) failed", video_id, source_name)
+        delete_later(prefixes=[prefix])  # Whatever made it to storage
+        Video.objects.filter(pk=video_id, video_file=source_name).update(packaging_status=Video.PACKAGING_FAILED)
+        return False
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    with transaction.atomic():
+        video = Video.objects.select_for_update().filter(pk=video_id).first()
+        if video is None or video.video_file.name != source_name:
+            # Deleted or replaced while we worked; the new file gets its own run
+            delete_later(prefixes=[prefix])
+            return False
+        old_manifest = video.hls_manifest.name if video.hls_manifest else None
+        video.hls_manifest = prefix + MASTER_PLAYLIST
+        video.hls_renditions = [rendition.name for rendition in renditions]
+        video.packaging_status = Video.PACKAGING_READY
+        video.save(update_fields=['hls_manifest', 'hls_renditions', 'packaging_status'])
+        if old_manifest:
+            delete_later(prefixes=[posixpath.dirname(old_manifest) + "/"])
+    return True
+
+
+def playlist_url(manifest_name, request=None):
+    """
+    URL of the playlist endpoint serving a package's master playlist with
+    presigned segment URLs, for when no course media credential covers them.
+    The token is aligned to the video signing window, so the URL stays the
+    same within it.
+    """
+    expiration, window = signing_window("video")
+    now = int(time.time())
+    signed_at = now - now % window if window else now
+    token = signing.Signer(salt=PLAYLIST_SALT).sign_object({
+        "d": posixpath.dirname(manifest_name),
+        "e": signed_at + expiration,
+    })
+    url = reverse("video-hls-playlist", kwargs={"token": token, "playlist": MASTER_PLAYLIST})
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def playlist_directory(token):
+    """The package directory a playlist token grants, or None if it is invalid or expired."""
+    try:
+        payload = signing.Signer(salt=PLAYLIST_SALT).unsign_object(token)
+    except signing.BadSignature:
+        return None
+    if payload.get("e", 0) < time.time():
+        return None
+    return payload.get("d")
+
+
+def signed_playlist(text, playlist_name):
+    """
+    Rewrite a playlist so its segments point at presigned URLs. Nested
+    playlists keep their relative names and so come back through the
+    playlist endpoint with the same token.
+    """
+    directory = posixpath.dirname(playlist_name)
+    lines = text.splitlines()
+    segments = {
+        line: posixpath.normpath(posixpath.join(directory, line))
+        for line in lines if line and not line.startswith("#") and not line.endswith(".m3u8")
+    }
+    urls = sign_many(set(segments.values()), asset_class="video")
+    return "\n".join(urls[segments[line]] if line in segments else line for line in lines) + "\n"
@@ -0,0 +1,46 @@
+import logging
+
+from django.utils.timezone import now
+
+from core.media_probe import ProbeError, probe_file
+from core.versioning import bump_versions
+
+logger = logging.getLogger(__name__)
+
+
+def probe_video(video_id):
+    """
+    Read duration, resolution and codec from a video's container header and
+    store them; the probed duration replaces the one the client sent. Returns
+    the probe result, or None if the video is gone or cannot be probed.
+    """
+    from .models import Video
+
+    video = Video.objects.filter(pk=video_id).only('id', 'course_id', 'video_file').first()
+    if video is None or not video.video_file:
+        return None
+    name = video.video_file.name
+    try:
+        info = probe_file(video.video_file.storage, name)
+    except (ProbeError, OSError, ValueError) as e:
+        logger.warning("Probing video %s (%s) failed: %s", video_id, name, e)
+        return None
+    except Exception:
+        # e.g. a storage client error: one bad file must not stop the backfill or the processing chain
+        logger.exception("Probing video %s (%s) failed", video_id, name)
+        return None
+
+    changes = {
+        'width': info['width'],
+        'height': info['height'],
+        'codec': info['codec'] or '',
+        'probed_at': now(),
+    }
+    if info['duration']:
+        changes['duration'] = max(round(info['duration']), 1)
+    # Only if the file was not replaced while it was being probed; update() skips
+    # the save signals, so bump the course versions here
+    if Video.objects.filter(pk=video_id, video_file=name).update(**changes):
+        bump_versions(("catalog",), ("course", video.course_id))
+    return info
+
@@ -2,27 +2,59 @@ from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Course, Video, Resource, VideoProgress, Enrollment
-from .serializers import CourseSerializer, VideoSerializer, ResourceSerializer,VideoProgressSerializer,EnrollmentSerializer,CourseProgressSerializer,VideoHistorySerializer, StudentCourseSerializer,generate_signed_url
+from .models import Course, Video, Resource, ResourceDownloadCounter, VideoProgress, Enrollment, CourseProgress, UploadSession, CourseCloneJob
+from .serializers import CourseSerializer, CatalogCourseSerializer, VideoSerializer, ResourceSerializer,VideoProgressSerializer,ProgressSyncSerializer,EnrollmentSerializer,CourseProgressSerializer,VideoHistorySerializer, StudentCourseSerializer,UploadSessionSerializer,UploadPartURLSerializer,CourseCloneJobSerializer,generate_signed_url
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from core.permissions import IsAdminOrStaff,IsRegularUser
+from django.db import transaction
+from django.db.models import Prefetch
+from core.permissions import IsAdminOrStaff,IsRegularUser,IsEnrolled
 from rest_framework.permissions import IsAuthenticated
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework.permissions import AllowAny
 from notifications.models import Notification
+from .pagination import CatalogCursorPagination
+from .membership import is_enrolled
+from .progress_buffer import get_progress_buffer, record_heartbeat, discard_heartbeat, apply_pending_positions, pending_position
+from core.media_access import uses_course_credentials, issue_course_credential, course_media_prefixes, credential_payload, set_credential_cookies
+from core.versioning import conditional_get
+from core.upload_handlers import streamed_uploads
+from core.media_packaging import RENDITION_PLAYLIST, MASTER_PLAYLIST
+from .video_packaging import playlist_directory, signed_playlist
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.text import slugify
+from .resource_archive import archive_manifest, archive_names, stream_resource_archive
+from django.core.files.storage import default_storage
+import posixpath
+
+def catalog_response(request, view, courses=None):
+    """
+    Cursor-paginated course summaries with video/resource counts and total duration.
+    """
+    paginator = CatalogCursorPagination()
+    courses = Course.objects.all() if courses is None else courses
+    page = paginator.paginate_queryset(courses.with_catalog_stats(), request, view=view)
+    serializer = CatalogCourseSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
 
 class CourseListCreateView(APIView):
     permission_classes = [IsAuthenticated, IsAdminOrStaff]
     parser_classes = [MultiPartParser, FormParser]
 
     @swagger_auto_schema(
-        operation_description="Retrieve all courses",
+        operation_description="Retrieve all courses. Pass ?view=catalog for paginated course summaries.",
+        manual_parameters=[
+            openapi.Parameter('view', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['catalog'], required=False),
+        ],
         responses={200: CourseSerializer(many=True)}
     )
 
     def get(self, request):
-        courses = Course.objects.all()
+        if request.query_params.get('view') == 'catalog':
+            return catalog_response(request, self)
+        courses = Course.objects.prefetch_related('videos', Prefetch('resources', queryset=Resource.objects.with_download_totals()))
         serializer = CourseSerializer(courses, many=True)
         return Response(serializer.data)
     
@@ -66,17 +98,19 @@ class CourseDetailView(APIView):
     )
     def put(self, request, pk):
         course = get_object_or_404(Course, pk=pk)
-                # Convert request data to mutable before updating
-        data = request.data.copy()
-
-        # Ensure the image is handled properly
-        if "image" not in request.data or request.data.get("image") == "null":
-            data.pop("image", None)  # Remove image field if not updating
-        serializer = CourseSerializer(course, data=data, partial=True)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
-        print("DEBUG: Errors ->", serializer.errors) 
+        #A new image streams into storage while the request body is parsed
+        with streamed_uploads(request, course, ['image']) as uploads:
+            # Convert request data to mutable before updating
+            data = request.data.copy()
+
+            # Ensure the image is handled properly
+            if "image" not in request.data or request.data.get("image") == "null":
+                data.pop("image", None)  # Remove image field if not updating
+            serializer = CourseSerializer(course, data=data, partial=True)
+            if serializer.is_valid():
+                serializer.save()
+                return Response(serializer.data)
+            uploads.discard()
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     @swagger_auto_schema(
@@ -104,25 +138,28 @@ class VideoListCreateView(APIView):
         # Ensure the course exists
         course = get_object_or_404(Course, id=course_id)
 
-        # Attach the course ID to the data
-        request.data['course'] = course.id
+        #The video file streams into storage while the request body is parsed
+        with streamed_uploads(request, Video(course=course), ['video_file']) as uploads:
+            # Attach the course ID to the data
+            request.data['course'] = course.id
 
-        serializer = VideoSerializer(data=request.data)
-        if serializer.is_valid():
-            video = serializer.save(course=course)  # Explicitly set the course
-
-            #Notify enrolled students
-            Notification.notify_enrolled_students(
-                course, f"A new video '{video.title}' has been uploaded in '{course.title}'."
-            )
-            return Response(
-                {
-                    "message": "Video successfully created.",
-                    "video": serializer.data,
-                },
-                status=status.HTTP_201_CREATED,
-            )
+            serializer = VideoSerializer(data=request.data)
+            if serializer.is_valid():
+                video = serializer.save(course=course)  # Explicitly set the course
 
+                #Notify enrolled students
+                Notification.notify_enrolled_students(
+                    course, f"A new video '{video.title}' has been uploaded in '{course.title}'."
+                )
+                return Response(
+                    {
+                        "message": "Video successfully created.",
+                        "video": serializer.data,
+                    },
+                    status=status.HTTP_201_CREATED,
+                )
+
+            uploads.discard()
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -141,28 +178,179 @@ class ResourceListCreateView(APIView):
         # Ensure the course exists
         course = get_object_or_404(Course, id=course_id)
 
-        # Attach the course ID to the data
-        request.data['course'] = course.id
+        #The file streams into storage while the request body is parsed
+        with streamed_uploads(request, Resource(course=course), ['file']) as uploads:
+            # Attach the course ID to the data
+            request.data['course'] = course.id
 
-        serializer = ResourceSerializer(data=request.data)
-        if serializer.is_valid():
-            resource = serializer.save(course=course)  # Explicitly set the course
-
-            #Notify enrolled students
-            Notification.notify_enrolled_students(
-                course, f"A new resource has been uploaded for '{course.title}'."
-            )
-            return Response(
-                {
-                    "message": "Resource successfully created.",
-                    "resource": serializer.data,
-                },
-                status=status.HTTP_201_CREATED,
-            )
+            serializer = ResourceSerializer(data=request.data)
+            if serializer.is_valid():
+                resource = serializer.save(course=course)  # Explicitly set the course
 
+                #Notify enrolled students
+                Notification.notify_enrolled_students(
+                    course, f"A new resource has been uploaded for '{course.title}'."
+                )
+                return Response(
+                    {
+                        "message": "Resource successfully created.",
+                        "resource": serializer.data,
+                    },
+                    status=status.HTTP_201_CREATED,
+                )
+
+            uploads.discard()
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     
+def upload_session_response(request, session, part_numbers=None, status_code=status.HTTP_200_OK, **extra):
+    #Part URLs default to the next batch of parts storage does not have yet
+    part_urls = {}
+    if session.status == UploadSession.STATUS_ACTIVE:
+        if part_numbers is None:
+            part_numbers = session.missing_parts()[:settings.UPLOAD_PART_URL_BATCH]
+        part_urls = session.part_urls(part_numbers, request=request)
+    return Response({**extra, "upload": UploadSessionSerializer(session).data, "part_urls": part_urls}, status=status_code)
+
+
+def completed_upload_response(session, status_code):
+    if session.kind == UploadSession.KIND_VIDEO:
+        return Response({"message": "Video successfully created.", "video": VideoSerializer(session.video).data}, status=status_code)
+    return Response({"message": "Resource successfully created.", "resource": ResourceSerializer(session.resource).data}, status=status_code)
+
+
+def notify_completed_upload(session):
+    course = session.course
+    if session.kind == UploadSession.KIND_VIDEO:
+        message = f"A new video '{session.video.title}' has been uploaded in '{course.title}'."
+    else:
+        message = f"A new resource has been uploaded for '{course.title}'."
+    Notification.notify_enrolled_students(course, message)
+
+
+class UploadSessionCreateView(APIView):
+    """
+    Starts a resumable direct-to-storage upload of a video or resource. The
+    client PUTs each part to its URL, can GET the session to see which parts
+    storage has (and get fresh URLs for the rest), and finally POSTs to
+    complete/, which creates the Video or Resource. A client that sends the
+    file's sha256 skips all of that when the same bytes are stored already:
+    the row is created at once and answered like a completion.
+    """
+    permission_classes = [IsAuthenticated, IsAdminOrStaff]
+
+    @swagger_auto_schema(
+        operation_description="Start a resumable multipart upload for a video or resource",
+        request_body=UploadSessionSerializer,
+        responses={201: "Upload session with the first batch of part URLs"}
+    )
+    def post(self, request, course_id):
+        course = get_object_or_404(Course, id=course_id)
+        serializer = UploadSessionSerializer(data=request.data, context={"course": course, "user": request.user})
+        if serializer.is_valid():
+            session = serializer.save()
+            if session.status == UploadSession.STATUS_COMPLETED:
+                #The declared contents are stored already, so there is nothing to upload
+                notify_completed_upload(session)
+                return completed_upload_response(session, status.HTTP_201_CREATED)
+            return upload_session_response(request, session, status_code=status.HTTP_201_CREATED, message="Upload started.")
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class UploadSessionDetailView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminOrStaff]
+
+    @swagger_auto_schema(operation_description="Show the parts storage has received so an interrupted upload can resume")
+    def get(self, request, course_id, upload_id):
+        session = get_object_or_404(UploadSession, pk=upload_id, course_id=course_id)
+        if session.status == UploadSession.STATUS_ACTIVE:
+            session.refresh_parts()
+        return upload_session_response(request, session)
+
+    @swagger_auto_schema(operation_description="Abort an upload and discard its parts")
+    def delete(self, request, course_id, upload_id):
+        session = get_object_or_404(UploadSession, pk=upload_id, course_id=course_id)
+        if session.status == UploadSession.STATUS_COMPLETED:
+            return Response({"message": "This upload is already completed."}, status=status.HTTP_400_BAD_REQUEST)
+        if session.status == UploadSession.STATUS_ACTIVE:
+            session.abort()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadPartURLView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminOrStaff]
+
+    @swagger_auto_schema(
+        operation_description="Issue upload URLs for specific parts (e.g. to retry or after earlier URLs expired)",
+        request_body=UploadPartURLSerializer,
+    )
+    def post(self, request, course_id, upload_id):
+        session = get_object_or_404(UploadSession, pk=upload_id, course_id=course_id, status=UploadSession.STATUS_ACTIVE)
+        serializer = UploadPartURLSerializer(data=request.data, context={"session": session})
+        if serializer.is_valid():
+            return upload_session_response(request, session, part_numbers=serializer.validated_data['part_numbers'])
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class UploadSessionCompleteView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminOrStaff]
+
+    @swagger_auto_schema(
+        operation_description="Assemble the uploaded parts and create the video or resource",
+        responses={201: "Created video or resource", 400: "Parts missing"}
+    )
+    def post(self, request, course_id, upload_id):
+        with transaction.atomic():
+            session = get_object_or_404(UploadSession.objects.select_for_update(), pk=upload_id, course_id=course_id)
+            if session.status == UploadSession.STATUS_COMPLETED:
+                #A retried completion returns the row the first one created
+                return completed_upload_response(session, status.HTTP_200_OK)
+            if session.status == UploadSession.STATUS_ABORTED:
+                return Response({"message": "This upload was aborted."}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                session.complete()
+            except ValueError as e:
+                return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        notify_completed_upload(session)
+        return completed_upload_response(session, status.HTTP_201_CREATED)
+
+
+
+class CourseCloneView(APIView):
+    """
+    Clones a course with its videos and resources for a new term, as a
+    background job: the response returns at once with the job, which the
+    client polls for progress. Files are shared or copied inside storage
+    (see courses.course_clone), never passing through this server.
+    """
+    permission_classes = [IsAuthenticated, IsAdminOrStaff]
+
+    @swagger_auto_schema(
+        operation_description="Start cloning a course (optionally shifting its dates)",
+        request_body=CourseCloneJobSerializer,
+        responses={202: CourseCloneJobSerializer()}
+    )
+    def post(self, request, course_id):
+        course = get_object_or_404(Course, id=course_id)
+        serializer = CourseCloneJobSerializer(data=request.data, context={"course": course, "user": request.user})
+        if serializer.is_valid():
+            job = serializer.save()
+            return Response(CourseCloneJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class CourseCloneJobView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminOrStaff]
+
+    @swagger_auto_schema(
+        operation_description="Show the progress of a course clone",
+        responses={200: CourseCloneJobSerializer()}
+    )
+    def get(self, request, course_id, job_id):
+        job = get_object_or_404(CourseCloneJob, pk=job_id, source_id=course_id)
+        return Response(CourseCloneJobSerializer(job).data)
+
 class VideoDetailView(APIView):
     
     #Allows students and admins to view video details.
@@ -179,7 +367,7 @@ class VideoDetailView(APIView):
 
         # Check if the user is allowed to view the video
         if not (request.user.is_staff or request.user.user_type == "admin"):
-            enrolled = Enrollment.objects.filter(user=request.user, course=course).exists()
+            enrolled = is_enrolled(request.user, course.id)
             if not enrolled:
                 return Response({"message": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
 
@@ -227,7 +415,7 @@ class ResourceDetailView(APIView):
 
         #Allow access if user is admin or enrolled
         if not (request.user.is_staff or request.user.user_type == "admin"):
-            enrolled = Enrollment.objects.filter(user=request.user, course=course).exists()
+            enrolled = is_enrolled(request.user, course.id)
             if not enrolled:
                 return Response(
                     {"message": "You are not enrolled in this course."},
@@ -267,7 +455,7 @@ class StudentVideoProgressView(APIView):
     """
     Allows students to track their own progress in a video.
     """
-    permission_classes = [IsRegularUser]
+    permission_classes = [IsRegularUser, IsEnrolled]
 
     @swagger_auto_schema(
         operation_description="Track student progress on a video",
@@ -279,13 +467,21 @@ class StudentVideoProgressView(APIView):
         course = get_object_or_404(Course, id=course_id)
         video = get_object_or_404(Video, id=video_id, course=course)
 
-        # Check if the student is enrolled in the course
-        if not Enrollment.objects.filter(user=request.user, course=course).exists():
-            return Response({"message": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
-
         # Save progress
         serializer = VideoProgressSerializer(data=request.data, context={'user': request.user, 'video': video})
         if serializer.is_valid():
+            position = serializer.validated_data.get('last_watched_position', 0)
+            if get_progress_buffer() is not None and not video.is_watched_through(position):
+                #Plain heartbeat: keep only the latest position, the flusher writes it in bulk
+                record_heartbeat(request.user.id, video.id, position)
+                return Response({"message": "Progress saved.", "progress": {
+                    "video": video.id,
+                    "course_id": course.id,
+                    "last_watched_position": position,
+                }}, status=status.HTTP_202_ACCEPTED)
+
+            #Completions are written immediately and supersede any buffered position
+            discard_heartbeat(request.user.id, video.id)
             progress_instance = serializer.save(user=request.user, video=video)
 
             # Attach course_id and course_title dynamically for dashboard updates
@@ -296,6 +492,24 @@ class StudentVideoProgressView(APIView):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+
+class StudentProgressSyncView(APIView):
+    """
+    Lets offline or flaky-network clients replay their queued progress events in one request.
+    """
+    permission_classes = [IsAuthenticated, IsRegularUser]
+
+    @swagger_auto_schema(
+        operation_description="Apply a batch of queued progress events. The newest event per video (by client_timestamp) wins.",
+        request_body=ProgressSyncSerializer,
+        responses={200: openapi.Response("Counts of applied and superseded events, and the rejected events with reasons")}
+    )
+    def post(self, request):
+        serializer = ProgressSyncSerializer(data=request.data, context={'user': request.user})
+        if serializer.is_valid():
+            return Response(serializer.save(), status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
     
 class AdminVideoProgressView(APIView):
     
@@ -312,41 +526,35 @@ class AdminVideoProgressView(APIView):
         video = get_object_or_404(Video, id=video_id, course=course)
 
         # Query all progress records for the video
-        progress_records = VideoProgress.objects.filter(video=video)
+        progress_records = apply_pending_positions(VideoProgress.objects.filter(video=video))
         serializer = VideoProgressSerializer(progress_records, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 class StudentCourseProgressView(APIView):
     # Returns the student's overall progress in a course.
-    permission_classes = [IsAuthenticated, IsRegularUser]
+    permission_classes = [IsAuthenticated, IsRegularUser, IsEnrolled]
     @swagger_auto_schema(
-        operation_description="Retrieve a student's progress in a course.",
+        operation_description="Retrieve a student's progress in a course. Only published videos count towards it.",
         responses={200: CourseProgressSerializer()}
     )
 
     def get(self, request, course_id):
         course = get_object_or_404(Course, id=course_id)
 
-        # Check if the student is enrolled in the course.
-        if not Enrollment.objects.filter(user=request.user, course=course).exists():
-            return Response({"message": "You are not enrolled in this course."}, status=403)
-
-        total_videos = course.videos.count()
-        completed_videos = VideoProgress.objects.filter(video__course=course, user=request.user, is_completed=True).count()
-        progress_percentage = (completed_videos / total_videos) * 100 if total_videos > 0 else 0
+        progress = CourseProgress.for_user(request.user.id, course.id)
 
         data = {
             "course_title": course.title,
-            "total_videos": total_videos,
-            "completed_videos": completed_videos,
-            "progress_percentage": progress_percentage,
+            "total_videos": progress.total_videos,
+            "completed_videos": progress.completed_videos,
+            "progress_percentage": progress.progress_percentage,
         }
         serializer = CourseProgressSerializer(data)
         return Response(serializer.data, status=200)
 
 class StudentVideoHistoryView(APIView):
     # Lists a student's watched videos in a course.
-    permission_classes = [IsAuthenticated, IsRegularUser]
+    permission_classes = [IsAuthenticated, IsRegularUser, IsEnrolled]
     @swagger_auto_schema(
         operation_description="Retrieve a list of watched videos in a course.",
         responses={200: VideoHistorySerializer(many=True)}
@@ -355,11 +563,7 @@ class StudentVideoHistoryView(APIView):
     def get(self, request, course_id):
         course = get_object_or_404(Course, id=course_id)
 
-        # Check if the student is enrolled in the course.
-        if not Enrollment.objects.filter(user=request.user, course=course).exists():
-            return Response({"message": "You are not enrolled in this course."}, status=403)
-
-        progress_records = VideoProgress.objects.filter(video__course=course, user=request.user)
+        progress_records = apply_pending_positions(VideoProgress.objects.filter(video__course=course, user=request.user))
         serializer = VideoHistorySerializer(progress_records, many=True)
         return Response(serializer.data, status=200)
     
@@ -369,26 +573,37 @@ class StudentCourseDetailView(APIView):
     Allows students to view course details (videos & resources).
     Videos and resources are locked unless they are enrolled.
     """
-    permission_classes = [IsAuthenticated, IsRegularUser]
+    permission_classes = [IsAuthenticated, IsRegularUser, IsEnrolled]
 
     @swagger_auto_schema(
         operation_description="Retrieve course details. Videos & resources are locked if not enrolled.",
         responses={200: StudentCourseSerializer()}
     )
+    @conditional_get(lambda request, course_id: [("course", course_id), ("enrollments", request.user.pk)], per_user=True)
     def get(self, request, course_id):
         course = get_object_or_404(Course, id=course_id)
-        is_enrolled = Enrollment.objects.filter(user=request.user, course=course).exists()
-        if not is_enrolled:
-            return Response({"message": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
-
-        serializer = StudentCourseSerializer(course, context={'is_enrolled': is_enrolled})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        is_enrolled = True  # Checked by IsEnrolled
+
+        if not uses_course_credentials():
+            serializer = StudentCourseSerializer(course, context={'is_enrolled': is_enrolled})
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        #One credential covers the course's media, so URLs are plain and unsigned
+        credential = issue_course_credential(request.user, course.id, request)
+        serializer = StudentCourseSerializer(course, context={
+            'is_enrolled': is_enrolled,
+            'request': request,
+            'plain_media_prefixes': course_media_prefixes(course.id),
+        })
+        course_data = serializer.data
+        course_data["media_access"] = credential_payload(credential)
+        return set_credential_cookies(Response(course_data, status=status.HTTP_200_OK), credential)
     
 class StudentVideoDetailView(APIView):
     """
     Allows students to access video details if enrolled.
     """
-    permission_classes = [IsAuthenticated, IsRegularUser]
+    permission_classes = [IsAuthenticated, IsRegularUser, IsEnrolled]
 
     @swagger_auto_schema(
         operation_description="Retrieve video details if the student is enrolled.",
@@ -398,26 +613,57 @@ class StudentVideoDetailView(APIView):
         course = get_object_or_404(Course, id=course_id)
         video = get_object_or_404(Video, id=video_id, course=course)
 
-        # Check if the student is enrolled
-        if not Enrollment.objects.filter(user=request.user, course=course).exists():
-            return Response({"message": "You are not enrolled in this course."}, status=status.HTTP_403_FORBIDDEN)
-        
         # Fetch the last watched position
         progress = VideoProgress.objects.filter(user=request.user, video=video).first()
-        last_watched_position = progress.last_watched_position if progress else 0  # Default to 0 if no progress found
+        pending = pending_position(request.user.id, video.id)  # A heartbeat not flushed yet is newer
+        last_watched_position = pending if pending is not None else (progress.last_watched_position if progress else 0)  # Default to 0 if no progress found
 
-        serializer = VideoSerializer(video)
+        if not uses_course_credentials():
+            serializer = VideoSerializer(video)
+            video_data = serializer.data
+            video_data["last_watched_position"] = last_watched_position  #Add this field to the response
+            return Response(video_data, status=status.HTTP_200_OK)
+
+        credential = issue_course_credential(request.user, course.id, request)
+        serializer = VideoSerializer(video, context={'request': request, 'plain_media_prefixes': course_media_prefixes(course.id)})
         video_data = serializer.data
         video_data["last_watched_position"] = last_watched_position  #Add this field to the response
+        video_data["media_access"] = credential_payload(credential)
+        return set_credential_cookies(Response(video_data, status=status.HTTP_200_OK), credential)
+
+class VideoPlaylistView(APIView):
+    """
+    Serves the playlists of a video's HLS package with presigned segment URLs,
+    for deployments without course media credentials. The token in the path
+    (see courses.video_packaging.playlist_url) is the grant, as players fetch
+    playlists without the API's Authorization header.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    @swagger_auto_schema(auto_schema=None)
+    def get(self, request, token, playlist):
+        directory = playlist_directory(token)
+        if directory is None:
+            return Response({"message": "This playlist link is invalid or has expired."}, status=status.HTTP_403_FORBIDDEN)
+        playlist = posixpath.normpath(playlist)
+        if playlist != MASTER_PLAYLIST and not playlist.endswith("/" + RENDITION_PLAYLIST) or playlist.startswith(("/", "..")):
+            raise Http404
+        name = f"{directory}/{playlist}"
+        if not default_storage.exists(name):
+            raise Http404  # Replaced by a newer package; the video detail has the new link
+        with default_storage.open(name, "rb") as f:
+            text = f.read().decode("utf-8")
+        response = HttpResponse(signed_playlist(text, name), content_type="application/vnd.apple.mpegurl")
+        response["Cache-Control"] = "private, max-age=300"
+        return response
 
-        print(f"Returning video details with last watched position: {last_watched_position}")  # Debugging
-        return Response(video_data, status=status.HTTP_200_OK)
 
 class StudentResourceDetailView(APIView):
     """
     Allows students to access course resources if enrolled.
     """
-    permission_classes = [IsAuthenticated, IsRegularUser]
+    permission_classes = [IsAuthenticated, IsRegularUser, IsEnrolled]
 
     @swagger_auto_schema(
         operation_description="Retrieve resource details if enrolled.",
@@ -427,15 +673,56 @@ class StudentResourceDetailView(APIView):
         course = get_object_or_404(Course, id=course_id)
         resource = get_object_or_404(Resource, id=resource_id, course=course)
 
-        # Check if student is enrolled
-        if not Enrollment.objects.filter(user=request.user, course=course).exists():
-            return Response(
-                {"message": "You are not enrolled in this course."},
-                status=status.HTTP_403_FORBIDDEN
-            )
-
         serializer = ResourceSerializer(resource)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class StudentCourseResourcesManifestView(APIView):
+    """
+    Lists the files of the course's resource archive with their names in it,
+    sizes and checksums, so a client can verify what it received and resume.
+    """
+    permission_classes = [IsAuthenticated, IsRegularUser, IsEnrolled]
+
+    @swagger_auto_schema(operation_description="List the files of the course's resource archive.")
+    def get(self, request, course_id):
+        course = get_object_or_404(Course, id=course_id)
+        resources = list(course.resources.order_by('uploaded_at', 'pk'))
+        return Response(archive_manifest(course, resources, archive_names(resources), request))
+
+
+class StudentCourseResourcesArchiveView(APIView):
+    """
+    Streams every resource of the course as one ZIP, written on the fly from
+    storage. ?ids=1,2 limits it to some files, e.g. the ones an interrupted
+    download did not get. Each file sent completely counts as one download,
+    all of them in one bulk write when the response ends.
+    """
+    permission_classes = [IsAuthenticated, IsRegularUser, IsEnrolled]
+
+    @swagger_auto_schema(
+        operation_description="Download the course's resources as a ZIP archive.",
+        manual_parameters=[openapi.Parameter('ids', openapi.IN_QUERY, description="Comma-separated resource ids to include", type=openapi.TYPE_STRING)],
+        responses={200: "application/zip"}
+    )
+    def get(self, request, course_id):
+        course = get_object_or_404(Course, id=course_id)
+        resources = list(course.resources.order_by('uploaded_at', 'pk'))
+        names = archive_names(resources)  # From the whole course, so a file has the same name in every archive
+        if request.query_params.get('ids'):
+            try:
+                ids = {int(value) for value in request.query_params['ids'].split(',') if value.strip()}
+            except ValueError:
+                return Response({"message": "ids must be comma-separated resource ids."}, status=status.HTTP_400_BAD_REQUEST)
+            resources = [resource for resource in resources if resource.pk in ids]
+
+        response = StreamingHttpResponse(
+            stream_resource_archive(course, resources, names, ResourceDownloadCounter.increment_many),
+            content_type="application/zip",
+        )
+        response["Content-Disposition"] = f'attachment; filename="{slugify(course.title) or "course"}-resources.zip"'
+        response["Cache-Control"] = "private, no-store"
+        return response
     
 class StudentEnrolledCoursesView(APIView):
     """
@@ -464,7 +751,7 @@ class StudentCourseEnrollmentView(APIView):
         responses={201: EnrollmentSerializer()}
     )
     def post(self, request, course_id):
-        course = get_object_or_404(Course, id=course_id)
+        course = get_object_or_404(Course.objects.published(), id=course_id)
 
         # Check if the user is already enrolled
         enrollment, created = Enrollment.objects.get_or_create(
@@ -486,8 +773,22 @@ class PublicCourseListView(APIView):
     """
     permission_classes = [AllowAny]  # Anyone can access this
 
+    @swagger_auto_schema(
+        operation_description=(
+            "List all available courses. Pass ?view=catalog for the cursor-paginated catalog instead: "
+            "summaries with video count, total duration and resource count; follow `next` for more."
+        ),
+        manual_parameters=[
+            openapi.Parameter('view', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['catalog'], required=False),
+        ],
+        responses={200: CourseSerializer(many=True)}
+    )
+    @conditional_get(lambda request: [("catalog",)])
     def get(self, request):
-        courses = Course.objects.all()
+        courses = Course.objects.published()
+        if request.query_params.get('view') == 'catalog':
+            return catalog_response(request, self, courses)
+        courses = courses.prefetch_related('videos', Prefetch('resources', queryset=Resource.objects.with_download_totals()))
         serializer = CourseSerializer(courses, many=True)
         return Response(serializer.data, status=200)
 
@@ -498,8 +799,9 @@ class PublicCourseDetailView(APIView):
     """
     permission_classes = [AllowAny]  # Anyone can view details
 
+    @conditional_get(lambda request, course_id: [("course", course_id)])
     def get(self, request, course_id):
-        course = get_object_or_404(Course, id=course_id)
+        course = get_object_or_404(Course.objects.published(), id=course_id)
         course_data = CourseSerializer(course).data
 
         # Lock videos & resources if user is not enrolled
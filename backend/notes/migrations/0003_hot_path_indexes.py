@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+from core.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently on PostgreSQL, which cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('courses', '0014_hot_path_indexes'),
+        ('notes', '0002_note_video_position'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='note',
+            index=models.Index(fields=['user', 'video', 'video_position'], name='note_user_video_pos_idx'),
+        ),
+    ]
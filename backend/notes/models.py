@@ -10,6 +10,9 @@ class Note(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     video_position = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [models.Index(fields=['user', 'video', 'video_position'], name='note_user_video_pos_idx')]
+
     def __str__(self):
         return f"Note by {self.user.username} at {self.video_position}s on {self.video.title}"
 
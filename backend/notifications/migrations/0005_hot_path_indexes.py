@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 13:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+from core.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently on PostgreSQL, which cannot run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('courses', '0014_hot_path_indexes'),
+        ('notifications', '0004_alter_notification_notification_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='notification',
+            index=models.Index(fields=['user', 'course', '-created_at'], name='notif_user_course_recent_idx'),
+        ),
+    ]
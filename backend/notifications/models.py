@@ -3,6 +3,9 @@ from django.conf import settings
 from userauths.models import User
 from courses.models import Course
 from courses.models import Enrollment
+from core.versioning import bump_versions
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 import uuid
 
 class Notification(models.Model):
@@ -23,10 +26,26 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['user', 'course', '-created_at'], name='notif_user_course_recent_idx')]
+
     def __str__(self):
         return f"Notification for {self.user.username} - {self.message[:50]}"
     
 
+    @staticmethod
+    def bump_versions_for(notifications):
+        """
+        Invalidate notification list ETags for the recipients (and courses) of
+        `notifications`. bulk_create() skips signals, so callers use this.
+        """
+        scopes = set()
+        for notification in notifications:
+            scopes.add(("notifications", notification.user_id))
+            if notification.course_id:
+                scopes.add(("course_notifications", notification.course_id))
+        bump_versions(*scopes)
+
     @staticmethod
     def notify_enrolled_students(course, message):
         """
@@ -35,6 +54,7 @@ class Notification(models.Model):
         enrolled_students = Enrollment.objects.filter(course=course).values_list("user", flat=True)
         notifications = [Notification(notification_id=uuid.uuid4(),user_id=user_id, course=course, message=message) for user_id in enrolled_students]
         Notification.objects.bulk_create(notifications)  # Bulk insert for efficiency
+        Notification.bump_versions_for(notifications)
 
     @staticmethod
     def send_general_notification(message):
@@ -47,6 +67,7 @@ class Notification(models.Model):
             for student in students
         ]
         Notification.objects.bulk_create(notifications)  # Bulk insert for efficiency
+        Notification.bump_versions_for(notifications)
 
 
     # @staticmethod
@@ -58,3 +79,8 @@ class Notification(models.Model):
     #             user=student,
     #             message=f"A new video '{video_title}' has been uploaded. Check it out!",
     #         )
+
+
+@receiver([post_save, post_delete], sender=Notification)
+def bump_notification_version(sender, instance, **kwargs):
+    Notification.bump_versions_for([instance])
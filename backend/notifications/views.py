@@ -5,6 +5,7 @@ from .models import Notification
 from .serializers import NotificationSerializer
 from django.shortcuts import get_object_or_404
 from core.permissions import IsRegularUser, IsAdminOrStaff
+from core.versioning import conditional_get
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework.permissions import IsAuthenticated  # Ensure the user is authenticated
@@ -23,6 +24,7 @@ class NotificationListView(APIView):
         responses={200: NotificationSerializer(many=True)}
     )
 
+    @conditional_get(lambda request: [("notifications", request.user.pk)], per_user=True)
     def get(self, request):
         notifications = Notification.objects.filter(user=request.user, course__isnull=True).order_by('-created_at')
         serializer = NotificationSerializer(notifications, many=True)
@@ -84,10 +86,18 @@ class AdminCreateNotificationView(APIView):
 
         notifications = [Notification(notification_id=uuid.uuid4(), user_id = user_id, course_id=course_id, message=message) for user_id in students]
         Notification.objects.bulk_create(notifications)
+        Notification.bump_versions_for(notifications)
 
         return Response({"message": "Notifications sent successfully."}, status=status.HTTP_201_CREATED)
 
 
+def relevant_notification_scopes(user):
+    #Relevant notifications change with enrollments or with any enrolled course's notifications.
+    #The full set is read from the database: a cached one could lack a course just enrolled in on another worker
+    course_ids = Enrollment.objects.filter(user=user).order_by('course_id').values_list('course_id', flat=True)
+    return [("enrollments", user.pk)] + [("course_notifications", course_id) for course_id in course_ids]
+
+
 class StudentRelevantNotificationsView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -95,6 +105,7 @@ class StudentRelevantNotificationsView(APIView):
         operation_description="Get notifications relevant to the student (based on enrolled courses).",
         responses={200: NotificationSerializer(many=True)}
     )
+    @conditional_get(lambda request: relevant_notification_scopes(request.user), per_user=True)
     def get(self, request):
         enrolled_courses = Enrollment.objects.filter(user=request.user).values_list("course_id", flat=True)
         notifications = Notification.objects.filter(
@@ -137,6 +148,7 @@ class AdminSendNotificationView(APIView):
 
         if notifications:
             Notification.objects.bulk_create(notifications)
+            Notification.bump_versions_for(notifications)
             return Response({"message": "Notifications sent successfully."}, status=status.HTTP_201_CREATED)
         else:
             return Response({"message": "No new notifications created (duplicates filtered)."}, status=status.HTTP_200_OK)
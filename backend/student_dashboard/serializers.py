@@ -1,44 +1,38 @@
 from rest_framework import serializers
-from courses.models import VideoProgress, Enrollment, Course, Video
-from courses.serializers import EnrollmentSerializer,VideoProgressSerializer  # Reuse existing serializer
-from core.s3_signed_url import generate_signed_url
+from courses.models import VideoProgress, Enrollment, Course, Video, CourseProgress
+from courses.serializers import EnrollmentSerializer,VideoProgressSerializer, course_progress_for  # Reuse existing serializer
+from courses.progress_buffer import apply_pending_positions
+from core.serializers import SignedURLListSerializer, SignedURLMixin
 
-class DashboardEnrollmentSerializer(EnrollmentSerializer):
+class DashboardEnrollmentSerializer(SignedURLMixin, EnrollmentSerializer):
+    signed_url_sources = {'course.image': 'course_image'}
     progress_percentage = serializers.SerializerMethodField()
     course_title = serializers.CharField(source="course.title", read_only=True)
     course_description = serializers.CharField(source="course.description", read_only=True)
     course_image_url = serializers.SerializerMethodField()
 
     def get_progress_percentage(self, obj):
-        user = obj.user #self.context.get('user')
-        course = obj.course
-        total_videos = course.videos.count()
-        completed_videos = VideoProgress.objects.filter(video__course=course, user=user, is_completed=True).count()
-        return (completed_videos / total_videos * 100) if total_videos > 0 else 0
+        return course_progress_for(self.context, obj.user_id, obj.course_id).progress_percentage
     
     def get_course_image_url(self, obj):
-        if obj.course.image:
-            signed_url = generate_signed_url(f"media/{obj.course.image.name}")
-            print(f" Signed URL for {obj.course.title}: {signed_url}")  # Debug log
-            return signed_url
-        print(f" No image found for course {obj.course.title}")  # Debug log
-        return None
+        return self.signed_url_for(obj.course.image, 'course_image')  # None if the course has no image
 
     class Meta(EnrollmentSerializer.Meta):
         fields = EnrollmentSerializer.Meta.fields + ['progress_percentage','course_title','course_description',"course_image_url",]
+        list_serializer_class = SignedURLListSerializer
 
 
-class LatestCourseSerializer(serializers.ModelSerializer):
+class LatestCourseSerializer(SignedURLMixin, serializers.ModelSerializer):
+    signed_url_sources = {'image': 'course_image'}
     course_image_url = serializers.SerializerMethodField()
 
     def get_course_image_url(self, obj):
-        if obj.image:
-            return generate_signed_url(f"media/{obj.image.name}")  
-        return None 
+        return self.signed_url_for(obj.image, 'course_image')
     
     class Meta:
         model = Course
         fields = ['id', 'title', 'description', 'start_date', 'end_date', 'course_image_url']
+        list_serializer_class = SignedURLListSerializer
 
 
 class PersonalDashboardSerializer(serializers.Serializer):
@@ -49,12 +43,12 @@ class PersonalDashboardSerializer(serializers.Serializer):
     available_courses = serializers.SerializerMethodField()
 
     def get_enrolled_courses(self, obj):
-        enrollments = Enrollment.objects.filter(user=obj)
-        serializer = DashboardEnrollmentSerializer(enrollments, many=True, context={'user': obj})
+        enrollments = Enrollment.objects.filter(user=obj).select_related('course', 'user')
+        serializer = DashboardEnrollmentSerializer(enrollments, many=True, context={'user': obj, 'course_progress': self.course_progress(obj)})
         return serializer.data
 
     def get_continue_watching(self, obj):
-        in_progress_videos = VideoProgress.objects.filter(user=obj, is_completed=False, last_watched_position__gt=0).order_by('-updated_at')  # Ensures latest progress is at the top
+        in_progress_videos = VideoProgress.objects.filter(user=obj, is_completed=False, last_watched_position__gt=0).select_related('video__course').order_by('-updated_at')  # Ensures latest progress is at the top
     
         if not in_progress_videos.exists():
             print(" No Videos Found for Continue Watching!")
@@ -67,12 +61,19 @@ class PersonalDashboardSerializer(serializers.Serializer):
             progress.course_title = progress.video.course.title
 
 
-        serializer = VideoProgressSerializer(in_progress_videos, many=True)
+        apply_pending_positions(in_progress_videos)  # Latest buffered heartbeats
+        serializer = VideoProgressSerializer(in_progress_videos, many=True, context={'course_progress': self.course_progress(obj)})
         return serializer.data
 
+    def course_progress(self, obj):
+        #All of the user's course progress in one query, shared by the sections above
+        if not hasattr(self, '_course_progress'):
+            self._course_progress = {progress.course_id: progress for progress in CourseProgress.objects.filter(user=obj)}
+        return self._course_progress
+
     def get_available_courses(self, obj):
         enrolled_course_ids = Enrollment.objects.filter(user=obj).values_list('course_id', flat=True)
-        latest_courses = Course.objects.exclude(id__in=enrolled_course_ids).order_by('-created_at')[:5]
+        latest_courses = Course.objects.published().exclude(id__in=enrolled_course_ids).order_by('-created_at')[:5]
         serializer = LatestCourseSerializer(latest_courses, many=True)
         return serializer.data
 
@@ -82,10 +83,9 @@ class DashboardVideoProgressSerializer(VideoProgressSerializer):
     video_thumbnail = serializers.SerializerMethodField()
 
     def get_video_thumbnail(self, obj):
-        if obj.video.thumbnail:
-            return generate_signed_url(f"media/{obj.video.thumbnail.name}")  # Fetch signed URL for video thumbnail
-        return None
+        return self.signed_url_for(obj.video.thumbnail, 'thumbnail')  # Signed URL for video thumbnail
 
     class Meta:
         model = VideoProgress
         fields = VideoProgressSerializer.Meta.fields + ["course_title", "course_id", "video_thumbnail"]
+        list_serializer_class = SignedURLListSerializer
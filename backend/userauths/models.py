@@ -1,9 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.core.exceptions import ValidationError
 from django.dispatch import receiver
 from django.utils.timezone import now, timedelta
+from core.storage_deletion import delete_later
 
 
 class User(AbstractUser):
@@ -84,21 +85,40 @@ def delete(self, *args, **kwargs):
     user.delete()
 
 
+def is_default_image(name):
+    #Shared placeholder images are never deleted
+    return name == 'user_folder/default_profImg.png' or "default-user.jpg" in name
+
+
 @receiver(pre_save, sender=Profile)
 def delete_old_image(sender, instance, **kwargs):
     
-    #Delete the old image from S3 when the Profile image is updated.
+    #Remember the old image when the Profile image is updated; it is queued for deletion once saved.
+    instance._replaced_image = None
     if instance.pk:
         try:
             old_profile = Profile.objects.get(pk=instance.pk)
             old_image = old_profile.image
             # old_image = Profile.objects.get(pk=instance.pk).image
-            if (old_image and old_image.name != 'user_folder/default_profImg.png' and old_image.name != instance.image.name):
-                print(f"Deleting old image: {old_image.name}")
-                old_image.delete(save=False)
+            if (old_image and not is_default_image(old_image.name) and old_image.name != instance.image.name):
+                instance._replaced_image = old_image.name
         except Profile.DoesNotExist:
             pass
 
+
+@receiver(post_save, sender=Profile)
+def queue_old_image_deletion(sender, instance, **kwargs):
+    #Deleted from S3 after commit by the storage deletion worker, not inside the request
+    delete_later(getattr(instance, '_replaced_image', None))
+    instance._replaced_image = None
+
+
+@receiver(post_delete, sender=Profile)
+def queue_image_deletion(sender, instance, **kwargs):
+    #Deleting a student (and so their profile) also releases the profile image
+    if instance.image and not is_default_image(instance.image.name):
+        delete_later(instance.image.name)
+
 @receiver(post_save, sender=User)
 def create_or_save_user_profile(sender, instance, created, **kwargs): 
     #Automatically create or save the Profile whenever a User is created or updated.
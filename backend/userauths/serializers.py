@@ -5,7 +5,7 @@ from .models import Profile, User
 import boto3
 from django.conf import settings
 from django.core.validators import FileExtensionValidator
-from core.s3_signed_url import generate_signed_url
+from core.serializers import SignedURLListSerializer, SignedURLMixin
 
 
 # Registration Serializer
@@ -89,7 +89,8 @@ class AdminProfileSerializer(serializers.ModelSerializer):
 
         return instance
 
-class StudentProfileSerializer(serializers.ModelSerializer):
+class StudentProfileSerializer(SignedURLMixin, serializers.ModelSerializer):
+    signed_url_sources = {'image': 'profile_image'}
     first_name = serializers.CharField(source='user.first_name',required= True)
     last_name = serializers.CharField(source='user.last_name', required = True)
     email = serializers.EmailField(source='user.email', read_only=True)
@@ -107,10 +108,11 @@ class StudentProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = Profile
         fields = ['id', 'username', 'email', 'first_name', 'last_name','password', 'image','signed_url', 'country', 'about', 'date']
+        list_serializer_class = SignedURLListSerializer
 
     def get_signed_url(self, obj):
         if obj.image and obj.image.name and "default-user.jpg" not in obj.image.name:
-            return generate_signed_url(obj.image.name)
+            return self.signed_url_for(obj.image, 'profile_image')
         return None #Instead of S3 default image, return None (handled by frontend with an icon)
 
     def update(self, instance, validated_data):
@@ -133,11 +135,7 @@ class StudentProfileSerializer(serializers.ModelSerializer):
         new_image = validated_data.get('image', None)
         # Update profile fields, including the image
         if new_image:
-            #Only delete old image if new image is successfully assigned
-            if instance.image and "default-user.jpg" not in instance.image.name:
-                print(f" Deleting old image: {instance.image.name}") 
-                instance.image.delete(save=False)  # Delete from S3
-                
+            #The old image is queued for deletion once the profile is saved (see delete_old_image)
             instance.image = new_image # Assign new image
 
         #Update remaining fields